@@ -0,0 +1,56 @@
+import os
+from typing import Optional
+from pydantic import BaseModel
+
+# Configuração do banco (MongoDB ou SQLite), lida das variáveis de ambiente
+
+
+def _env_bool(nome: str, padrao: bool) -> bool:
+    valor = os.getenv(nome)
+    if valor is None:
+        return padrao
+    return valor.strip().lower() in ("1", "true", "sim", "yes", "on")
+
+
+def _env_int(nome: str, padrao: Optional[int]) -> Optional[int]:
+    valor = os.getenv(nome)
+    return int(valor) if valor not in (None, "") else padrao
+
+
+class ConfiguracaoBanco(BaseModel):
+    backend: str = "mongo"  # "mongo" ou "sqlite" (ver services/repositorios)
+    mongo_url: str = "mongodb://localhost:27017"
+    db_name: str = "banco"
+    max_pool_size: int = 100
+    min_pool_size: int = 0
+    wait_queue_timeout_ms: Optional[int] = None  # Tempo máximo esperando uma conexão livre do pool
+    compressores: Optional[str] = None  # Ex.: "zstd,snappy" (exige os pacotes zstandard/python-snappy)
+    read_preference: str = "primary"
+    retry_writes: bool = True
+    leitura_secundaria: bool = False  # Rotas só de leitura podem ler de secundários
+    conexoes_aquecidas: int = 0  # Conexões abertas já na inicialização do worker
+    monitorar_comandos: bool = True  # Conta os comandos por coleção e por requisição (ver services/metricas)
+    pre_imagens_consultas: bool = True  # Pré-imagens das consultas para a agenda ao vivo (MongoDB 6.0+)
+    sqlite_caminho: str = "database.db"
+    sqlite_pool_size: int = 4  # Conexões (e threads) do pool do SQLite
+
+
+def carregar_configuracao() -> ConfiguracaoBanco:
+    padrao = ConfiguracaoBanco()
+    return ConfiguracaoBanco(
+        backend=os.getenv("BANCO_BACKEND", padrao.backend).strip().lower(),
+        mongo_url=os.getenv("MONGO_URL", padrao.mongo_url),
+        db_name=os.getenv("MONGO_DB_NAME", padrao.db_name),
+        max_pool_size=_env_int("MONGO_MAX_POOL_SIZE", padrao.max_pool_size),
+        min_pool_size=_env_int("MONGO_MIN_POOL_SIZE", padrao.min_pool_size),
+        wait_queue_timeout_ms=_env_int("MONGO_WAIT_QUEUE_TIMEOUT_MS", padrao.wait_queue_timeout_ms),
+        compressores=os.getenv("MONGO_COMPRESSORES") or padrao.compressores,
+        read_preference=os.getenv("MONGO_READ_PREFERENCE", padrao.read_preference),
+        retry_writes=_env_bool("MONGO_RETRY_WRITES", padrao.retry_writes),
+        leitura_secundaria=_env_bool("MONGO_LEITURA_SECUNDARIA", padrao.leitura_secundaria),
+        conexoes_aquecidas=_env_int("MONGO_CONEXOES_AQUECIDAS", padrao.conexoes_aquecidas),
+        monitorar_comandos=_env_bool("MONGO_MONITORAR_COMANDOS", padrao.monitorar_comandos),
+        pre_imagens_consultas=_env_bool("MONGO_PRE_IMAGENS_CONSULTAS", padrao.pre_imagens_consultas),
+        sqlite_caminho=os.getenv("SQLITE_CAMINHO", padrao.sqlite_caminho),
+        sqlite_pool_size=_env_int("SQLITE_POOL_SIZE", padrao.sqlite_pool_size),
+    )
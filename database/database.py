@@ -1,20 +1,40 @@
+import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
 from fastapi import Depends
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Optional
 from beanie import init_beanie
+from pymongo import ReadPreference
+from database.config import ConfiguracaoBanco, carregar_configuracao
 from models.consultas import Consulta  # Ajuste de acordo com seus modelos importados
 from models.medicos import Medico
 from models.paciente import Paciente
+from models.relatorios import ResumoConsultas
+from models.tarefas import Tarefa
+from services.metricas import MonitorComandos
 
-# URL de conexão com o MongoDB
-MONGO_URL = "mongodb://localhost:27017"  # Altere para o seu MongoDB URL se necessário
-DB_NAME = "banco"  # Altere para o nome do seu banco
-
-# Instância do cliente assíncrono MongoDB
-client = AsyncIOMotorClient(MONGO_URL)
+# O cliente do MongoDB é criado por conectar(), chamado no lifespan da aplicação.
+# Assim cada worker cria o seu cliente (e o seu pool) depois do fork, e o fecha ao encerrar.
+configuracao: ConfiguracaoBanco = carregar_configuracao()
+client: Optional[AsyncIOMotorClient] = None
 
 # Banco de dados
-db = client[DB_NAME]
+db = None
+
+# Função que cria o cliente assíncrono com as opções de pool da configuração
+def criar_cliente(config: ConfiguracaoBanco) -> AsyncIOMotorClient:
+    opcoes = {
+        "maxPoolSize": config.max_pool_size,
+        "minPoolSize": config.min_pool_size,
+        "readPreference": config.read_preference,
+        "retryWrites": config.retry_writes,
+    }
+    if config.wait_queue_timeout_ms is not None:
+        opcoes["waitQueueTimeoutMS"] = config.wait_queue_timeout_ms
+    if config.compressores:
+        opcoes["compressors"] = config.compressores
+    if config.monitorar_comandos:
+        opcoes["event_listeners"] = [MonitorComandos()]
+    return AsyncIOMotorClient(config.mongo_url, **opcoes)
 
 # Função para obter o banco de dados (assíncrona)
 def get_db() -> AsyncGenerator:
@@ -24,12 +44,43 @@ def get_db() -> AsyncGenerator:
         pass
 
 # Função para inicializar o Beanie com a base de dados
-async def init_database():
+# O init_beanie também cria (ou confirma, se já existirem) os índices declarados em Settings.indexes
+async def init_database(banco=None):
     await init_beanie(
-        database=db,
-        document_models=[Consulta, Medico, Paciente]  # Inclua todos os modelos que você usou no seu código
+        database=banco if banco is not None else db,
+        document_models=[Consulta, Medico, Paciente, ResumoConsultas, Tarefa]  # Inclua todos os modelos que você usou no seu código
     )
 
+# Função que abre algumas conexões do pool de uma vez, para as primeiras requisições não pagarem o handshake
+async def aquecer_conexoes(quantidade: int):
+    if quantidade > 0:
+        await asyncio.gather(*[client.admin.command("ping") for _ in range(quantidade)])
+
+# Função que cria o cliente, inicializa o Beanie e aquece o pool
+async def conectar(config: Optional[ConfiguracaoBanco] = None):
+    global client, db, configuracao
+    configuracao = config or carregar_configuracao()
+    client = criar_cliente(configuracao)
+    db = client[configuracao.db_name]
+    await init_database(db)
+    await aquecer_conexoes(configuracao.conexoes_aquecidas)
+
+# Função que fecha o cliente e suas conexões
+def desconectar():
+    global client, db
+    if client is not None:
+        client.close()
+    client = None
+    db = None
+
+# Coleção para leituras que toleram atraso de replicação (relatórios, exportações e contagens)
+# Com MONGO_LEITURA_SECUNDARIA, essas leituras vão preferencialmente para os secundários
+def colecao_leitura(modelo):
+    colecao = modelo.get_motor_collection()
+    if configuracao.leitura_secundaria:
+        return colecao.with_options(read_preference=ReadPreference.SECONDARY_PREFERRED)
+    return colecao
+
 # Função para criar ou inicializar coleções, caso necessário
 async def criar_tabelas():
     # Não é necessário criar coleções explicitamente com o Beanie, pois ele já cria as coleções automaticamente
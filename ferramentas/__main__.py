@@ -0,0 +1,172 @@
+import argparse
+import asyncio
+import sys
+from database.config import carregar_configuracao
+from database.database import conectar, desconectar
+from ferramentas import carga, dados, sintetico
+from services.repositorios import abrir_repositorio, fechar_repositorio, repositorio
+
+# Linha de comando das ferramentas de dados da clínica
+# Exemplos:
+#   python -m ferramentas exportar pacientes pacientes.ndjson
+#   python -m ferramentas importar consultas consultas.csv --formato csv --checkpoint consultas.ckpt
+#   python -m ferramentas popular --semente 42 --limpar
+#   python -m ferramentas popular --backend sqlite --limpar
+#   python -m ferramentas reconciliar
+#   python -m ferramentas reconstruir-relatorios
+#   python -m ferramentas orfaos --reparar
+#   python -m ferramentas carga --url http://localhost:8000 --saida atual.json
+#   python -m ferramentas comparar linha_de_base.json atual.json
+
+# Comandos que falam direto com o MongoDB, comandos que usam o repositório do backend escolhido
+# (MongoDB ou SQLite) e os demais, que usam só a API ou arquivos
+COMANDOS_COM_MONGO = {"importar", "exportar"}
+COMANDOS_COM_REPOSITORIO = {"popular", "reconciliar", "reconstruir-relatorios", "orfaos"}
+
+
+def _argumentos_base(parser: argparse.ArgumentParser):
+    padrao = sintetico.BaseSintetica()
+    parser.add_argument("--semente", type=int, default=padrao.semente)
+    parser.add_argument("--pacientes", type=int, default=padrao.pacientes)
+    parser.add_argument("--medicos", type=int, default=padrao.medicos)
+    parser.add_argument("--consultas", type=int, default=padrao.consultas)
+    parser.add_argument(
+        "--backend", choices=["mongo", "sqlite"], default=carregar_configuracao().backend,
+        help="Banco da base (o SQLite usa IDs inteiros); padrão: BANCO_BACKEND",
+    )
+
+
+def _base(argumentos: argparse.Namespace) -> sintetico.BaseSintetica:
+    return sintetico.BaseSintetica(
+        argumentos.semente, argumentos.pacientes, argumentos.medicos, argumentos.consultas,
+        ids_inteiros=argumentos.backend == "sqlite",
+    )
+
+
+def criar_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m ferramentas", description="Ferramentas de dados da clínica")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    importar = comandos.add_parser("importar", help="Importa um arquivo NDJSON/CSV para uma coleção")
+    importar.add_argument("colecao", choices=sorted(dados.COLECOES))
+    importar.add_argument("arquivo")
+    importar.add_argument("--formato", choices=["ndjson", "csv"], default="ndjson")
+    importar.add_argument("--lote", type=int, default=1000, help="Documentos validados e gravados por vez")
+    importar.add_argument("--upsert", action="store_true", help="Substitui documentos com o mesmo _id")
+    importar.add_argument("--checkpoint", help="Arquivo de checkpoint para retomar a importação")
+    importar.add_argument(
+        "--atualizar-referencias", action="store_true",
+        help="Acrescenta as consultas importadas às listas dos pacientes e médicos",
+    )
+
+    exportar = comandos.add_parser("exportar", help="Exporta uma coleção para NDJSON/CSV")
+    exportar.add_argument("colecao", choices=sorted(dados.COLECOES))
+    exportar.add_argument("arquivo")
+    exportar.add_argument("--formato", choices=["ndjson", "csv"], default="ndjson")
+    exportar.add_argument("--lote", type=int, default=1000, help="Tamanho dos lotes lidos do cursor")
+    exportar.add_argument("--checkpoint", help="Arquivo de checkpoint para retomar a exportação")
+
+    popular = comandos.add_parser("popular", help="Grava a base sintética reproduzível usada nos testes de carga")
+    _argumentos_base(popular)
+    popular.add_argument("--lote", type=int, default=5000, help="Documentos gravados por vez")
+    popular.add_argument("--limpar", action="store_true", help="Apaga pacientes, médicos e consultas antes")
+
+    reconciliar = comandos.add_parser(
+        "reconciliar", help="Recalcula os contadores de consultas e de pacientes e corrige os divergentes",
+    )
+    reconstruir = comandos.add_parser(
+        "reconstruir-relatorios", help="Recalcula do zero o resumo de consultas usado pelos relatórios",
+    )
+    orfaos = comandos.add_parser(
+        "orfaos", help="Procura consultas e referências que apontam para pacientes, médicos ou consultas excluídos",
+    )
+    orfaos.add_argument(
+        "--reparar", action="store_true", help="Remove as referências órfãs e reconcilia os contadores",
+    )
+    for subcomando in (reconciliar, reconstruir, orfaos):
+        subcomando.add_argument(
+            "--backend", choices=["mongo", "sqlite"], default=carregar_configuracao().backend,
+            help="Banco a usar; padrão: BANCO_BACKEND",
+        )
+
+    carga_ = comandos.add_parser("carga", help="Mede latência e vazão de cada rota da API sobre a base sintética")
+    _argumentos_base(carga_)
+    carga_.add_argument("--url", default="http://localhost:8000", help="Endereço da API já em execução")
+    carga_.add_argument("--requisicoes", type=int, default=200, help="Requisições medidas por rota")
+    carga_.add_argument("--concorrencia", type=int, default=16, help="Requisições simultâneas")
+    carga_.add_argument("--aquecimento", type=int, default=10, help="Requisições por rota antes da medição")
+    carga_.add_argument("--rota", action="append", dest="rotas", help="Mede só a rota informada (pode repetir)")
+    carga_.add_argument("--saida", default="carga.json", help="Arquivo JSON com o resultado")
+
+    comparar = comandos.add_parser("comparar", help="Aponta as rotas que pioraram entre duas execuções da carga")
+    comparar.add_argument("linha_de_base")
+    comparar.add_argument("atual")
+    comparar.add_argument("--tolerancia", type=float, default=0.10, help="Piora relativa aceita (0.10 = 10%%)")
+
+    return parser
+
+
+async def executar(argumentos: argparse.Namespace) -> int:
+    if argumentos.comando in COMANDOS_COM_MONGO:
+        await conectar()
+        try:
+            return await _executar_comando(argumentos)
+        finally:
+            desconectar()
+    if argumentos.comando in COMANDOS_COM_REPOSITORIO:
+        await abrir_repositorio(carregar_configuracao().model_copy(update={"backend": argumentos.backend}))
+        try:
+            return await _executar_comando(argumentos)
+        finally:
+            await fechar_repositorio()
+    return await _executar_comando(argumentos)
+
+
+async def _executar_comando(argumentos: argparse.Namespace):
+    if argumentos.comando == "importar":
+        await dados.importar(
+            argumentos.colecao, argumentos.arquivo, argumentos.formato, argumentos.lote,
+            argumentos.upsert, argumentos.checkpoint, argumentos.atualizar_referencias,
+        )
+    elif argumentos.comando == "exportar":
+        await dados.exportar(
+            argumentos.colecao, argumentos.arquivo, argumentos.formato, argumentos.lote, argumentos.checkpoint,
+        )
+    elif argumentos.comando == "popular":
+        await sintetico.popular(_base(argumentos), argumentos.lote, argumentos.limpar)
+    elif argumentos.comando == "reconciliar":
+        for contador, corrigidos in (await repositorio().reconciliar_contadores()).items():
+            print(f"{contador}: {corrigidos} corrigidos")
+    elif argumentos.comando == "reconstruir-relatorios":
+        print(f"resumo de consultas: {await repositorio().reconstruir_resumos()} linhas")
+    elif argumentos.comando == "orfaos":
+        situacao = "removidas" if argumentos.reparar else "encontradas"
+        for tipo, quantidade in (await repositorio().reparar_orfaos(argumentos.reparar)).items():
+            print(f"{tipo}: {quantidade} {situacao}")
+        if argumentos.reparar:
+            for contador, corrigidos in (await repositorio().reconciliar_contadores()).items():
+                print(f"{contador}: {corrigidos} corrigidos")
+    elif argumentos.comando == "carga":
+        resultado = await carga.executar(
+            argumentos.url, _base(argumentos), argumentos.requisicoes, argumentos.concorrencia,
+            argumentos.aquecimento, argumentos.rotas,
+        )
+        carga.salvar(resultado, argumentos.saida)
+    elif argumentos.comando == "comparar":
+        regressoes = carga.comparar(
+            carga.carregar(argumentos.linha_de_base), carga.carregar(argumentos.atual), argumentos.tolerancia
+        )
+        for r in regressoes:
+            print(f"REGRESSÃO {r['rota']} {r['metrica']}: {r['antes']:.1f} -> {r['depois']:.1f}")
+        if regressoes:
+            return 1
+        print("Nenhuma regressão acima da tolerância")
+    return 0
+
+
+def main():
+    sys.exit(asyncio.run(executar(criar_parser().parse_args())))
+
+
+if __name__ == "__main__":
+    main()
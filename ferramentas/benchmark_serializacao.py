@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, List
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from models.consultas import Consulta, ConsultaResponse
+from models.medicos import Medico, MedicoRetorno, campos_busca_medico
+from models.paciente import Paciente, PacienteRetorno
+from services.serializacao import (
+    SerializadorResposta, serializador_medico, serializador_paciente, serializador_pagina_consultas,
+)
+
+# Micro-benchmark da serialização de uma página de resposta:
+# caminho normal do FastAPI (response_model) contra o caminho rápido de services/serializacao.
+# Não precisa de banco: os documentos são montados em memória como os services os devolvem.
+#
+# Uso: python -m ferramentas.benchmark_serializacao --itens 100 --repeticoes 2000
+
+
+def _medicos(quantidade: int) -> List[Medico]:
+    return [
+        Medico.model_construct(
+            id=str(ObjectId()), nome=f"Médico {i}", especialidade="Cardiologia", crm=f"{i}-CE",
+            email=f"medico{i}@email.com", telefone="888888888", data_criacao=datetime(2024, 1, 1),
+            consultas=[str(ObjectId()) for _ in range(20)], pacientes=[str(ObjectId()) for _ in range(20)],
+            **campos_busca_medico(f"Médico {i}", "Cardiologia"),
+        )
+        for i in range(quantidade)
+    ]
+
+
+def _pacientes(quantidade: int) -> List[Paciente]:
+    return [
+        Paciente.model_construct(
+            id=str(ObjectId()), nome=f"Paciente {i}", telefone="999999999", email=f"paciente{i}@email.com",
+            sexo="F", peso=61.5, altura=1.68, problemas_de_saude="Nenhum",
+            data_criacao=datetime(2024, 1, 1) + timedelta(minutes=i),
+            consultas=[str(ObjectId()) for _ in range(20)], medicos=[str(ObjectId()) for _ in range(5)],
+        )
+        for i in range(quantidade)
+    ]
+
+
+def _pagina_consultas(quantidade: int) -> ConsultaResponse:
+    consultas = [
+        Consulta.model_construct(
+            id=str(ObjectId()), paciente_id=str(ObjectId()), medico_id=str(ObjectId()),
+            data_hora=datetime(2024, 1, 1) + timedelta(hours=i), status="Agendada", observacoes="Retorno",
+        )
+        for i in range(quantidade)
+    ]
+    return ConsultaResponse(consultas=consultas, quantidade=quantidade, next_cursor=None)
+
+
+# Mesmo caminho que o FastAPI percorre numa rota com response_model
+def _caminho_fastapi(modelo: Any, loop: asyncio.AbstractEventLoop) -> Callable[[Any], bytes]:
+    campo = create_model_field(name="Response", type_=modelo, mode="serialization")
+
+    def serializar(conteudo: Any) -> bytes:
+        dados = loop.run_until_complete(serialize_response(field=campo, response_content=conteudo, is_coroutine=True))
+        return JSONResponse(dados).body
+    return serializar
+
+
+def _caminho_rapido(serializador: SerializadorResposta) -> Callable[[Any], bytes]:
+    def serializar(conteudo: Any) -> bytes:
+        return serializador.lista_json(conteudo) if isinstance(conteudo, list) else serializador.para_json(conteudo)
+    return serializar
+
+
+def _medir(serializar: Callable[[Any], bytes], conteudo: Any, repeticoes: int) -> float:
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        serializar(conteudo)
+    return (time.perf_counter() - inicio) / repeticoes * 1e6
+
+
+def executar(itens: int, repeticoes: int) -> List[dict]:
+    cenarios = [
+        ("GET /medicos/", list[MedicoRetorno], serializador_medico, _medicos(itens)),
+        ("GET /pacientes/", list[PacienteRetorno], serializador_paciente, _pacientes(itens)),
+        ("GET /consultas/", ConsultaResponse, serializador_pagina_consultas, _pagina_consultas(itens)),
+    ]
+    resultados = []
+    loop = asyncio.new_event_loop()
+    for rota, modelo, serializador, conteudo in cenarios:
+        normal, rapido = _caminho_fastapi(modelo, loop), _caminho_rapido(serializador)
+        if normal(conteudo) != rapido(conteudo):
+            raise AssertionError(f"{rota}: o caminho rápido não gerou o mesmo JSON")
+        # Os dois caminhos recebem o mesmo aquecimento antes da medição
+        _medir(normal, conteudo, 10)
+        _medir(rapido, conteudo, 10)
+        tempo_normal, tempo_rapido = _medir(normal, conteudo, repeticoes), _medir(rapido, conteudo, repeticoes)
+        resultados.append({
+            "rota": rota,
+            "itens": itens,
+            "fastapi_us": tempo_normal,
+            "rapido_us": tempo_rapido,
+            "reducao": 1 - tempo_rapido / tempo_normal,
+        })
+    loop.close()
+    return resultados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara a serialização normal e a rápida de uma página de resposta.")
+    parser.add_argument("--itens", type=int, default=100, help="Itens por página")
+    parser.add_argument("--repeticoes", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    print(f"{'rota':<18}{'itens':>6}{'fastapi (µs)':>15}{'rápido (µs)':>14}{'redução':>10}")
+    for r in executar(args.itens, args.repeticoes):
+        print(f"{r['rota']:<18}{r['itens']:>6}{r['fastapi_us']:>15.1f}{r['rapido_us']:>14.1f}{r['reducao']:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
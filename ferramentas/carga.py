@@ -0,0 +1,451 @@
+import asyncio
+import json
+import math
+import platform
+import random
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import httpx
+from ferramentas.sintetico import DIAS_PERIODO, INICIO_PERIODO, BaseSintetica
+
+# Teste de carga da API sobre a base sintética (ver ferramentas/sintetico.py).
+# Cada rota de routes/ tem um cenário. Os cenários rodam um de cada vez, com várias requisições
+# concorrentes, e o resultado (p50/p95/p99 e vazão por rota) vai para um JSON que serve de
+# linha de base. comparar() aponta as rotas que pioraram entre duas execuções.
+
+
+@dataclass
+class Requisicao:
+    metodo: str
+    url: str
+    params: Optional[Dict[str, Any]] = None
+    json: Any = None
+    status_esperado: tuple = (200,)
+    headers: Optional[Dict[str, str]] = None
+    primeiro_evento: bool = False  # Fluxo de eventos (SSE): mede até o primeiro evento e fecha a conexão
+
+
+@dataclass
+class Contexto:
+    base: BaseSintetica
+    cliente: httpx.AsyncClient
+    rng: random.Random
+
+    def paciente(self) -> str:
+        return self.base.id_paciente(self.rng.randrange(self.base.pacientes))
+
+    # Os pacientes de índice baixo concentram as consultas (ver BaseSintetica.consulta)
+    def paciente_com_consultas(self) -> str:
+        return self.base.id_paciente(self.rng.randrange(max(1, self.base.pacientes // 100)))
+
+    def medico(self) -> int:
+        return self.rng.randrange(self.base.medicos)
+
+    def consulta(self) -> str:
+        return self.base.id_consulta(self.rng.randrange(self.base.consultas))
+
+    # Deslocamento de página que ainda cai dentro da coleção
+    def skip(self, total: int) -> int:
+        return self.rng.randrange(min(1000, total // 10) + 1)
+
+    def periodo(self, dias: int) -> Dict[str, str]:
+        inicio = INICIO_PERIODO + timedelta(days=self.rng.randrange(DIAS_PERIODO - dias))
+        return {"inicio": inicio.isoformat(), "fim": (inicio + timedelta(days=dias)).isoformat()}
+
+    # Período em dias inteiros (AAAA-MM-DD), como os relatórios recebem
+    def periodo_dias(self, dias: int) -> Dict[str, str]:
+        return {chave: valor[:10] for chave, valor in self.periodo(dias - 1).items()}
+
+    def novo_paciente(self) -> dict:
+        n = self.rng.randrange(10**9)
+        return {
+            "nome": f"Paciente Carga {n}", "telefone": "85999999999", "email": f"carga{n}@email.com",
+            "sexo": "F", "peso": 60.0, "altura": 1.65, "problemas_de_saude": "Nenhum",
+            "data_criacao": INICIO_PERIODO.isoformat(),
+        }
+
+    def novo_medico(self) -> dict:
+        n = self.rng.randrange(10**9)
+        return {
+            "nome": f"Médico Carga {n}", "especialidade": "Clínica Geral", "crm": f"{n}-CE",
+            "email": f"carga{n}@email.com", "telefone": "85988888888",
+        }
+
+    # Consultas novas ficam depois do período da base, espalhadas por dez anos em minutos
+    # aleatórios, para quase nunca ocuparem o horário de outra do mesmo médico (o que daria 409)
+    def nova_consulta(self) -> dict:
+        deslocamento = timedelta(days=DIAS_PERIODO + self.rng.randrange(3650), minutes=self.rng.randrange(24 * 60))
+        return {
+            "paciente_id": self.paciente(), "medico_id": self.base.id_medico(self.medico()),
+            "data_hora": (INICIO_PERIODO + deslocamento).isoformat(),
+            "status": "Agendada", "observacoes": "carga",
+        }
+
+    # Cria um documento pela API (fora da medição) para os cenários de alteração e remoção
+    async def criar(self, url: str, dados: dict) -> str:
+        resposta = await self.cliente.post(url, json=dados)
+        resposta.raise_for_status()
+        corpo = resposta.json()
+        return corpo.get("id") or corpo["_id"]
+
+
+Preparar = Callable[[Contexto], Awaitable[Requisicao]]
+CENARIOS: Dict[str, Preparar] = {}
+
+
+# Registra o cenário de uma rota; o nome é "MÉTODO caminho", como declarado em routes/
+def cenario(nome: str):
+    def registrar(preparar: Preparar) -> Preparar:
+        CENARIOS[nome] = preparar
+        return preparar
+    return registrar
+
+
+# Pacientes
+@cenario("POST /pacientes/")
+async def _(ctx: Contexto):
+    return Requisicao("POST", "/pacientes/", json=ctx.novo_paciente())
+
+@cenario("POST /pacientes/bulk")
+async def _(ctx: Contexto):
+    return Requisicao("POST", "/pacientes/bulk", json=[ctx.novo_paciente() for _ in range(100)])
+
+@cenario("GET /pacientes/")
+async def _(ctx: Contexto):
+    return Requisicao("GET", "/pacientes/", params={"skip": ctx.skip(ctx.base.pacientes), "limit": 100})
+
+@cenario("GET /pacientes/{id}")
+async def _(ctx: Contexto):
+    return Requisicao("GET", f"/pacientes/{ctx.paciente()}")
+
+# Revalidação com o ETag da base sintética: responde 304 sem ler o documento
+@cenario("GET /pacientes/{id} (If-None-Match)")
+async def _(ctx: Contexto):
+    indice = ctx.rng.randrange(ctx.base.pacientes)
+    return Requisicao("GET", f"/pacientes/{ctx.base.id_paciente(indice)}", status_esperado=(304,),
+                      headers={"If-None-Match": f'"{ctx.base.revisao("paciente", indice)}"'})
+
+@cenario("PUT /pacientes/{id}")
+async def _(ctx: Contexto):
+    id = await ctx.criar("/pacientes/", ctx.novo_paciente())
+    return Requisicao("PUT", f"/pacientes/{id}", json=ctx.novo_paciente())
+
+@cenario("DELETE /pacientes/{id}")
+async def _(ctx: Contexto):
+    id = await ctx.criar("/pacientes/", ctx.novo_paciente())
+    return Requisicao("DELETE", f"/pacientes/{id}", status_esperado=(202,))
+
+@cenario("GET /pacientes/{id}/consultas")
+async def _(ctx: Contexto):
+    return Requisicao("GET", f"/pacientes/{ctx.paciente_com_consultas()}/consultas")
+
+# Consultas
+@cenario("POST /consultas/")
+async def _(ctx: Contexto):
+    return Requisicao("POST", "/consultas/", json=ctx.nova_consulta())
+
+@cenario("POST /consultas/bulk")
+async def _(ctx: Contexto):
+    return Requisicao("POST", "/consultas/bulk", json=[ctx.nova_consulta() for _ in range(100)])
+
+@cenario("GET /consultas/")
+async def _(ctx: Contexto):
+    return Requisicao("GET", "/consultas/", params={"medico_id": ctx.base.id_medico(ctx.medico()), "limit": 100})
+
+@cenario("GET /consultas/{id}")
+async def _(ctx: Contexto):
+    return Requisicao("GET", f"/consultas/{ctx.consulta()}")
+
+@cenario("GET /consultas/{id} (If-None-Match)")
+async def _(ctx: Contexto):
+    indice = ctx.rng.randrange(ctx.base.consultas)
+    return Requisicao("GET", f"/consultas/{ctx.base.id_consulta(indice)}", status_esperado=(304,),
+                      headers={"If-None-Match": f'"{ctx.base.revisao("consulta", indice)}"'})
+
+@cenario("PUT /consultas/{id}")
+async def _(ctx: Contexto):
+    dados = ctx.nova_consulta()
+    id = await ctx.criar("/consultas/", dados)
+    return Requisicao("PUT", f"/consultas/{id}", json={**dados, "status": "Concluída"})
+
+@cenario("DELETE /consultas/{id}")
+async def _(ctx: Contexto):
+    id = await ctx.criar("/consultas/", ctx.nova_consulta())
+    return Requisicao("DELETE", f"/consultas/{id}")
+
+@cenario("GET /pacientes/{paciente_id}/consultas/")
+async def _(ctx: Contexto):
+    return Requisicao("GET", f"/pacientes/{ctx.paciente_com_consultas()}/consultas/",
+                      params={"limit": 100})
+
+@cenario("GET /pacientes/sem-consultas/")
+async def _(ctx: Contexto):
+    return Requisicao("GET", "/pacientes/sem-consultas/", params={"skip": ctx.skip(ctx.base.pacientes), "limit": 100})
+
+@cenario("GET /consultas/periodo/")
+async def _(ctx: Contexto):
+    return Requisicao("GET", "/consultas/periodo/", params=ctx.periodo(1))
+
+@cenario("GET /consultas/periodo/contagem")
+async def _(ctx: Contexto):
+    return Requisicao("GET", "/consultas/periodo/contagem", params=ctx.periodo(30))
+
+@cenario("GET /medicos/{medico_id}/consultas")
+async def _(ctx: Contexto):
+    return Requisicao("GET", f"/medicos/{ctx.base.id_medico(ctx.medico())}/consultas",
+                      params={**ctx.periodo(30), "limit": 100})
+
+@cenario("GET /medicos/{medico_id}/horarios-livres")
+async def _(ctx: Contexto):
+    inicio = INICIO_PERIODO + timedelta(days=ctx.rng.randrange(DIAS_PERIODO - 7))
+    return Requisicao("GET", f"/medicos/{ctx.base.id_medico(ctx.medico())}/horarios-livres",
+                      params={"data": inicio.date().isoformat(), "dias": ctx.rng.choice([1, 7])})
+
+@cenario("GET /medicos/{medico_id}/agenda/ao-vivo")
+async def _(ctx: Contexto):
+    dia = INICIO_PERIODO + timedelta(days=ctx.rng.randrange(DIAS_PERIODO))
+    return Requisicao("GET", f"/medicos/{ctx.base.id_medico(ctx.medico())}/agenda/ao-vivo",
+                      params={"data": dia.date().isoformat()}, primeiro_evento=True)
+
+@cenario("GET /pacientes/{id}/contagem_consultas")
+async def _(ctx: Contexto):
+    return Requisicao("GET", f"/pacientes/{ctx.paciente()}/contagem_consultas")
+
+@cenario("GET /pacientes/{id}/media_tempo_consultas")
+async def _(ctx: Contexto):
+    return Requisicao("GET", f"/pacientes/{ctx.paciente_com_consultas()}/media_tempo_consultas")
+
+@cenario("POST /pacientes/estatisticas_consultas")
+async def _(ctx: Contexto):
+    return Requisicao("POST", "/pacientes/estatisticas_consultas",
+                      json={"paciente_ids": [ctx.paciente() for _ in range(100)]})
+
+@cenario("GET /medicos/{medico_id}/pacientes/estatisticas_consultas")
+async def _(ctx: Contexto):
+    return Requisicao("GET", f"/medicos/{ctx.base.id_medico(ctx.medico())}/pacientes/estatisticas_consultas")
+
+# Médicos
+@cenario("POST /medicos/")
+async def _(ctx: Contexto):
+    return Requisicao("POST", "/medicos/", json=ctx.novo_medico())
+
+@cenario("POST /medicos/bulk")
+async def _(ctx: Contexto):
+    return Requisicao("POST", "/medicos/bulk", json=[ctx.novo_medico() for _ in range(100)])
+
+@cenario("GET /medicos/")
+async def _(ctx: Contexto):
+    return Requisicao("GET", "/medicos/", params={"skip": ctx.skip(ctx.base.medicos), "limit": 100})
+
+@cenario("GET /medicos/{id}")
+async def _(ctx: Contexto):
+    return Requisicao("GET", f"/medicos/{ctx.base.id_medico(ctx.medico())}")
+
+@cenario("GET /medicos/{id} (If-None-Match)")
+async def _(ctx: Contexto):
+    indice = ctx.medico()
+    return Requisicao("GET", f"/medicos/{ctx.base.id_medico(indice)}", status_esperado=(304,),
+                      headers={"If-None-Match": f'"{ctx.base.revisao("medico", indice)}"'})
+
+@cenario("PUT /medicos/{id}")
+async def _(ctx: Contexto):
+    id = await ctx.criar("/medicos/", ctx.novo_medico())
+    return Requisicao("PUT", f"/medicos/{id}", json=ctx.novo_medico())
+
+@cenario("DELETE /medicos/{id}")
+async def _(ctx: Contexto):
+    id = await ctx.criar("/medicos/", ctx.novo_medico())
+    return Requisicao("DELETE", f"/medicos/{id}", status_esperado=(202,))
+
+@cenario("GET /medicos/buscar_por_nome/")
+async def _(ctx: Contexto):
+    return Requisicao("GET", "/medicos/buscar_por_nome/", params={"nome": ctx.base.nome_medico(ctx.medico())})
+
+@cenario("GET /medicos/especialidade/")
+async def _(ctx: Contexto):
+    especialidade = ctx.base.especialidade_medico(ctx.medico())
+    return Requisicao("GET", "/medicos/especialidade/", params={"especialidade": especialidade, "limit": 100})
+
+@cenario("GET /medicos/{medico_id}/pacientes")
+async def _(ctx: Contexto):
+    return Requisicao("GET", f"/medicos/{ctx.base.id_medico(ctx.medico())}/pacientes")
+
+@cenario("POST /medicos/{medico_id}/pacientes/{paciente_id}")
+async def _(ctx: Contexto):
+    return Requisicao("POST", f"/medicos/{ctx.base.id_medico(ctx.medico())}/pacientes/{ctx.paciente()}")
+
+@cenario("GET /medicos/{id}/quantidade_pacientes")
+async def _(ctx: Contexto):
+    return Requisicao("GET", f"/medicos/{ctx.base.id_medico(ctx.medico())}/quantidade_pacientes")
+
+# Relatórios
+@cenario("GET /relatorios/consultas/por-dia")
+async def _(ctx: Contexto):
+    return Requisicao("GET", "/relatorios/consultas/por-dia",
+                      params={**ctx.periodo_dias(30), "medico_id": ctx.base.id_medico(ctx.medico())})
+
+@cenario("GET /relatorios/consultas/por-medico")
+async def _(ctx: Contexto):
+    return Requisicao("GET", "/relatorios/consultas/por-medico", params=ctx.periodo_dias(30))
+
+@cenario("GET /relatorios/consultas/por-especialidade")
+async def _(ctx: Contexto):
+    return Requisicao("GET", "/relatorios/consultas/por-especialidade", params=ctx.periodo_dias(30))
+
+# Tarefas
+@cenario("GET /tarefas/{id}")
+async def _(ctx: Contexto):
+    id = await ctx.criar("/medicos/", ctx.novo_medico())
+    resposta = await ctx.cliente.delete(f"/medicos/{id}")
+    resposta.raise_for_status()
+    corpo = resposta.json()
+    return Requisicao("GET", f"/tarefas/{corpo.get('id') or corpo['_id']}")
+
+# Monitoramento
+@cenario("GET /cache/estatisticas")
+async def _(ctx: Contexto):
+    return Requisicao("GET", "/cache/estatisticas")
+
+@cenario("GET /metrics")
+async def _(ctx: Contexto):
+    return Requisicao("GET", "/metrics")
+
+
+# Percentil pelo método nearest-rank
+def percentil(valores: List[float], p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    posicao = max(0, min(len(ordenados) - 1, math.ceil(p / 100 * len(ordenados)) - 1))
+    return ordenados[posicao]
+
+
+def resumir(latencias: List[float], erros: int, duracao: float) -> dict:
+    return {
+        "requisicoes": len(latencias),
+        "erros": erros,
+        "p50_ms": percentil(latencias, 50) * 1000,
+        "p95_ms": percentil(latencias, 95) * 1000,
+        "p99_ms": percentil(latencias, 99) * 1000,
+        "rps": len(latencias) / duracao if duracao > 0 else 0.0,
+    }
+
+
+# Lê o fluxo de eventos até o fim do primeiro evento (a linha em branco depois de "event:")
+async def _ler_primeiro_evento(resposta: httpx.Response):
+    if resposta.status_code != 200:
+        await resposta.aread()
+        return
+    evento = False
+    async for linha in resposta.aiter_lines():
+        if linha.startswith("event:"):
+            evento = True
+        elif not linha and evento:
+            return
+
+
+async def _executar_cenario(ctx: Contexto, preparar: Preparar, requisicoes: int, concorrencia: int) -> dict:
+    latencias: List[float] = []
+    erros = 0
+    restantes = requisicoes
+
+    async def trabalhador():
+        nonlocal erros, restantes
+        while restantes > 0:
+            restantes -= 1
+            requisicao = await preparar(ctx)
+            inicio = time.perf_counter()
+            if requisicao.primeiro_evento:
+                async with ctx.cliente.stream(
+                    requisicao.metodo, requisicao.url, params=requisicao.params, json=requisicao.json,
+                    headers=requisicao.headers,
+                ) as resposta:
+                    await _ler_primeiro_evento(resposta)
+            else:
+                resposta = await ctx.cliente.request(
+                    requisicao.metodo, requisicao.url, params=requisicao.params, json=requisicao.json,
+                    headers=requisicao.headers,
+                )
+                await resposta.aread()
+            latencias.append(time.perf_counter() - inicio)
+            if resposta.status_code not in requisicao.status_esperado:
+                erros += 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*[trabalhador() for _ in range(concorrencia)])
+    return resumir(latencias, erros, time.perf_counter() - inicio)
+
+
+# Executa os cenários contra uma API já rodando sobre a base sintética informada
+async def executar(
+    url: str,
+    base: BaseSintetica,
+    requisicoes: int = 200,
+    concorrencia: int = 16,
+    aquecimento: int = 10,
+    rotas: Optional[List[str]] = None,
+    transporte: Optional[httpx.AsyncBaseTransport] = None,
+) -> dict:
+    resultado = {
+        "meta": {
+            "url": url,
+            "data": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "backend": "sqlite" if base.ids_inteiros else "mongo",
+            "semente": base.semente,
+            "pacientes": base.pacientes,
+            "medicos": base.medicos,
+            "consultas": base.consultas,
+            "requisicoes": requisicoes,
+            "concorrencia": concorrencia,
+        },
+        "rotas": {},
+    }
+    limites = httpx.Limits(max_connections=concorrencia, max_keepalive_connections=concorrencia)
+    async with httpx.AsyncClient(base_url=url, limits=limites, timeout=60, transport=transporte) as cliente:
+        for nome, preparar in CENARIOS.items():
+            if rotas and nome not in rotas:
+                continue
+            # Cada cenário tem o seu gerador, para que a sequência não dependa dos cenários anteriores
+            ctx = Contexto(base, cliente, random.Random(f"{base.semente}:{nome}"))
+            if aquecimento:
+                await _executar_cenario(ctx, preparar, aquecimento, min(concorrencia, aquecimento))
+            resumo = await _executar_cenario(ctx, preparar, requisicoes, concorrencia)
+            resultado["rotas"][nome] = resumo
+            print(
+                f"{nome:<60} p50 {resumo['p50_ms']:8.1f} ms  p95 {resumo['p95_ms']:8.1f} ms  "
+                f"p99 {resumo['p99_ms']:8.1f} ms  {resumo['rps']:8.1f} req/s  erros {resumo['erros']}",
+                file=sys.stderr,
+            )
+    return resultado
+
+
+# Compara duas execuções e devolve as rotas que pioraram mais que a tolerância
+# (latências maiores ou vazão menor), ou que passaram a ter erros
+def comparar(base: dict, atual: dict, tolerancia: float = 0.10) -> List[dict]:
+    regressoes = []
+    for rota, antes in base["rotas"].items():
+        depois = atual["rotas"].get(rota)
+        if depois is None:
+            continue
+        for metrica in ("p50_ms", "p95_ms", "p99_ms"):
+            if antes[metrica] > 0 and depois[metrica] > antes[metrica] * (1 + tolerancia):
+                regressoes.append({"rota": rota, "metrica": metrica, "antes": antes[metrica], "depois": depois[metrica]})
+        if antes["rps"] > 0 and depois["rps"] < antes["rps"] * (1 - tolerancia):
+            regressoes.append({"rota": rota, "metrica": "rps", "antes": antes["rps"], "depois": depois["rps"]})
+        if depois["erros"] > antes["erros"]:
+            regressoes.append({"rota": rota, "metrica": "erros", "antes": antes["erros"], "depois": depois["erros"]})
+    return regressoes
+
+
+def salvar(resultado: dict, caminho: str):
+    with open(caminho, "w", encoding="utf-8") as arquivo:
+        json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+
+
+def carregar(caminho: str) -> dict:
+    with open(caminho, encoding="utf-8") as arquivo:
+        return json.load(arquivo)
@@ -0,0 +1,294 @@
+import csv
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+from beanie.odm.utils.dump import get_dict
+from pydantic import ValidationError
+from pymongo import ASCENDING, ReplaceOne
+from pymongo.errors import BulkWriteError
+from models.consultas import Consulta
+from models.medicos import Medico, campos_busca_medico
+from models.paciente import Paciente
+from services.repositorios.mongo import acrescentar_consultas_aos_pais, ajustar_resumos
+
+# Importação e exportação em streaming das coleções da clínica (NDJSON ou CSV), direto no MongoDB.
+# A memória fica limitada ao tamanho do lote, e um arquivo de checkpoint permite retomar
+# uma execução interrompida do ponto em que parou.
+# Na importação, o checkpoint guarda os _id do lote antes de gravá-lo, e a retomada reconhece o lote
+# que ficou pela metade e o acrescenta aos pais sem repetir. Na exportação, guarda o tamanho do
+# arquivo, que a retomada corta de volta.
+
+COLECOES = {"pacientes": Paciente, "medicos": Medico, "consultas": Consulta}
+
+# Campos de lista, gravados como JSON dentro da célula quando o formato é CSV
+CAMPOS_LISTA = {"consultas", "medicos", "pacientes", "nome_busca", "especialidade_busca"}
+
+CODIGO_ID_REPETIDO = 11000  # Erro de chave duplicada do MongoDB
+
+
+class Progresso:
+    def __init__(self, descricao: str, intervalo: float = 5.0, saida: TextIO = sys.stderr):
+        self.descricao = descricao
+        self.intervalo = intervalo
+        self.saida = saida
+        self.inicio = time.monotonic()
+        self.ultimo_relatorio = self.inicio
+        self.total = 0
+        self.rejeitados = 0
+
+    def avancar(self, quantidade: int, rejeitados: int = 0):
+        self.total += quantidade
+        self.rejeitados += rejeitados
+        agora = time.monotonic()
+        if agora - self.ultimo_relatorio >= self.intervalo:
+            self.ultimo_relatorio = agora
+            self.relatar()
+
+    @property
+    def documentos_por_segundo(self) -> float:
+        decorrido = time.monotonic() - self.inicio
+        return self.total / decorrido if decorrido > 0 else 0.0
+
+    def relatar(self, final: bool = False):
+        decorrido = time.monotonic() - self.inicio
+        prefixo = "concluído" if final else "em andamento"
+        print(
+            f"[{self.descricao}] {prefixo}: {self.total} documentos, {self.rejeitados} rejeitados, "
+            f"{decorrido:.1f}s ({self.documentos_por_segundo:.0f} docs/s)",
+            file=self.saida,
+        )
+
+
+def _ler_checkpoint(caminho: Optional[str]) -> dict:
+    if not caminho or not os.path.exists(caminho):
+        return {}
+    with open(caminho, encoding="utf-8") as arquivo:
+        return json.load(arquivo)
+
+
+# Grava o checkpoint num arquivo temporário e renomeia, para nunca deixar um checkpoint pela metade
+def _gravar_checkpoint(caminho: Optional[str], dados: dict):
+    if not caminho:
+        return
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as arquivo:
+        json.dump(dados, arquivo)
+    os.replace(temporario, caminho)
+
+
+def _para_json(valor: Any) -> Any:
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+def _registros_ndjson(arquivo: TextIO) -> Iterator[Dict[str, Any]]:
+    for linha in arquivo:
+        linha = linha.strip()
+        if linha:
+            yield json.loads(linha)
+
+
+def _registros_csv(arquivo: TextIO) -> Iterator[Dict[str, Any]]:
+    for linha in csv.DictReader(arquivo):
+        registro = {}
+        for campo, valor in linha.items():
+            if valor == "":
+                registro[campo] = None
+            elif campo in CAMPOS_LISTA:
+                registro[campo] = json.loads(valor)
+            else:
+                registro[campo] = valor
+        yield registro
+
+
+def _preparar(modelo, registro: Dict[str, Any]):
+    documento = modelo.model_validate(registro)
+    if modelo is Medico and not documento.nome_busca:
+        for campo, valor in campos_busca_medico(documento.nome, documento.especialidade).items():
+            setattr(documento, campo, valor)
+    return documento
+
+
+# Grava um lote com insert_many (ou ReplaceOne com upsert) não ordenado e devolve os documentos
+# gravados e os recusados por _id repetido
+async def _gravar_lote(modelo, documentos: List[Any], upsert: bool) -> Tuple[List[Any], List[Any]]:
+    colecao = modelo.get_motor_collection()
+    brutos = [get_dict(documento, to_db=True) for documento in documentos]
+    try:
+        if upsert:
+            await colecao.bulk_write(
+                [ReplaceOne({"_id": bruto["_id"]}, bruto, upsert=True) for bruto in brutos], ordered=False
+            )
+        else:
+            await colecao.insert_many(brutos, ordered=False)
+        return documentos, []
+    except BulkWriteError as e:
+        erros = e.details.get("writeErrors", [])
+        for erro in erros[:5]:
+            print(f"  erro ao gravar: {erro.get('errmsg')}", file=sys.stderr)
+        falhas = {erro["index"]: erro.get("code") for erro in erros}
+        gravados = [documento for posicao, documento in enumerate(documentos) if posicao not in falhas]
+        repetidos = [documentos[posicao] for posicao, codigo in falhas.items() if codigo == CODIGO_ID_REPETIDO]
+        return gravados, repetidos
+
+
+# Consultas do lote que já existem no banco (o upsert vai substituí-las), com o que o resumo usa
+async def _consultas_existentes(lote: List[Consulta]) -> Dict[str, dict]:
+    documentos = await Consulta.get_motor_collection().find(
+        {"_id": {"$in": [consulta.id for consulta in lote]}}, {"medico_id": 1, "data_hora": 1, "status": 1},
+    ).to_list(None)
+    return {documento["_id"]: documento for documento in documentos}
+
+
+# O resumo dos relatórios acompanha as consultas importadas: as gravadas entram e, com upsert,
+# a versão substituída de cada uma sai
+async def _ajustar_resumo_importado(gravados: List[Consulta], substituidas: Dict[str, dict]):
+    variacoes = [(c.data_hora, c.medico_id, c.status, 1) for c in gravados]
+    for consulta in gravados:
+        anterior = substituidas.get(consulta.id)
+        if anterior:
+            variacoes.append((anterior["data_hora"], anterior["medico_id"], anterior["status"], -1))
+    await ajustar_resumos(variacoes)
+
+
+# Importa um arquivo NDJSON/CSV para uma coleção, validando e gravando em lotes
+# Com atualizar_referencias, as consultas importadas também são acrescentadas aos pacientes e médicos
+async def importar(
+    colecao: str,
+    caminho: str,
+    formato: str = "ndjson",
+    tamanho_lote: int = 1000,
+    upsert: bool = False,
+    checkpoint: Optional[str] = None,
+    atualizar_referencias: bool = False,
+) -> Progresso:
+    modelo = COLECOES[colecao]
+    estado = _ler_checkpoint(checkpoint)
+    if estado.get("arquivo") != caminho:
+        estado = {}
+    ja_processados = estado.get("processados", 0)
+    # _id do lote que estava sendo gravado quando a execução anterior parou
+    ids_pendentes = estado.get("lote")
+    progresso = Progresso(f"importar {colecao}")
+
+    with open(caminho, encoding="utf-8", newline="") as arquivo:
+        registros = _registros_csv(arquivo) if formato == "csv" else _registros_ndjson(arquivo)
+        # Pula o que já foi gravado numa execução anterior
+        for _ in range(ja_processados):
+            if next(registros, None) is None:
+                break
+        processados = ja_processados
+
+        while True:
+            lote, lidos, rejeitados = [], 0, 0
+            for registro in registros:
+                lidos += 1
+                try:
+                    lote.append(_preparar(modelo, registro))
+                except ValidationError as e:
+                    rejeitados += 1
+                    print(f"  registro {processados + lidos} inválido: {e.errors()[0]['msg']}", file=sys.stderr)
+                if lidos >= tamanho_lote:
+                    break
+            if not lidos:
+                break
+
+            # O lote que a execução anterior estava gravando: o que ela já gravou volta como repetido
+            # (ou é substituído, com upsert), e pode já estar nos pais
+            retomado = ids_pendentes == [documento.id for documento in lote]
+            ids_pendentes = None
+            _gravar_checkpoint(checkpoint, {
+                "arquivo": caminho, "colecao": colecao, "processados": processados,
+                "lote": [documento.id for documento in lote],
+            })
+
+            substituidas = await _consultas_existentes(lote) if upsert and modelo is Consulta and lote else {}
+            gravados, repetidos = await _gravar_lote(modelo, lote, upsert) if lote else ([], [])
+            if gravados and modelo is Consulta:
+                await _ajustar_resumo_importado(gravados, substituidas)
+            # Na retomada, as consultas que a execução anterior gravou também entram: ela pode ter
+            # parado antes de acrescentá-las aos pais
+            referenciadas = gravados + repetidos if retomado else gravados
+            if referenciadas and atualizar_referencias and modelo is Consulta:
+                por_paciente, por_medico = defaultdict(list), defaultdict(list)
+                for consulta in referenciadas:
+                    por_paciente[consulta.paciente_id].append(consulta.id)
+                    por_medico[consulta.medico_id].append(consulta.id)
+                await acrescentar_consultas_aos_pais(Paciente, por_paciente, sem_repetir=retomado)
+                await acrescentar_consultas_aos_pais(Medico, por_medico, sem_repetir=retomado)
+
+            processados += lidos
+            progresso.avancar(len(gravados), rejeitados + len(lote) - len(gravados))
+            _gravar_checkpoint(checkpoint, {"arquivo": caminho, "colecao": colecao, "processados": processados})
+
+    progresso.relatar(final=True)
+    return progresso
+
+
+# Exporta uma coleção para NDJSON/CSV percorrendo um cursor do servidor ordenado por _id
+# Com checkpoint, uma exportação interrompida continua depois do último _id gravado; o que foi escrito
+# depois do checkpoint (e que vai ser escrito de novo) é cortado do arquivo
+async def exportar(
+    colecao: str,
+    caminho: str,
+    formato: str = "ndjson",
+    tamanho_lote: int = 1000,
+    checkpoint: Optional[str] = None,
+) -> Progresso:
+    modelo = COLECOES[colecao]
+    estado = _ler_checkpoint(checkpoint)
+    retomar = estado.get("arquivo") == caminho and os.path.exists(caminho)
+    ultimo_id = estado.get("ultimo_id") if retomar else None
+    posicao = estado.get("posicao") if retomar else None
+    progresso = Progresso(f"exportar {colecao}")
+
+    campos = ["_id"] + [
+        campo.alias or nome for nome, campo in modelo.model_fields.items()
+        if nome not in ("id", "revision_id")
+    ]
+    filtro = {"_id": {"$gt": ultimo_id}} if ultimo_id else {}
+    cursor = modelo.get_motor_collection().find(filtro, sort=[("_id", ASCENDING)], batch_size=tamanho_lote)
+
+    modo = "a" if ultimo_id else "w"
+    with open(caminho, modo, encoding="utf-8", newline="") as arquivo:
+        if ultimo_id and posicao is not None:
+            arquivo.truncate(posicao)
+        escritor = csv.DictWriter(arquivo, fieldnames=campos, extrasaction="ignore") if formato == "csv" else None
+        if escritor and not ultimo_id:
+            escritor.writeheader()
+        pendentes = 0
+        try:
+            async for documento in cursor:
+                if escritor:
+                    escritor.writerow({
+                        campo: json.dumps(valor, default=_para_json) if isinstance(valor, list)
+                        else _para_json(valor) if isinstance(valor, datetime)
+                        else valor
+                        for campo, valor in documento.items()
+                    })
+                else:
+                    arquivo.write(json.dumps(documento, default=_para_json, ensure_ascii=False) + "\n")
+                pendentes += 1
+                if pendentes >= tamanho_lote:
+                    arquivo.flush()
+                    progresso.avancar(pendentes)
+                    pendentes = 0
+                    _gravar_checkpoint(checkpoint, {
+                        "arquivo": caminho, "colecao": colecao, "ultimo_id": documento["_id"], "posicao": arquivo.tell(),
+                    })
+            arquivo.flush()
+            progresso.avancar(pendentes)
+            if progresso.total:
+                _gravar_checkpoint(checkpoint, {
+                    "arquivo": caminho, "colecao": colecao, "ultimo_id": documento["_id"], "posicao": arquivo.tell(),
+                })
+        finally:
+            await cursor.close()
+
+    progresso.relatar(final=True)
+    return progresso
@@ -0,0 +1,198 @@
+import calendar
+import hashlib
+import random
+import struct
+import sys
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Set
+from bson import ObjectId
+from models.medicos import campos_busca_medico
+from ferramentas.dados import Progresso
+from services.repositorios import repositorio
+
+# Base sintética e reproduzível da clínica, usada pelos testes de carga (ver ferramentas/carga.py).
+# Cada documento é gerado só a partir da semente e do seu índice, então a carga consegue
+# recalcular IDs, nomes e especialidades sem consultar o banco.
+# No SQLite os IDs são inteiros (ids_inteiros): o índice + 1 de cada tabela.
+
+NOMES = [
+    "Ana", "Bruno", "Carla", "Daniel", "Eduarda", "Felipe", "Gabriela", "Heitor", "Isabela", "João",
+    "Júlia", "Lucas", "Mariana", "Mateus", "Natália", "Otávio", "Paula", "Rafael", "Sofia", "Tiago",
+]
+SOBRENOMES = [
+    "Almeida", "Barbosa", "Cardoso", "Conceição", "Costa", "Ferreira", "Gomes", "Lima", "Melo", "Oliveira",
+    "Pereira", "Ribeiro", "Rocha", "Santos", "Silva", "Sousa",
+]
+ESPECIALIDADES = [
+    "Cardiologia", "Clínica Geral", "Dermatologia", "Endocrinologia", "Ginecologia", "Neurologia",
+    "Oftalmologia", "Ortopedia", "Pediatria", "Psiquiatria",
+]
+PROBLEMAS = ["Nenhum", "Hipertensão", "Diabetes", "Asma", "Alergia a penicilina", "Enxaqueca"]
+STATUS = ["Agendada", "Concluída", "Cancelada"]
+
+INICIO_PERIODO = datetime(2023, 1, 1, 8, 0)
+DIAS_PERIODO = 730  # As consultas ficam espalhadas por dois anos a partir de INICIO_PERIODO
+# As datas da base são UTC sem fuso; timestamp() as leria no fuso da máquina e os IDs mudariam com ele
+_TIMESTAMP_BASE = calendar.timegm(INICIO_PERIODO.utctimetuple())
+
+
+class BaseSintetica:
+    def __init__(
+        self, semente: int = 42, pacientes: int = 100_000, medicos: int = 2_000, consultas: int = 1_000_000,
+        ids_inteiros: bool = False,
+    ):
+        self.semente = semente
+        self.pacientes = pacientes
+        self.medicos = medicos
+        self.consultas = consultas
+        self.ids_inteiros = ids_inteiros
+
+    def _rng(self, tipo: str, indice: int) -> random.Random:
+        return random.Random(f"{self.semente}:{tipo}:{indice}")
+
+    # ObjectId determinístico: timestamp crescente com o índice e o restante derivado da semente
+    def id(self, tipo: str, indice: int) -> str:
+        if self.ids_inteiros:
+            return str(indice + 1)
+        resto = hashlib.blake2b(f"{self.semente}:{tipo}:{indice}".encode(), digest_size=8).digest()
+        return str(ObjectId(struct.pack(">I", _TIMESTAMP_BASE + indice) + resto))
+
+    # Revisão inicial, também derivada da semente (cada atualização troca por uma nova): a carga
+    # consegue montar o If-None-Match dos documentos ainda não alterados sem consultar a API
+    def revisao(self, tipo: str, indice: int) -> str:
+        return hashlib.blake2b(f"{self.semente}:{tipo}:{indice}:revisao".encode(), digest_size=12).hexdigest()
+
+    def id_paciente(self, indice: int) -> str:
+        return self.id("paciente", indice)
+
+    def id_medico(self, indice: int) -> str:
+        return self.id("medico", indice)
+
+    def id_consulta(self, indice: int) -> str:
+        return self.id("consulta", indice)
+
+    def nome_medico(self, indice: int) -> str:
+        rng = self._rng("medico", indice)
+        return f"{rng.choice(NOMES)} {rng.choice(SOBRENOMES)}"
+
+    def especialidade_medico(self, indice: int) -> str:
+        return ESPECIALIDADES[indice % len(ESPECIALIDADES)]
+
+    # Distribuição desigual: poucos pacientes concentram muitas consultas e os de índice alto
+    # costumam não ter nenhuma (o que alimenta /pacientes/sem-consultas/)
+    def consulta(self, indice: int) -> dict:
+        rng = self._rng("consulta", indice)
+        paciente = int(self.pacientes * rng.random() ** 2)
+        medico = rng.randrange(self.medicos)
+        data_hora = INICIO_PERIODO + timedelta(days=rng.randrange(DIAS_PERIODO), minutes=30 * rng.randrange(20))
+        return {
+            "_id": self.id_consulta(indice),
+            "paciente_id": self.id_paciente(paciente),
+            "medico_id": self.id_medico(medico),
+            "data_hora": data_hora,
+            "status": rng.choices(STATUS, weights=[2, 7, 1])[0],
+            "observacoes": "",
+            "revisao": self.revisao("consulta", indice),
+            "data_atualizacao": INICIO_PERIODO,
+        }
+
+    def paciente(self, indice: int, consultas: List[str], medicos: List[str]) -> dict:
+        rng = self._rng("paciente", indice)
+        nome = f"{rng.choice(NOMES)} {rng.choice(SOBRENOMES)} {rng.choice(SOBRENOMES)}"
+        paciente = {
+            "_id": self.id_paciente(indice),
+            "nome": nome,
+            "telefone": f"85{rng.randrange(10**8, 10**9)}",
+            "email": f"paciente{indice}@email.com",
+            "sexo": rng.choice(["M", "F", "Outro"]),
+            "peso": round(rng.uniform(45, 120), 1),
+            "altura": round(rng.uniform(1.45, 2.0), 2),
+            "problemas_de_saude": rng.choice(PROBLEMAS),
+            "data_criacao": INICIO_PERIODO - timedelta(days=rng.randrange(365)),
+            "consultas": consultas,
+            "medicos": medicos,
+            "total_consultas": len(consultas),
+        }
+        return {**paciente, "revisao": self.revisao("paciente", indice), "data_atualizacao": paciente["data_criacao"]}
+
+    def medico(self, indice: int, consultas: List[str], pacientes: List[str]) -> dict:
+        rng = self._rng("medico", indice)
+        nome, especialidade = self.nome_medico(indice), self.especialidade_medico(indice)
+        medico = {
+            "_id": self.id_medico(indice),
+            "nome": nome,
+            "especialidade": especialidade,
+            "crm": f"{10000 + indice}-CE",
+            "email": f"medico{indice}@email.com",
+            "telefone": f"85{rng.randrange(10**8, 10**9)}",
+            "data_criacao": INICIO_PERIODO - timedelta(days=365 + rng.randrange(365)),
+            "consultas": consultas,
+            "pacientes": pacientes,
+            "total_pacientes": len(pacientes),
+            **campos_busca_medico(nome, especialidade),
+        }
+        return {**medico, "revisao": self.revisao("medico", indice), "data_atualizacao": medico["data_criacao"]}
+
+
+async def _inserir_em_lotes(colecao: str, documentos: Iterator[dict], tamanho_lote: int, descricao: str):
+    progresso, lote = Progresso(descricao), []
+    for documento in documentos:
+        lote.append(documento)
+        if len(lote) >= tamanho_lote:
+            await repositorio().inserir_documentos(colecao, lote)
+            progresso.avancar(len(lote))
+            lote = []
+    if lote:
+        await repositorio().inserir_documentos(colecao, lote)
+        progresso.avancar(len(lote))
+    progresso.relatar(final=True)
+
+
+# Grava a base pelo repositório já aberto: primeiro as consultas, guardando os índices dos pais
+# (para as listas de consultas, pacientes e médicos), depois pacientes e médicos
+async def popular(base: BaseSintetica, tamanho_lote: int = 5000, limpar: bool = False):
+    if limpar:
+        await repositorio().limpar()
+
+    consultas_paciente: Dict[int, List[int]] = defaultdict(list)
+    consultas_medico: Dict[int, List[int]] = defaultdict(list)
+    medicos_paciente: Dict[int, Set[int]] = defaultdict(set)
+    pacientes_medico: Dict[int, Set[int]] = defaultdict(set)
+    indice_paciente = {base.id_paciente(i): i for i in range(base.pacientes)}
+    indice_medico = {base.id_medico(i): i for i in range(base.medicos)}
+
+    def consultas() -> Iterator[dict]:
+        for j in range(base.consultas):
+            consulta = base.consulta(j)
+            paciente, medico = indice_paciente[consulta["paciente_id"]], indice_medico[consulta["medico_id"]]
+            consultas_paciente[paciente].append(j)
+            consultas_medico[medico].append(j)
+            medicos_paciente[paciente].add(medico)
+            pacientes_medico[medico].add(paciente)
+            yield consulta
+
+    def pacientes() -> Iterator[dict]:
+        for i in range(base.pacientes):
+            yield base.paciente(
+                i,
+                [base.id_consulta(j) for j in consultas_paciente.pop(i, [])],
+                [base.id_medico(m) for m in sorted(medicos_paciente.pop(i, ()))],
+            )
+
+    def medicos() -> Iterator[dict]:
+        for i in range(base.medicos):
+            yield base.medico(
+                i,
+                [base.id_consulta(j) for j in consultas_medico.pop(i, [])],
+                [base.id_paciente(p) for p in sorted(pacientes_medico.pop(i, ()))],
+            )
+
+    await _inserir_em_lotes("consultas", consultas(), tamanho_lote, "popular consultas")
+    await _inserir_em_lotes("pacientes", pacientes(), tamanho_lote, "popular pacientes")
+    await _inserir_em_lotes("medicos", medicos(), tamanho_lote, "popular medicos")
+    print(
+        f"base sintética (semente {base.semente}): {base.pacientes} pacientes, "
+        f"{base.medicos} médicos, {base.consultas} consultas",
+        file=sys.stderr,
+    )
@@ -1,19 +1,37 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from database.database import init_database  # Importando a função de inicialização do Beanie
+from services.repositorios import abrir_repositorio, fechar_repositorio  # MongoDB (Beanie) ou SQLite, conforme BANCO_BACKEND
+from services.metricas import MiddlewareMetricas
 from routes.paciente import router as pacientes_router
 from routes.consultas import router as consultas_router
 from routes.medicos import router as medicos_router
+from routes.monitoramento import router as monitoramento_router
+from routes.relatorios import router as relatorios_router
+from routes.tarefas import router as tarefas_router
+from services.agenda_ao_vivo import difusor_consultas
+from services.exclusoes import iniciar_exclusoes, parar_exclusoes
 import uvicorn
 
-app = FastAPI()
+# Ciclo de vida da aplicação: cada worker abre as conexões do banco ao iniciar e as fecha ao encerrar
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await abrir_repositorio()  # Cria o cliente (ou o pool do SQLite) com a configuração do ambiente e prepara o banco
+    await iniciar_exclusoes()  # Retoma (e passa a vigiar) as exclusões em cascata abandonadas por outro worker
+    yield
+    await parar_exclusoes()  # As que ficarem no meio são retomadas na próxima inicialização
+    await difusor_consultas.parar()  # O fluxo de alterações da agenda ao vivo lê do banco que vai ser fechado
+    await fechar_repositorio()
 
-# Inicializando o banco de dados com Beanie
-@app.on_event("startup")
-async def startup_db():
-    await init_database()  # Inicializa a conexão com o banco de dados e o Beanie
+app = FastAPI(lifespan=lifespan)
+
+# Latência por rota, comandos do MongoDB por requisição e cabeçalho Server-Timing (expostos em /metrics)
+app.add_middleware(MiddlewareMetricas)
 
 # Incluindo as rotas
 app.include_router(pacientes_router)
 app.include_router(consultas_router)
 app.include_router(medicos_router)
+app.include_router(relatorios_router)
+app.include_router(tarefas_router)
+app.include_router(monitoramento_router)
 
@@ -4,12 +4,17 @@ from pydantic import BaseModel, Field
 from bson import ObjectId
 from beanie import Document
 from typing import List
+from pymongo import ASCENDING, IndexModel
 
 def objectid_to_str(obj):
     if isinstance(obj, ObjectId):
         return str(obj)
     return obj
 
+# Nova revisão de um documento, trocada a cada atualização (é o ETag das rotas de leitura)
+def nova_revisao() -> str:
+    return str(ObjectId())
+
 
 # Define o modelo de dados base
 class ConsultaBase(BaseModel):
@@ -27,9 +32,19 @@ class ConsultaCreate(ConsultaBase):
 # Modelo Beanie para consulta com acesso ao MongoDB
 class Consulta(ConsultaBase, Document):
     id: str  # ID no formato ObjectId
+    # Revisão e data da última alteração (ETag e Last-Modified), fora das respostas
+    revisao: str = Field(default_factory=nova_revisao, exclude=True)
+    data_atualizacao: datetime = Field(default_factory=datetime.utcnow, exclude=True)
 
     class Settings:
         collection = "consultas"  # Nome da coleção no MongoDB
+        # Índices usados pelas buscas dos services (por paciente, por médico e por período)
+        # O _id no final cobre a ordenação (data_hora, _id) da paginação por cursor
+        indexes = [
+            IndexModel([("paciente_id", ASCENDING), ("data_hora", ASCENDING), ("_id", ASCENDING)], name="paciente_data_hora_id"),
+            IndexModel([("medico_id", ASCENDING), ("data_hora", ASCENDING), ("_id", ASCENDING)], name="medico_data_hora_id"),
+            IndexModel([("data_hora", ASCENDING), ("_id", ASCENDING)], name="data_hora_id"),
+        ]
 
     class Config:
         populate_by_name = True  # Permite usar "_id" como "id"
@@ -39,6 +54,31 @@ class Consulta(ConsultaBase, Document):
             ObjectId: str
         }
 
+# Status das consultas que não ocupam o horário do médico na agenda
+STATUS_SEM_HORARIO = ["Cancelada"]
+
 class ConsultaResponse(BaseModel):
     consultas: List[Consulta]  # Defina corretamente sua classe `Consulta`
-    quantidade: int
\ No newline at end of file
+    quantidade: Optional[int]  # None quando o total não é pedido (total=nenhum)
+    next_cursor: Optional[str] = None  # Cursor da próxima página (paginação por keyset)
+
+# Pedido de estatísticas de consultas para vários pacientes de uma vez
+class PedidoEstatisticasConsultas(BaseModel):
+    paciente_ids: List[str] = Field(..., max_length=10000)
+
+# Contagem e média de dias entre consultas de um paciente
+class EstatisticasConsultas(BaseModel):
+    paciente_id: str
+    contagem_consultas: int
+    media_tempo_consultas: float
+
+# Horário livre na agenda de um médico: [inicio, fim)
+class HorarioLivre(BaseModel):
+    inicio: datetime
+    fim: datetime
+
+# Horários livres de um médico num dia ou numa semana
+class HorariosLivres(BaseModel):
+    medico_id: str
+    duracao_minutos: int
+    horarios: List[HorarioLivre]
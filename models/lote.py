@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+# Resultado de um item de uma criação em lote
+class ItemLote(BaseModel):
+    indice: int  # Posição do item na lista enviada
+    sucesso: bool
+    id: Optional[str] = None
+    erro: Optional[str] = None
+
+# Relatório de uma criação em lote, com o resultado de cada item
+class ResultadoLote(BaseModel):
+    inseridos: int
+    falhas: int
+    itens: List[ItemLote]
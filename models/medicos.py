@@ -1,9 +1,24 @@
+import unicodedata
 from pydantic import BaseModel, EmailStr, Field
 from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
 from beanie import Document
-from models.consultas import objectid_to_str
+from pymongo import ASCENDING, IndexModel
+from models.consultas import nova_revisao, objectid_to_str
+
+# Normaliza um texto para busca: minúsculas e sem acentos ("João" -> "joao")
+def normalizar_busca(texto: str) -> str:
+    decomposto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).casefold()
+
+# Termos normalizados de um texto, usados nos campos de busca indexados
+def termos_busca(texto: str) -> List[str]:
+    return normalizar_busca(texto).split()
+
+# Campos de busca derivados de nome e especialidade, mantidos junto com o médico
+def campos_busca_medico(nome: str, especialidade: str) -> dict:
+    return {"nome_busca": termos_busca(nome), "especialidade_busca": termos_busca(especialidade)}
 
 # Define o modelo de dados base
 class MedicoBase(BaseModel):
@@ -30,6 +45,15 @@ class MedicoRetorno(MedicoBase):
             ObjectId: str
         }
 
+# Projeção com os campos de listagem do médico, sem as listas de consultas, pacientes e termos de busca
+class MedicoResumo(MedicoBase):
+    pass
+
+# Projeção do médico sem as listas, com a revisão: o que o cache guarda (ver services/cache.py)
+class MedicoSemListas(MedicoResumo):
+    revisao: str = Field(default_factory=nova_revisao, exclude=True)
+    data_atualizacao: datetime = Field(default_factory=datetime.utcnow, exclude=True)
+
 # Modelo Beanie para médico com acesso ao MongoDB
 class Medico(MedicoBase, Document):
     id: str  # ID no MongoDB
@@ -37,9 +61,23 @@ class Medico(MedicoBase, Document):
 
     consultas: List[str] = [] # Lista de ObjectId das consultas
     pacientes: List[str] = []  # Lista de ObjectId dos pacientes
+    # Contador mantido junto com a lista de pacientes (ver services/repositorios)
+    total_pacientes: int = 0
+
+    # Termos normalizados de nome e especialidade (ver campos_busca_medico)
+    nome_busca: List[str] = []
+    especialidade_busca: List[str] = []
+    # Revisão e data da última alteração (ETag e Last-Modified), fora das respostas
+    revisao: str = Field(default_factory=nova_revisao, exclude=True)
+    data_atualizacao: datetime = Field(default_factory=datetime.utcnow, exclude=True)
 
     class Settings:
         collection = "medicos"  # Nome da coleção no MongoDB
+        # Índices multikey para a busca por prefixo dos termos normalizados
+        indexes = [
+            IndexModel([("nome_busca", ASCENDING)], name="nome_busca"),
+            IndexModel([("especialidade_busca", ASCENDING)], name="especialidade_busca"),
+        ]
 
     class Config:
         populate_by_name = True
@@ -3,7 +3,8 @@ from typing import Optional, List
 from datetime import datetime
 from bson import ObjectId
 from beanie import Document
-from models.consultas import objectid_to_str
+from pymongo import ASCENDING, IndexModel
+from models.consultas import nova_revisao, objectid_to_str
 
 
 # Modelo base de Paciente
@@ -45,9 +46,18 @@ class Paciente(PacienteBase, Document):
 
     consultas: List[str] = []  # Lista de ObjectId das consultas
     medicos: List[str] = []  # Lista de ObjectId dos médicos
+    # Contador mantido junto com a lista de consultas (ver services/repositorios)
+    total_consultas: int = 0
+    # Revisão e data da última alteração (ETag e Last-Modified), fora das respostas
+    revisao: str = Field(default_factory=nova_revisao, exclude=True)
+    data_atualizacao: datetime = Field(default_factory=datetime.utcnow, exclude=True)
 
     class Settings:
         collection = "pacientes"  # Nome da coleção no MongoDB
+        # Índice multikey para buscar os pacientes de um médico
+        indexes = [
+            IndexModel([("medicos", ASCENDING)], name="medicos"),
+        ]
 
     class Config:
         populate_by_name = True
@@ -57,6 +67,20 @@ class Paciente(PacienteBase, Document):
             ObjectId: str
         }
 
+# Projeção com os campos de listagem do paciente, sem as listas de consultas e médicos
+class PacienteResumo(PacienteBase):
+    pass
+
+# Projeção do paciente sem as listas, com a revisão: o que o cache guarda (ver services/cache.py)
+class PacienteSemListas(PacienteResumo):
+    revisao: str = Field(default_factory=nova_revisao, exclude=True)
+    data_atualizacao: datetime = Field(default_factory=datetime.utcnow, exclude=True)
+
+# Projeção com apenas o nome do paciente, usada para montar listagens
+class PacienteNome(BaseModel):
+    id: str = Field(alias="_id")
+    nome: str
+
 # Modelo que inclui consultas para pacientes
 class PacienteComConsultas(PacienteRetorno):
     consultas: List[str] = [] # Agora armazena ObjectIds das consultas
@@ -0,0 +1,39 @@
+from datetime import date, datetime
+from typing import Dict, Optional
+from beanie import Document
+from pydantic import BaseModel
+from pymongo import ASCENDING, IndexModel
+
+# Resumo materializado das consultas: quantas consultas cada médico tem em cada dia, por status.
+# É atualizado a cada consulta criada, alterada ou removida, e os relatórios somam estas linhas
+# em vez de percorrer as consultas (a especialidade vem do médico, na hora do relatório)
+class ResumoConsultas(Document):
+    dia: datetime  # Meia-noite (UTC) do dia da consulta
+    medico_id: str
+    status: str
+    quantidade: int = 0
+
+    class Settings:
+        collection = "resumo_consultas"
+        indexes = [
+            IndexModel([("dia", ASCENDING), ("medico_id", ASCENDING), ("status", ASCENDING)], name="dia_medico_status", unique=True),
+            IndexModel([("medico_id", ASCENDING), ("dia", ASCENDING)], name="medico_dia"),
+        ]
+
+# Consultas de um dia, no total e por status
+class ConsultasPorDia(BaseModel):
+    dia: date
+    total: int
+    por_status: Dict[str, int]
+
+# Consultas de um médico no período, no total e por status
+class ConsultasPorMedico(BaseModel):
+    medico_id: str
+    total: int
+    por_status: Dict[str, int]
+
+# Consultas de uma especialidade no período, no total e por status
+class ConsultasPorEspecialidade(BaseModel):
+    especialidade: Optional[str]  # None para consultas de médicos que não existem mais
+    total: int
+    por_status: Dict[str, int]
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+from typing import Optional
+from pydantic import BaseModel, Field
+from bson import ObjectId
+from beanie import Document
+from pymongo import ASCENDING, IndexModel
+
+# Tipos de tarefa em segundo plano: a limpeza das consultas de um paciente ou de um médico excluído
+TAREFA_EXCLUSAO_PACIENTE = "exclusao_paciente"
+TAREFA_EXCLUSAO_MEDICO = "exclusao_medico"
+
+# Estados de uma tarefa; as pendentes e as em execução são retomadas quando a aplicação inicia
+TAREFA_PENDENTE = "pendente"
+TAREFA_EXECUTANDO = "executando"
+TAREFA_CONCLUIDA = "concluida"
+TAREFA_FALHOU = "falhou"
+STATUS_TAREFA_INACABADA = [TAREFA_PENDENTE, TAREFA_EXECUTANDO]
+
+# atualizada_em gravada ao reivindicar a tarefa: sempre depois da lida, mesmo no mesmo milissegundo
+# (a precisão das datas no MongoDB), para a reivindicação mudar o documento e a de outro worker falhar
+def data_reivindicacao(atualizada_em: datetime) -> datetime:
+    return max(datetime.utcnow(), atualizada_em + timedelta(milliseconds=1))
+
+# Define o modelo de dados base
+class TarefaBase(BaseModel):
+    id: Optional[str] = Field(default_factory=lambda: str(ObjectId()), alias="_id")
+    tipo: str  # TAREFA_EXCLUSAO_PACIENTE ou TAREFA_EXCLUSAO_MEDICO
+    alvo_id: str  # ID do paciente ou do médico excluído
+    status: str = TAREFA_PENDENTE
+    consultas_removidas: int = 0
+    criada_em: datetime = Field(default_factory=datetime.utcnow)
+    atualizada_em: datetime = Field(default_factory=datetime.utcnow)
+    erro: Optional[str] = None  # Mensagem da falha, quando status é TAREFA_FALHOU
+
+# Modelo para retorno de tarefas
+class TarefaRetorno(TarefaBase):
+    id: str
+
+    class Config:
+        populate_by_name = True
+        from_attributes = True
+
+# Modelo Beanie para tarefa com acesso ao MongoDB
+class Tarefa(TarefaBase, Document):
+    id: str
+
+    class Settings:
+        collection = "tarefas"
+        # As tarefas inacabadas são procuradas ao iniciar
+        indexes = [IndexModel([("status", ASCENDING)], name="status")]
+
+    class Config:
+        populate_by_name = True
+        from_attributes = True
+        arbitrary_types_allowed=True
+        json_encoders = {
+            ObjectId: str
+        }
@@ -1,16 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from models.consultas import ConsultaCreate, Consulta, ConsultaResponse
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from models.consultas import (
+    ConsultaCreate, Consulta, ConsultaResponse, PedidoEstatisticasConsultas, EstatisticasConsultas, HorariosLivres
+)
 from models.paciente import Paciente
+from models.lote import ResultadoLote
 from services.consultas import (
     adicionar_consulta_db, listar_consultas_db, buscar_consulta_por_id_db,
     atualizar_consulta_db, excluir_consulta_db, listar_consultas_por_paciente_db,
     listar_pacientes_sem_consultas_db, listar_consultas_por_periodo_db,
-    listar_consultas_com_pacientes, contar_consultas_por_paciente, calcular_media_tempo_entre_consultas
+    contar_consultas_por_periodo_db, exportar_consultas_por_periodo_db,
+    listar_consultas_com_pacientes, contar_consultas_por_paciente, calcular_media_tempo_entre_consultas,
+    estatisticas_consultas_por_pacientes, estatisticas_consultas_por_medico, adicionar_consultas_em_lote_db,
+    revisao_consulta_db
 )
+from services.agenda import FIM_EXPEDIENTE, INICIO_EXPEDIENTE, MAXIMO_DIAS_AGENDA, horarios_livres_db
+from services.agenda_ao_vivo import agenda_ao_vivo
 from database.database import get_db  # Função que retorna a conexão assíncrona do Beanie.
-from datetime import datetime
-from typing import List
+from datetime import date, datetime, time
+from typing import Any, List, Dict, Literal, Optional
 from beanie import PydanticObjectId
+from services.serializacao import resposta_rapida, serializador_consulta, serializador_pagina_consultas
+from services.paginacao import definir_proximo_cursor, proximo_cursor_por_data_hora
+from services.revisoes import definir_validadores, resposta_nao_modificada, revisoes_esperadas
 
 router = APIRouter(tags = ["Consultas"])
 
@@ -24,33 +36,78 @@ async def criar_consulta(consulta: ConsultaCreate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao criar consulta: {str(e)}")
 
+# Rota para criar várias consultas de uma vez
+@router.post("/consultas/bulk", response_model=ResultadoLote)
+async def criar_consultas_em_lote(consultas: List[Dict[str, Any]]):
+    try:
+        return await adicionar_consultas_em_lote_db(consultas)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao criar consultas em lote: {str(e)}")
+
 # Rota para listar as consultas
 @router.get("/consultas/", response_model=ConsultaResponse)
-async def listar_consultas(skip: int = Query(0, ge=0), limit: int = Query(10, le=100)):
+async def listar_consultas(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, le=100),
+    cursor: Optional[str] = Query(None, description="Cursor opaco recebido em next_cursor da página anterior"),
+    total: Literal["exato", "estimado", "cache", "nenhum"] = Query(
+        "exato", description="Como calcular 'quantidade': exato, estimado (sem filtros), cache (TTL curto) ou nenhum"
+    ),
+    paciente_id: Optional[str] = None,
+    medico_id: Optional[str] = None,
+    status: Optional[str] = None
+):
     try:
         # Chama a função de consulta no banco com os parâmetros de paginação
-        return await listar_consultas_db(skip=skip, limit=limit)
+        pagina = await listar_consultas_db(
+            skip=skip, limit=limit, cursor=cursor, total=total,
+            paciente_id=paciente_id, medico_id=medico_id, status=status,
+        )
+        return resposta_rapida(serializador_pagina_consultas, pagina) or pagina
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao listar consultas: {str(e)}")
 
 # Rota para obter a consulta pelo ID
+# Responde com ETag e Last-Modified; com If-None-Match ou If-Modified-Since, 304 se nada mudou
 @router.get("/consultas/{id}", response_model=Consulta)
-async def buscar_consulta(id: str):
+async def buscar_consulta(
+    id: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+):
     try:
+        nao_modificada = await resposta_nao_modificada(
+            lambda: revisao_consulta_db(id), if_none_match, if_modified_since
+        )
+        if nao_modificada:
+            return nao_modificada
         consulta = await buscar_consulta_por_id_db(id)
         if not consulta:
             raise HTTPException(status_code=404, detail="Consulta não encontrada")
-        return consulta
+        resposta = resposta_rapida(serializador_consulta, consulta)
+        definir_validadores(resposta or response, consulta.revisao, consulta.data_atualizacao)
+        return resposta or consulta
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar consulta: {str(e)}")
 
 # Rota para atualizar uma consulta
+# Com If-Match, só atualiza se o ETag ainda for o atual (412 se não for); responde com o ETag novo
 @router.put("/consultas/{id}", response_model=Consulta)
-async def atualizar_consulta(id: str, consulta: ConsultaCreate):
+async def atualizar_consulta(
+    id: str, consulta: ConsultaCreate, response: Response, if_match: Optional[str] = Header(None),
+):
     try:
-        consulta_atualizada = await atualizar_consulta_db(id, consulta)
+        consulta_atualizada = await atualizar_consulta_db(id, consulta, revisoes_esperadas(if_match))
         if not consulta_atualizada:
             raise HTTPException(status_code=404, detail="Consulta não encontrada.")
+        definir_validadores(response, consulta_atualizada.revisao, consulta_atualizada.data_atualizacao)
         return consulta_atualizada
     except HTTPException as e:
         raise e
@@ -70,12 +127,22 @@ async def excluir_consulta(id: str):
 
 # Rota para listar as consultas pelo paciente
 @router.get("/pacientes/{paciente_id}/consultas/", response_model=list[Consulta])
-async def listar_consultas_por_paciente(paciente_id: str, skip: int = Query(0, ge=0), limit: int = Query(10, le=100)):
+async def listar_consultas_por_paciente(
+    paciente_id: str,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, le=100),
+    cursor: Optional[str] = Query(None, description="Cursor opaco recebido no cabeçalho X-Next-Cursor da página anterior")
+):
     try:
-        consultas = await listar_consultas_por_paciente_db(paciente_id, skip, limit)
+        consultas = await listar_consultas_por_paciente_db(paciente_id, skip, limit, cursor)
         if not consultas:
             raise HTTPException(status_code=404, detail="Nenhuma consulta encontrada para este paciente")
-        return consultas
+        resposta = resposta_rapida(serializador_consulta, consultas)
+        definir_proximo_cursor(resposta or response, proximo_cursor_por_data_hora(consultas, limit))
+        return resposta or consultas
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar consultas: {str(e)}")
     
@@ -91,12 +158,52 @@ async def listar_pacientes_sem_consultas(skip: int = Query(0, ge=0), limit: int
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar pacientes: {str(e)}")
 
+# Tipos de resposta em streaming aceitos pela rota de período
+FORMATOS_STREAMING = {"application/x-ndjson": "ndjson", "text/csv": "csv"}
+
+# Escolhe o tipo de resposta pelo Accept: cada tipo pega o q da faixa mais específica que o cobre
+# (tipo exato, depois "tipo/*", depois "*/*"), e ganha o maior q; no empate, a faixa mais
+# específica e, por fim, o JSON. Devolve o tipo de streaming escolhido, ou None para o JSON de sempre
+def _tipo_streaming(accept: str) -> Optional[str]:
+    faixas = {}
+    for item in accept.split(","):
+        tipo, *parametros = [parte.strip() for parte in item.split(";")]
+        if not tipo:
+            continue
+        q = 1.0
+        for parametro in parametros:
+            nome, _, valor = parametro.partition("=")
+            if nome.strip().lower() == "q":
+                try:
+                    q = float(valor)
+                except ValueError:
+                    q = 0.0
+        faixas[tipo.lower()] = q
+
+    melhor, escolhido = (0.0, -1), None
+    for tipo in ("application/json", *FORMATOS_STREAMING):
+        cobertura = [(2, tipo), (1, tipo.split("/")[0] + "/*"), (0, "*/*")]
+        especificidade, q = next(((e, faixas[f]) for e, f in cobertura if f in faixas), (-1, 0.0))
+        if q > 0 and (q, especificidade) > melhor:
+            melhor, escolhido = (q, especificidade), tipo
+    return escolhido if escolhido in FORMATOS_STREAMING else None
+
 # Rota para listar todas as consultas dentro de um periodo
+# Com "Accept: application/x-ndjson" ou "Accept: text/csv" a resposta é enviada em streaming
 @router.get("/consultas/periodo/")
 async def listar_consultas_por_periodo(
+    request: Request,
     inicio: datetime = Query(..., description="Data e hora de início no formato ISO8601"),
-    fim: datetime = Query(..., description="Data e hora de fim no formato ISO8601")
+    fim: datetime = Query(..., description="Data e hora de fim no formato ISO8601"),
+    batch_size: int = Query(500, ge=1, le=10000, description="Tamanho dos lotes lidos do cursor no modo streaming")
 ):
+    tipo = _tipo_streaming(request.headers.get("accept", ""))
+    if tipo:
+        return StreamingResponse(
+            exportar_consultas_por_periodo_db(inicio, fim, FORMATOS_STREAMING[tipo], batch_size),
+            media_type=tipo,
+        )
+
     try:
         resultado = await listar_consultas_por_periodo_db(inicio, fim)
         if not resultado["consultas"]:
@@ -112,12 +219,75 @@ async def listar_consultas_por_periodo(
             status_code=500,
             detail=f"Erro ao buscar consultas: {str(e)}"
         )
+
+# Rota para contar as consultas de um período (útil junto com o modo streaming)
+@router.get("/consultas/periodo/contagem")
+async def contar_consultas_por_periodo(
+    inicio: datetime = Query(..., description="Data e hora de início no formato ISO8601"),
+    fim: datetime = Query(..., description="Data e hora de fim no formato ISO8601")
+):
+    try:
+        return {"contagem": await contar_consultas_por_periodo_db(inicio, fim)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao contar consultas: {str(e)}")
     
+# Rota para listar as consultas de um médico com o nome dos pacientes
+@router.get("/medicos/{medico_id}/consultas", response_model=List[Dict])
+async def listar_consultas_do_medico(
+    medico_id: str,
+    inicio: Optional[datetime] = Query(None, description="Data e hora de início no formato ISO8601"),
+    fim: Optional[datetime] = Query(None, description="Data e hora de fim no formato ISO8601"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, le=100)
+):
+    try:
+        return await listar_consultas_com_pacientes(medico_id, inicio, fim, skip, limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao listar consultas do médico: {str(e)}")
+
+# Rota para listar os horários livres da agenda de um médico num dia ou numa semana
+@router.get("/medicos/{medico_id}/horarios-livres", response_model=HorariosLivres)
+async def listar_horarios_livres(
+    medico_id: str,
+    data: date = Query(..., description="Primeiro dia no formato AAAA-MM-DD"),
+    dias: int = Query(1, ge=1, le=MAXIMO_DIAS_AGENDA, description="Quantidade de dias a partir de data"),
+    inicio_expediente: time = Query(INICIO_EXPEDIENTE, description="Início do atendimento em cada dia (HH:MM)"),
+    fim_expediente: time = Query(FIM_EXPEDIENTE, description="Fim do atendimento em cada dia (HH:MM)"),
+):
+    try:
+        return await horarios_livres_db(medico_id, data, dias, inicio_expediente, fim_expediente)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao calcular horários livres: {str(e)}")
+
+# Rota com a agenda do médico no dia, ao vivo (text/event-stream): um evento "retrato" com as
+# consultas do dia e depois "insert", "update" (a tela substitui ou acrescenta a consulta) e "delete"
+# (a consulta saiu do dia). Na reconexão, o EventSource manda o Last-Event-ID e recebe só o que perdeu
+@router.get("/medicos/{medico_id}/agenda/ao-vivo")
+async def acompanhar_agenda(
+    medico_id: str,
+    data: date = Query(..., description="Dia da agenda no formato AAAA-MM-DD (UTC)"),
+    ultimo_evento: Optional[str] = Query(None, description="id do último evento recebido, se não vier em Last-Event-ID"),
+    last_event_id: Optional[str] = Header(None),
+):
+    try:
+        eventos = await agenda_ao_vivo(medico_id, data, last_event_id or ultimo_evento)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao abrir a agenda ao vivo: {str(e)}")
+    return StreamingResponse(
+        eventos, media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.get("/pacientes/{id}/contagem_consultas")
 async def contagem_consultas(id: str):
     try:
         contagem = await contar_consultas_por_paciente(id)
         return {"id": id, "contagem_consultas": contagem}
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao contar consultas: {str(e)}")
 
@@ -128,4 +298,19 @@ async def media_tempo_consultas(id: str):
         return {"id": id, "media_tempo_consultas": media}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao calcular média de tempo entre consultas: {str(e)}")
-    
+
+# Rota para calcular contagem e média de tempo entre consultas de vários pacientes de uma vez
+@router.post("/pacientes/estatisticas_consultas", response_model=List[EstatisticasConsultas])
+async def estatisticas_consultas_pacientes(pedido: PedidoEstatisticasConsultas):
+    try:
+        return await estatisticas_consultas_por_pacientes(pedido.paciente_ids)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao calcular estatísticas de consultas: {str(e)}")
+
+# Rota para calcular contagem e média de tempo entre consultas de todos os pacientes de um médico
+@router.get("/medicos/{medico_id}/pacientes/estatisticas_consultas", response_model=List[EstatisticasConsultas])
+async def estatisticas_consultas_medico(medico_id: str):
+    try:
+        return await estatisticas_consultas_por_medico(medico_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao calcular estatísticas de consultas: {str(e)}")
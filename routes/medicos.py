@@ -1,13 +1,22 @@
-from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi import APIRouter, Header, HTTPException, Query, Depends, Response
 from beanie import PydanticObjectId
 from services.medicos import (
     criar_medico_db, listar_medicos_db, obter_medico_db, atualizar_medico_db,
     deletar_medico_db, obter_medico_por_nome_db, listar_medicos_por_especialidade_db,
-    listar_pacientes_por_medico, associar_paciente_a_medico, contar_pacientes_por_medico
+    listar_pacientes_por_medico, associar_paciente_a_medico, contar_pacientes_por_medico,
+    criar_medicos_em_lote_db, revisao_medico_db
 )
 from models.medicos import MedicoCreate, MedicoRetorno
+from models.lote import ResultadoLote
+from models.tarefas import TarefaRetorno
 from database.database import get_db  # Função que retorna a conexão assíncrona do Beanie.
-from typing import List, Dict
+from typing import Any, List, Dict, Optional
+from services.campos import resposta_campos, selecionar_campos
+from services.serializacao import resposta_rapida, serializador_medico
+from services.paginacao import definir_proximo_cursor, proximo_cursor_por_id
+from services.revisoes import definir_validadores, resposta_nao_modificada, revisoes_esperadas
+
+DESCRICAO_FIELDS = "Campos a retornar, separados por vírgula (ex.: nome,crm); o id sempre é incluído"
 
 router = APIRouter(tags = ["Medicos"])
 
@@ -19,45 +28,97 @@ async def criar_medico(medico: MedicoCreate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao criar médico: {str(e)}")
 
+# Rota para criar vários médicos de uma vez
+@router.post("/medicos/bulk", response_model=ResultadoLote)
+async def criar_medicos_em_lote(medicos: List[Dict[str, Any]]):
+    try:
+        return await criar_medicos_em_lote_db(medicos)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao criar médicos em lote: {str(e)}")
+
 # Rota para listar médicos
 @router.get("/medicos/", response_model=list[MedicoRetorno])
-async def listar_medicos(skip: int = Query(0, ge=0), limit: int = Query(10, le=100)):
+async def listar_medicos(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, le=100),
+    cursor: Optional[str] = Query(None, description="Cursor opaco recebido no cabeçalho X-Next-Cursor da página anterior"),
+    fields: Optional[str] = Query(None, description=DESCRICAO_FIELDS)
+):
+    campos = selecionar_campos(fields, MedicoRetorno)
     try:
         # Chama a função de consulta no banco com os parâmetros de paginação
-        medicos = await listar_medicos_db(skip=skip, limit=limit)
-        return medicos
+        medicos = await listar_medicos_db(skip=skip, limit=limit, cursor=cursor, campos=campos)
+        resposta = resposta_campos(medicos) if campos else resposta_rapida(serializador_medico, medicos)
+        definir_proximo_cursor(resposta or response, proximo_cursor_por_id(medicos, limit))
+        return resposta or medicos
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao listar médicos: {str(e)}")
 
 # Rota para obter médico pelo ID
+# Responde com ETag e Last-Modified; com If-None-Match ou If-Modified-Since, 304 se nada mudou
 @router.get("/medicos/{id}", response_model=MedicoRetorno)
-async def obter_medico(id: str):
+async def obter_medico(
+    id: str,
+    response: Response,
+    fields: Optional[str] = Query(None, description=DESCRICAO_FIELDS),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+):
+    campos = selecionar_campos(fields, MedicoRetorno)
     try:
-        medico = await obter_medico_db(id)
+        if not campos:
+            nao_modificada = await resposta_nao_modificada(
+                lambda: revisao_medico_db(id), if_none_match, if_modified_since
+            )
+            if nao_modificada:
+                return nao_modificada
+        medico = await obter_medico_db(id, campos)
         if not medico:
             raise HTTPException(status_code=404, detail="Médico não encontrado")
-        return medico
+        if campos:
+            return resposta_campos(medico)
+        resposta = resposta_rapida(serializador_medico, medico)
+        definir_validadores(resposta or response, medico.revisao, medico.data_atualizacao)
+        return resposta or medico
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao obter médico: {str(e)}")
 
 # Rota para atualizar médico
+# Com If-Match, só atualiza se o ETag ainda for o atual (412 se não for); responde com o ETag novo
 @router.put("/medicos/{id}", response_model=MedicoRetorno)
-async def atualizar_medico(id: str, medico: MedicoCreate):
+async def atualizar_medico(
+    id: str, medico: MedicoCreate, response: Response, if_match: Optional[str] = Header(None),
+):
     try:
-        medico_atualizado = await atualizar_medico_db(id, medico)
+        medico_atualizado = await atualizar_medico_db(id, medico, revisoes_esperadas(if_match))
         if not medico_atualizado:
             raise HTTPException(status_code=404, detail="Médico não encontrado")
+        definir_validadores(response, medico_atualizado.revisao, medico_atualizado.data_atualizacao)
         return medico_atualizado
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao atualizar médico: {str(e)}")
 
 # Rota para deletar médico
-@router.delete("/medicos/{id}")
-async def deletar_medico(id: str):
+# Responde 202 com a tarefa que remove as consultas do médico em segundo plano
+@router.delete("/medicos/{id}", status_code=202, response_model=TarefaRetorno)
+async def deletar_medico(id: str, response: Response):
     try:
-        if not await deletar_medico_db(id):
+        tarefa = await deletar_medico_db(id)
+        if not tarefa:
             raise HTTPException(status_code=404, detail="Médico não encontrado")
-        return {"msg": "Médico deletado com sucesso"}
+        response.headers["Location"] = f"/tarefas/{tarefa.id}"
+        return tarefa
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao deletar médico: {str(e)}")
 
@@ -68,18 +129,30 @@ async def obter_medico_por_nome(nome: str):
         medicos = await obter_medico_por_nome_db(nome)
         if not medicos:
             raise HTTPException(status_code=404, detail="Nenhum médico encontrado com esse nome")
-        return medicos
+        return resposta_rapida(serializador_medico, medicos) or medicos
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar médicos pelo nome: {str(e)}")
 
 # Rota para listar médicos por especialidade com paginação
 @router.get("/medicos/especialidade/", response_model=list[MedicoRetorno])
-async def listar_medicos_por_especialidade(especialidade: str, skip: int = 0, limit: int = 10):
+async def listar_medicos_por_especialidade(
+    especialidade: str,
+    response: Response,
+    skip: int = 0,
+    limit: int = 10,
+    cursor: Optional[str] = Query(None, description="Cursor opaco recebido no cabeçalho X-Next-Cursor da página anterior"),
+    fields: Optional[str] = Query(None, description=DESCRICAO_FIELDS)
+):
+    campos = selecionar_campos(fields, MedicoRetorno)
     try:
-        medicos = await listar_medicos_por_especialidade_db(especialidade, skip, limit)
+        medicos = await listar_medicos_por_especialidade_db(especialidade, skip, limit, cursor, campos)
         if not medicos:
             raise HTTPException(status_code=404, detail="Nenhum médico encontrado para esta especialidade")
-        return medicos
+        resposta = resposta_campos(medicos) if campos else resposta_rapida(serializador_medico, medicos)
+        definir_proximo_cursor(resposta or response, proximo_cursor_por_id(medicos, limit))
+        return resposta or medicos
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar médicos por especialidade: {str(e)}")
 
@@ -107,5 +180,7 @@ async def get_quantidade_pacientes(id: str):
     try:
         quantidade = await contar_pacientes_por_medico(id)
         return {"id": id, "quantidade_pacientes": quantidade}
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao contar pacientes: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,16 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from services.cache import estatisticas_cache
+from services.metricas import metricas
+
+router = APIRouter(tags = ["Monitoramento"])
+
+# Rota com os contadores de acertos e faltas dos caches de médicos e pacientes
+@router.get("/cache/estatisticas")
+async def obter_estatisticas_cache():
+    return estatisticas_cache()
+
+# Rota com as métricas de requisições e de comandos do MongoDB no formato de texto do Prometheus
+@router.get("/metrics", response_class=PlainTextResponse)
+async def obter_metricas():
+    return PlainTextResponse(metricas.formato_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
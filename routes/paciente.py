@@ -1,8 +1,8 @@
-from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi import APIRouter, Header, HTTPException, Query, Depends, Response
 from beanie import PydanticObjectId
 from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorClient
-from typing import List
+from typing import Any, List, Optional
 from typing import Dict
 from services.paciente import (
     criar_paciente_db,
@@ -10,10 +10,20 @@ from services.paciente import (
     obter_paciente_db,
     atualizar_paciente_db,
     deletar_paciente_db,
-    obter_paciente_com_consultas_db
+    obter_paciente_com_consultas_db,
+    criar_pacientes_em_lote_db,
+    revisao_paciente_db
 )
 from models.paciente import PacienteCreate, PacienteRetorno, PacienteComConsultas
+from models.lote import ResultadoLote
+from models.tarefas import TarefaRetorno
 from database.database import get_db
+from services.campos import resposta_campos, selecionar_campos
+from services.serializacao import resposta_rapida, serializador_paciente
+from services.paginacao import definir_proximo_cursor, proximo_cursor_por_id
+from services.revisoes import definir_validadores, resposta_nao_modificada, revisoes_esperadas
+
+DESCRICAO_FIELDS = "Campos a retornar, separados por vírgula (ex.: nome,email); o id sempre é incluído"
 
 router = APIRouter(tags = ["Pacientes"])
 
@@ -25,45 +35,98 @@ async def criar_paciente(paciente: PacienteCreate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao criar paciente: {str(e)}")
 
+# Rota para criar vários pacientes de uma vez
+@router.post("/pacientes/bulk", response_model=ResultadoLote)
+async def criar_pacientes_em_lote(pacientes: List[Dict[str, Any]]):
+    try:
+        return await criar_pacientes_em_lote_db(pacientes)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao criar pacientes em lote: {str(e)}")
+
 # Rota para listar pacientes
 @router.get("/pacientes/", response_model=list[PacienteRetorno])
-async def listar_pacientes(skip: int = Query(0, ge=0), limit: int = Query(10, le=100), db=Depends(get_db)):
+async def listar_pacientes(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, le=100),
+    cursor: Optional[str] = Query(None, description="Cursor opaco recebido no cabeçalho X-Next-Cursor da página anterior"),
+    fields: Optional[str] = Query(None, description=DESCRICAO_FIELDS),
+    db=Depends(get_db)
+):
+    campos = selecionar_campos(fields, PacienteRetorno)
     try:
         # Chama o service passando os parâmetros de paginação
-        pacientes = await listar_pacientes_db(skip, limit)
-        return pacientes
+        pacientes = await listar_pacientes_db(skip, limit, cursor, campos)
+        resposta = resposta_campos(pacientes) if campos else resposta_rapida(serializador_paciente, pacientes)
+        definir_proximo_cursor(resposta or response, proximo_cursor_por_id(pacientes, limit))
+        return resposta or pacientes
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao listar pacientes: {str(e)}")
 
 # Rota para obter paciente pelo ID
+# Responde com ETag e Last-Modified; com If-None-Match ou If-Modified-Since, 304 se nada mudou
 @router.get("/pacientes/{id}", response_model=PacienteRetorno)
-async def obter_paciente(id: str):
+async def obter_paciente(
+    id: str,
+    response: Response,
+    fields: Optional[str] = Query(None, description=DESCRICAO_FIELDS),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+):
+    campos = selecionar_campos(fields, PacienteRetorno)
     try:
-        paciente = await obter_paciente_db(id)
+        if not campos:
+            nao_modificada = await resposta_nao_modificada(
+                lambda: revisao_paciente_db(id), if_none_match, if_modified_since
+            )
+            if nao_modificada:
+                return nao_modificada
+        paciente = await obter_paciente_db(id, campos)
         if not paciente:
             raise HTTPException(status_code=404, detail="Paciente não encontrado")
-        return paciente
+        if campos:
+            return resposta_campos(paciente)
+        resposta = resposta_rapida(serializador_paciente, paciente)
+        definir_validadores(resposta or response, paciente.revisao, paciente.data_atualizacao)
+        return resposta or paciente
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao obter paciente: {str(e)}")
 
 # Rota para atualizar paciente
+# Com If-Match, só atualiza se o ETag ainda for o atual (412 se não for); responde com o ETag novo
 @router.put("/pacientes/{id}", response_model=PacienteRetorno)
-async def atualizar_paciente(id: str, paciente: PacienteCreate):
+async def atualizar_paciente(
+    id: str, paciente: PacienteCreate, response: Response, if_match: Optional[str] = Header(None),
+):
     try:
-        paciente_atualizado = await atualizar_paciente_db(id, paciente)
+        paciente_atualizado = await atualizar_paciente_db(id, paciente, revisoes_esperadas(if_match))
         if not paciente_atualizado:
             raise HTTPException(status_code=404, detail="Paciente não encontrado")
+        definir_validadores(response, paciente_atualizado.revisao, paciente_atualizado.data_atualizacao)
         return paciente_atualizado
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao atualizar paciente: {str(e)}")
 
 # Rota para deletar paciente
-@router.delete("/pacientes/{id}")
-async def deletar_paciente(id: str):
+# Responde 202 com a tarefa que remove as consultas do paciente em segundo plano
+@router.delete("/pacientes/{id}", status_code=202, response_model=TarefaRetorno)
+async def deletar_paciente(id: str, response: Response):
     try:
-        if not await deletar_paciente_db(id):
+        tarefa = await deletar_paciente_db(id)
+        if not tarefa:
             raise HTTPException(status_code=404, detail="Paciente não encontrado")
-        return {"msg": "Paciente deletado com sucesso"}
+        response.headers["Location"] = f"/tarefas/{tarefa.id}"
+        return tarefa
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao deletar paciente: {str(e)}")
 
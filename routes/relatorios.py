@@ -0,0 +1,47 @@
+from datetime import date
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query
+from models.relatorios import ConsultasPorDia, ConsultasPorEspecialidade, ConsultasPorMedico
+from services.relatorios import consultas_por_dia_db, consultas_por_especialidade_db, consultas_por_medico_db
+
+router = APIRouter(tags = ["Relatórios"])
+
+# Rota com a quantidade de consultas por dia, no total e por status
+@router.get("/relatorios/consultas/por-dia", response_model=List[ConsultasPorDia])
+async def relatorio_consultas_por_dia(
+    inicio: date = Query(..., description="Primeiro dia no formato AAAA-MM-DD"),
+    fim: date = Query(..., description="Último dia (inclusivo) no formato AAAA-MM-DD"),
+    medico_id: Optional[str] = Query(None, description="Só as consultas deste médico"),
+):
+    try:
+        return await consultas_por_dia_db(inicio, fim, medico_id)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao gerar relatório de consultas por dia: {str(e)}")
+
+# Rota com a quantidade de consultas de cada médico no período, no total e por status
+@router.get("/relatorios/consultas/por-medico", response_model=List[ConsultasPorMedico])
+async def relatorio_consultas_por_medico(
+    inicio: date = Query(..., description="Primeiro dia no formato AAAA-MM-DD"),
+    fim: date = Query(..., description="Último dia (inclusivo) no formato AAAA-MM-DD"),
+):
+    try:
+        return await consultas_por_medico_db(inicio, fim)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao gerar relatório de consultas por médico: {str(e)}")
+
+# Rota com a quantidade de consultas de cada especialidade no período, no total e por status
+@router.get("/relatorios/consultas/por-especialidade", response_model=List[ConsultasPorEspecialidade])
+async def relatorio_consultas_por_especialidade(
+    inicio: date = Query(..., description="Primeiro dia no formato AAAA-MM-DD"),
+    fim: date = Query(..., description="Último dia (inclusivo) no formato AAAA-MM-DD"),
+):
+    try:
+        return await consultas_por_especialidade_db(inicio, fim)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao gerar relatório de consultas por especialidade: {str(e)}")
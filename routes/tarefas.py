@@ -0,0 +1,15 @@
+from fastapi import APIRouter, HTTPException
+from models.tarefas import TarefaRetorno
+from services.exclusoes import obter_tarefa_db
+
+router = APIRouter(tags = ["Tarefas"])
+
+# Rota com o andamento de uma tarefa em segundo plano (ex.: a exclusão em cascata de um paciente)
+@router.get("/tarefas/{id}", response_model=TarefaRetorno)
+async def obter_tarefa(id: str):
+    try:
+        return await obter_tarefa_db(id)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao obter tarefa: {str(e)}")
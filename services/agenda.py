@@ -0,0 +1,144 @@
+import asyncio
+import os
+from contextlib import AsyncExitStack, aclosing, asynccontextmanager
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from weakref import WeakValueDictionary
+from fastapi import HTTPException
+from models.consultas import STATUS_SEM_HORARIO, ConsultaCreate, HorarioLivre, HorariosLivres
+from services.cache import obter_medico_cache
+from services.repositorios import repositorio
+
+# Agenda dos médicos: cada consulta ocupa [data_hora, data_hora + DURACAO_CONSULTA).
+# Duas consultas do mesmo médico se sobrepõem quando os inícios ficam a menos de uma duração
+# um do outro, então o conflito é uma busca por faixa no índice (medico_id, data_hora).
+
+DURACAO_CONSULTA = timedelta(minutes=int(os.getenv("DURACAO_CONSULTA_MINUTOS", "30")))
+INICIO_EXPEDIENTE = time(8, 0)
+FIM_EXPEDIENTE = time(18, 0)
+MAXIMO_DIAS_AGENDA = 7
+TAMANHO_LOTE_AGENDA = 500
+
+# Uma trava por médico serializa verificação e escrita dentro do processo.
+# Entre workers diferentes ainda há uma janela entre a verificação e a escrita.
+_travas: "WeakValueDictionary[str, asyncio.Lock]" = WeakValueDictionary()
+
+
+def trava_agenda(medico_id: str) -> asyncio.Lock:
+    trava = _travas.get(medico_id)
+    if trava is None:
+        trava = _travas[medico_id] = asyncio.Lock()
+    return trava
+
+
+# O banco devolve datas em UTC sem fuso; a entrada com fuso é levada para o mesmo formato
+def _sem_fuso(valor: datetime) -> datetime:
+    if valor.tzinfo is not None:
+        return valor.astimezone(timezone.utc).replace(tzinfo=None)
+    return valor
+
+
+# Trava a agenda de vários médicos de uma vez, sempre na mesma ordem (sem impasse entre dois lotes)
+@asynccontextmanager
+async def travas_agenda(medico_ids: Iterable[str]):
+    async with AsyncExitStack() as pilha:
+        for medico_id in sorted(set(medico_ids)):
+            await pilha.enter_async_context(trava_agenda(medico_id))
+        yield
+
+
+# Consulta do banco que se sobrepõe à informada, com a mensagem do conflito
+async def _conflito(consulta: ConsultaCreate, ignorar_id: Optional[str] = None) -> Optional[str]:
+    data_hora = _sem_fuso(consulta.data_hora)
+    conflito = await repositorio().consultas.conflito(
+        consulta.medico_id, data_hora - DURACAO_CONSULTA, data_hora + DURACAO_CONSULTA, ignorar_id
+    )
+    if conflito is None:
+        return None
+    return (
+        f"O médico já tem a consulta {conflito.id} às {conflito.data_hora.isoformat()} "
+        f"(duração de {int(DURACAO_CONSULTA.total_seconds() // 60)} minutos)"
+    )
+
+
+# Função que recusa (409) uma consulta que se sobrepõe a outra do mesmo médico
+# Consultas com status de STATUS_SEM_HORARIO não ocupam a agenda e não são verificadas
+async def verificar_conflito(consulta: ConsultaCreate, ignorar_id: Optional[str] = None):
+    if consulta.status in STATUS_SEM_HORARIO:
+        return
+    conflito = await _conflito(consulta, ignorar_id)
+    if conflito:
+        raise HTTPException(status_code=409, detail=conflito)
+
+
+# Confere as consultas de um lote contra a agenda do banco e contra as outras do lote, registrando
+# o conflito de cada uma em erros; devolve as que podem ser gravadas. Quem chama segura as travas
+# dos médicos do lote (travas_agenda) até gravá-las
+# No lote, cada médico é percorrido em ordem de horário: basta comparar com a última aceita
+async def filtrar_conflitos_do_lote(
+    consultas: List[Tuple[int, ConsultaCreate]], erros: Dict[int, str],
+) -> List[Tuple[int, ConsultaCreate]]:
+    ocupam = [(indice, consulta) for indice, consulta in consultas if consulta.status not in STATUS_SEM_HORARIO]
+    no_banco = await asyncio.gather(*[_conflito(consulta) for _, consulta in ocupam])
+    for (indice, _), conflito in zip(ocupam, no_banco):
+        if conflito:
+            erros[indice] = conflito
+
+    ultimas: Dict[str, Tuple[int, datetime]] = {}
+    for indice, consulta in sorted(ocupam, key=lambda item: (item[1].medico_id, _sem_fuso(item[1].data_hora), item[0])):
+        if indice in erros:
+            continue
+        data_hora, ultima = _sem_fuso(consulta.data_hora), ultimas.get(consulta.medico_id)
+        if ultima is not None and data_hora - ultima[1] < DURACAO_CONSULTA:
+            erros[indice] = f"O médico já tem a consulta do item {ultima[0]} do lote às {ultima[1].isoformat()}"
+        else:
+            ultimas[consulta.medico_id] = (indice, data_hora)
+    return [(indice, consulta) for indice, consulta in consultas if indice not in erros]
+
+
+# Início de cada horário da grade de atendimento, dia a dia e em ordem
+def _grade(data: date, dias: int, inicio: time, fim: time) -> Iterator[datetime]:
+    for dia in range(dias):
+        atual = datetime.combine(data + timedelta(days=dia), inicio)
+        limite = datetime.combine(data + timedelta(days=dia), fim)
+        while atual + DURACAO_CONSULTA <= limite:
+            yield atual
+            atual += DURACAO_CONSULTA
+
+
+# Função que calcula os horários livres de um médico a partir de data, por dias dias
+# Percorre a grade e os inícios das consultas (os dois em ordem) numa única passada: as consultas
+# vêm do banco em lotes, então o período nunca é carregado inteiro
+async def horarios_livres_db(
+    medico_id: str, data: date, dias: int = 1,
+    inicio_expediente: time = INICIO_EXPEDIENTE, fim_expediente: time = FIM_EXPEDIENTE,
+) -> HorariosLivres:
+    if not 1 <= dias <= MAXIMO_DIAS_AGENDA:
+        raise HTTPException(status_code=400, detail=f"dias deve estar entre 1 e {MAXIMO_DIAS_AGENDA}")
+    if inicio_expediente >= fim_expediente:
+        raise HTTPException(status_code=400, detail="O início do expediente deve ser antes do fim")
+    if not await obter_medico_cache(medico_id):
+        raise HTTPException(status_code=404, detail="Médico não encontrado")
+
+    # Uma consulta que começa uma duração antes do primeiro horário ainda pode ocupá-lo
+    inicio = datetime.combine(data, inicio_expediente) - DURACAO_CONSULTA
+    fim = datetime.combine(data + timedelta(days=dias - 1), fim_expediente)
+    ocupados = repositorio().consultas.horarios_ocupados(medico_id, inicio, fim, TAMANHO_LOTE_AGENDA)
+
+    horarios = []
+    async with aclosing(ocupados):
+        proxima = await anext(ocupados, None)
+        for horario in _grade(data, dias, inicio_expediente, fim_expediente):
+            # Descarta as consultas que terminam até o início do horário; a grade só avança
+            while proxima is not None and proxima + DURACAO_CONSULTA <= horario:
+                proxima = await anext(ocupados, None)
+            # A próxima consulta é a que começa primeiro entre as restantes: se ela começa
+            # depois do fim do horário, nenhuma outra o ocupa
+            if proxima is None or proxima >= horario + DURACAO_CONSULTA:
+                horarios.append(HorarioLivre(inicio=horario, fim=horario + DURACAO_CONSULTA))
+
+    return HorariosLivres(
+        medico_id=medico_id,
+        duracao_minutos=int(DURACAO_CONSULTA.total_seconds() // 60),
+        horarios=horarios,
+    )
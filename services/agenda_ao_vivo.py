@@ -0,0 +1,262 @@
+import asyncio
+import json
+from collections import defaultdict, deque
+from datetime import date, datetime, time, timedelta
+from typing import AsyncIterator, Deque, Dict, List, Optional, Set
+from fastapi import HTTPException
+from models.consultas import Consulta
+from services.agenda import TAMANHO_LOTE_AGENDA
+from services.cache import obter_medico_cache
+from services.repositorios import HistoricoPerdido, repositorio
+from services.serializacao import serializador_consulta
+
+# Agenda ao vivo (Server-Sent Events): a tela abre o dia de um médico, recebe um retrato das
+# consultas do dia e depois só as que entram, mudam ou saem dele, em vez de refazer a consulta
+# do período a cada poucos segundos.
+#
+# Cada worker mantém um único fluxo de alterações das consultas (change stream no MongoDB, tabela
+# de alterações no SQLite; ver observar() nos repositórios), repartido entre todas as telas
+# conectadas. O id de cada evento é o token de retomada do banco: ao reconectar com Last-Event-ID,
+# a tela recebe as alterações que perdeu, se ainda estão no histórico recente do worker, ou um
+# retrato novo. Como os tokens são do banco, a retomada vale em qualquer worker.
+
+TAMANHO_HISTORICO_AO_VIVO = 1000  # Alterações recentes guardadas para as telas que reconectam
+TAMANHO_FILA_AO_VIVO = 1000  # Uma tela que acumula mais que isso recebe um retrato novo
+INTERVALO_PING = 15.0  # Segundos sem eventos até um comentário, para proxies não fecharem a conexão
+ESPERA_ABERTURA = 10.0  # Segundos esperando o fluxo abrir antes de responder 503
+ESPERA_SEM_ASSINANTES = 60.0  # O fluxo continua aberto por este tempo depois que a última tela sai
+ESPERA_RECONEXAO_MAXIMA = 30.0
+RETRY_MS = 3000  # Intervalo de reconexão sugerido ao EventSource
+
+
+class Assinatura:
+    def __init__(self, medico_id: str, dia: date):
+        self.medico_id = medico_id
+        self.inicio = datetime.combine(dia, time())
+        self.fim = self.inicio + timedelta(days=1)
+        self.fila: asyncio.Queue = asyncio.Queue(TAMANHO_FILA_AO_VIVO)
+        self.ids: Set[str] = set()  # Consultas do dia que a tela tem
+        self.reiniciar = False  # A tela perdeu alterações e precisa de um retrato novo
+
+    def na_agenda(self, medico_id: Optional[str], data_hora: Optional[datetime]) -> bool:
+        return medico_id == self.medico_id and data_hora is not None and self.inicio <= data_hora < self.fim
+
+    def entregar(self, alteracao: dict):
+        if self.reiniciar:
+            return
+        try:
+            self.fila.put_nowait(alteracao)
+        except asyncio.QueueFull:
+            self.reiniciar = True
+
+    def pedir_retrato(self):
+        self.reiniciar = True
+        try:
+            self.fila.put_nowait(None)  # Acorda a tela, se ela estiver esperando
+        except asyncio.QueueFull:
+            pass
+
+    # Evento para a tela ou None, se a alteração não toca o dia. Sem o estado anterior (inclusão, ou
+    # banco que não o guarda), a saída do dia é decidida pelas consultas que a tela tem
+    def evento(self, alteracao: dict) -> Optional[str]:
+        consulta: Optional[Consulta] = alteracao["consulta"]
+        antes = alteracao["antes"]
+        if consulta is not None and self.na_agenda(consulta.medico_id, consulta.data_hora):
+            self.ids.add(alteracao["id"])
+            return _evento(alteracao["operacao"], alteracao["token"], serializador_consulta.para_json(consulta).decode())
+        estava = alteracao["id"] in self.ids or (antes is not None and self.na_agenda(antes["medico_id"], antes["data_hora"]))
+        if estava:
+            self.ids.discard(alteracao["id"])
+            return _evento("delete", alteracao["token"], json.dumps({"id": alteracao["id"]}))
+        return None
+
+
+def _evento(tipo: str, id: Optional[str], dados: str) -> str:
+    linhas = [f"id: {id}"] if id is not None else []
+    linhas += [f"event: {tipo}", f"data: {dados}"]
+    return "\n".join(linhas) + "\n\n"
+
+
+# Uma inclusão não tem estado anterior; nas demais operações, sem "antes" não há como saber de
+# qual dia a consulta saiu
+def _sem_estado_anterior(alteracao: dict) -> bool:
+    return alteracao["operacao"] != "insert" and alteracao["antes"] is None
+
+
+class DifusorConsultas:
+    def __init__(self, tamanho_historico: int = TAMANHO_HISTORICO_AO_VIVO):
+        self.token: Optional[str] = None  # Posição do fluxo: o token da última alteração recebida
+        self.historico: Deque[dict] = deque(maxlen=tamanho_historico)
+        self.assinaturas: Dict[str, Set[Assinatura]] = defaultdict(set)  # Por médico
+        self.erro: Optional[Exception] = None
+        self._aberto = asyncio.Event()
+        self._tarefa: Optional[asyncio.Task] = None
+        self._parada: Optional[asyncio.TimerHandle] = None
+
+    # Garante o fluxo aberto; 503 se o banco não abre o fluxo (por exemplo, MongoDB sem replica set)
+    async def iniciar(self):
+        self._cancelar_parada()
+        if self._tarefa is None or self._tarefa.done():
+            self._aberto.clear()
+            self._tarefa = asyncio.create_task(self._acompanhar())
+        try:
+            await asyncio.wait_for(self._aberto.wait(), ESPERA_ABERTURA)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503, detail=f"Fluxo de alterações das consultas indisponível: {self.erro}")
+
+    async def parar(self):
+        self._cancelar_parada()
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+            self._tarefa = None
+
+    # Registra a assinatura; devolve as alterações do histórico depois de desde (None se o token
+    # não está no histórico). Nada aguarda entre a cópia do histórico e o registro, então a tela
+    # não perde nenhuma alteração entre os dois
+    def assinar(self, assinatura: Assinatura, desde: Optional[str] = None) -> Optional[List[dict]]:
+        self._cancelar_parada()
+        self.assinaturas[assinatura.medico_id].add(assinatura)
+        if desde is None:
+            return None
+        historico = list(self.historico)
+        for posicao, alteracao in enumerate(historico):
+            if alteracao["token"] == desde:
+                return historico[posicao + 1:]
+        return None
+
+    def cancelar(self, assinatura: Assinatura):
+        assinaturas = self.assinaturas.get(assinatura.medico_id)
+        if assinaturas is not None:
+            assinaturas.discard(assinatura)
+            if not assinaturas:
+                del self.assinaturas[assinatura.medico_id]
+        if not self.assinaturas and self._tarefa is not None:
+            self._cancelar_parada()
+            self._parada = asyncio.get_running_loop().call_later(
+                ESPERA_SEM_ASSINANTES, lambda: asyncio.ensure_future(self.parar())
+            )
+
+    def _cancelar_parada(self):
+        if self._parada is not None:
+            self._parada.cancel()
+            self._parada = None
+
+    # Entrega a alteração só às telas dos médicos envolvidos (o de agora e o de antes); sem o
+    # estado anterior, a consulta pode ter saído da agenda de qualquer médico
+    def _distribuir(self, alteracao: dict):
+        if _sem_estado_anterior(alteracao):
+            destinos = [assinatura for assinaturas in self.assinaturas.values() for assinatura in assinaturas]
+        else:
+            medicos = {alteracao["antes"]["medico_id"]} if alteracao["antes"] else set()
+            if alteracao["consulta"] is not None:
+                medicos.add(alteracao["consulta"].medico_id)
+            destinos = [assinatura for medico in medicos for assinatura in self.assinaturas.get(medico, ())]
+        for assinatura in destinos:
+            assinatura.entregar(alteracao)
+
+    # Lê o fluxo do banco, retomando do último token depois de uma falha (com espera crescente).
+    # Se o token saiu do histórico do banco, recomeça do ponto atual e toda tela recebe um retrato novo
+    async def _acompanhar(self):
+        espera = 1.0
+        while True:
+            try:
+                async for alteracao in repositorio().consultas.observar(self.token):
+                    if alteracao["operacao"] == "aberto":
+                        self.token = alteracao["token"] or self.token
+                        self.erro = None
+                        self._aberto.set()
+                        espera = 1.0
+                        continue
+                    self.token = alteracao["token"]
+                    self.historico.append(alteracao)
+                    self._distribuir(alteracao)
+            except asyncio.CancelledError:
+                raise
+            except HistoricoPerdido as erro:
+                self.erro, self.token = erro, None
+                self.historico.clear()
+                for assinaturas in self.assinaturas.values():
+                    for assinatura in assinaturas:
+                        assinatura.pedir_retrato()
+                continue
+            except Exception as erro:
+                self.erro = erro
+            self._aberto.clear()
+            await asyncio.sleep(espera)
+            espera = min(espera * 2, ESPERA_RECONEXAO_MAXIMA)
+
+
+difusor_consultas = DifusorConsultas()
+
+
+# Consultas do dia do médico, em ordem de data_hora, lidas em lotes
+async def _consultas_do_dia(assinatura: Assinatura) -> List[Consulta]:
+    consultas, depois_de = [], None
+    fim = assinatura.fim - timedelta(microseconds=1)  # listar() é inclusivo nas duas pontas
+    while True:
+        lote = await repositorio().consultas.listar(
+            {"medico_id": assinatura.medico_id}, 0, TAMANHO_LOTE_AGENDA, depois_de, assinatura.inicio, fim
+        )
+        consultas.extend(lote)
+        if len(lote) < TAMANHO_LOTE_AGENDA:
+            return consultas
+        depois_de = (lote[-1].data_hora, lote[-1].id)
+
+
+async def _retrato(assinatura: Assinatura, token: Optional[str]) -> str:
+    consultas = await _consultas_do_dia(assinatura)
+    assinatura.ids = {consulta.id for consulta in consultas}
+    dados = (
+        f'{{"medico_id":{json.dumps(assinatura.medico_id)},"data":"{assinatura.inicio.date().isoformat()}",'
+        f'"consultas":{serializador_consulta.lista_json(consultas).decode()}}}'
+    )
+    return _evento("retrato", token, dados)
+
+
+async def _transmitir(difusor: DifusorConsultas, assinatura: Assinatura, ultimo_evento: Optional[str]) -> AsyncIterator[str]:
+    perdidas = difusor.assinar(assinatura, ultimo_evento)
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        if perdidas is not None and not any(map(_sem_estado_anterior, perdidas)):
+            # Retomada: as consultas que a tela tem são as do dia agora, e as alterações perdidas
+            # decidem o que ela precisa receber (pelo estado anterior de cada uma)
+            assinatura.ids = {consulta.id for consulta in await _consultas_do_dia(assinatura)}
+            for alteracao in perdidas:
+                evento = assinatura.evento(alteracao)
+                if evento is not None:
+                    yield evento
+        else:
+            yield await _retrato(assinatura, difusor.token)
+        while True:
+            try:
+                alteracao = await asyncio.wait_for(assinatura.fila.get(), INTERVALO_PING)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if assinatura.reiniciar:
+                while not assinatura.fila.empty():
+                    assinatura.fila.get_nowait()
+                assinatura.reiniciar = False
+                yield await _retrato(assinatura, difusor.token)
+            elif alteracao is not None:
+                evento = assinatura.evento(alteracao)
+                if evento is not None:
+                    yield evento
+    finally:
+        difusor.cancelar(assinatura)
+
+
+# Função que abre a agenda ao vivo do médico no dia; ultimo_evento é o Last-Event-ID da reconexão
+# Devolve o fluxo de eventos já com o fluxo do banco aberto (404 e 503 saem antes da resposta)
+async def agenda_ao_vivo(
+    medico_id: str, dia: date, ultimo_evento: Optional[str] = None, difusor: Optional[DifusorConsultas] = None,
+) -> AsyncIterator[str]:
+    difusor = difusor or difusor_consultas
+    if not await obter_medico_cache(medico_id):
+        raise HTTPException(status_code=404, detail="Médico não encontrado")
+    await difusor.iniciar()
+    return _transmitir(difusor, Assinatura(medico_id, dia), ultimo_evento)
@@ -0,0 +1,129 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from models.medicos import MedicoSemListas
+from models.paciente import PacienteSemListas
+from services.repositorios import repositorio
+
+# Cache em memória (por processo) para as leituras de Medico e Paciente por ID.
+# Guarda só a projeção sem as listas (que crescem sem limite): quem precisa delas lê do banco.
+# É LRU com TTL: o TTL limita por quanto tempo um worker pode ver um documento desatualizado
+# quando a alteração foi feita por outro worker; no próprio worker os services invalidam na escrita.
+
+
+class CacheDocumentos:
+    def __init__(self, nome: str, capacidade: int, ttl: float):
+        self.nome = nome
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self.acertos = 0
+        self.faltas = 0
+        self._itens: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._carregando: Dict[str, asyncio.Future] = {}
+        self._geracao = 0  # Incrementada a cada invalidação
+
+    @property
+    def ativo(self) -> bool:
+        return self.ttl > 0 and self.capacidade > 0
+
+    # Lê do cache ou, na falta, carrega com a função informada
+    # Requisições simultâneas pela mesma chave compartilham um único carregamento
+    async def obter(self, chave: str, carregar: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.ativo:
+            return await carregar()
+
+        item = self._itens.get(chave)
+        if item is not None:
+            expira_em, valor = item
+            if time.monotonic() < expira_em:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return self._copia(valor)
+            del self._itens[chave]
+
+        self.faltas += 1
+        em_andamento = self._carregando.get(chave)
+        if em_andamento is not None:
+            try:
+                return self._copia(await asyncio.shield(em_andamento))
+            except asyncio.CancelledError:
+                # Cancelado foi o carregamento compartilhado, não esta requisição: carrega de novo
+                if not em_andamento.cancelled():
+                    raise
+                return await self.obter(chave, carregar)
+
+        geracao = self._geracao
+        futuro = asyncio.get_running_loop().create_future()
+        self._carregando[chave] = futuro
+        try:
+            valor = await carregar()
+        except Exception as e:
+            futuro.set_exception(e)
+            futuro.exception()  # Evita o aviso de exceção não lida quando ninguém mais esperava
+            raise
+        except BaseException:
+            futuro.cancel()  # Carregamento cancelado (cliente desconectado): quem esperava não fica preso
+            raise
+        finally:
+            self._carregando.pop(chave, None)
+        futuro.set_result(valor)
+
+        # Só guarda se nada foi invalidado enquanto o documento era carregado
+        if valor is not None and geracao == self._geracao:
+            self._itens[chave] = (time.monotonic() + self.ttl, valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.capacidade:
+                self._itens.popitem(last=False)
+        return self._copia(valor)
+
+    def invalidar(self, *chaves: str):
+        self._geracao += 1
+        for chave in chaves:
+            self._itens.pop(str(chave), None)
+
+    def limpar(self):
+        self._geracao += 1
+        self._itens.clear()
+
+    def estatisticas(self) -> dict:
+        total = self.acertos + self.faltas
+        return {
+            "cache": self.nome,
+            "itens": len(self._itens),
+            "capacidade": self.capacidade,
+            "ttl_segundos": self.ttl,
+            "acertos": self.acertos,
+            "faltas": self.faltas,
+            "taxa_acerto": self.acertos / total if total else 0.0,
+        }
+
+    # Cada chamador recebe sua própria cópia, para que alterações locais não vazem para o cache
+    @staticmethod
+    def _copia(valor: Any) -> Any:
+        return valor.model_copy(deep=True) if valor is not None else None
+
+
+cache_medicos = CacheDocumentos(
+    "medicos",
+    capacidade=int(os.getenv("CACHE_MEDICOS_TAMANHO", "1000")),
+    ttl=float(os.getenv("CACHE_MEDICOS_TTL", "60")),
+)
+cache_pacientes = CacheDocumentos(
+    "pacientes",
+    capacidade=int(os.getenv("CACHE_PACIENTES_TAMANHO", "5000")),
+    ttl=float(os.getenv("CACHE_PACIENTES_TTL", "10")),
+)
+
+
+async def obter_medico_cache(id: str) -> Optional[MedicoSemListas]:
+    return await cache_medicos.obter(str(id), lambda: repositorio().medicos.obter_sem_listas(id))
+
+
+async def obter_paciente_cache(id: str) -> Optional[PacienteSemListas]:
+    return await cache_pacientes.obter(str(id), lambda: repositorio().pacientes.obter_sem_listas(id))
+
+
+def estatisticas_cache() -> list:
+    return [cache_medicos.estatisticas(), cache_pacientes.estatisticas()]
@@ -0,0 +1,33 @@
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional, Type
+
+# Seleção de campos (?fields=nome,email) nas rotas de pacientes e médicos.
+# A projeção é feita no MongoDB, então só os campos pedidos (e o id) saem do banco.
+
+
+# Lê o parâmetro fields e valida os nomes contra os campos do modelo de resposta
+def selecionar_campos(fields: Optional[str], modelo: Type[BaseModel]) -> Optional[List[str]]:
+    if not fields:
+        return None
+    campos = [campo.strip() for campo in fields.split(",") if campo.strip()]
+    invalidos = [campo for campo in campos if campo not in modelo.model_fields]
+    if invalidos:
+        raise HTTPException(status_code=400, detail=f"Campos inválidos: {', '.join(invalidos)}")
+    return ["id"] + [campo for campo in campos if campo != "id"]
+
+
+def projecao_campos(campos: List[str]) -> Dict[str, int]:
+    return {("_id" if campo == "id" else campo): 1 for campo in campos}
+
+
+# Converte o documento projetado para o formato da resposta (com "id" no lugar de "_id")
+def documento_parcial(documento: Dict[str, Any], campos: List[str]) -> Dict[str, Any]:
+    return {campo: documento.get("_id" if campo == "id" else campo) for campo in campos}
+
+
+# Resposta com seleção de campos: os dicionários parciais não passam pelo response_model da rota
+def resposta_campos(conteudo: Any) -> JSONResponse:
+    return JSONResponse(content=jsonable_encoder(conteudo))
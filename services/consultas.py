@@ -1,120 +1,203 @@
-from bson import ObjectId
+import asyncio
+import csv
+import io
+import json
+import os
+import time
+from collections import OrderedDict
 from fastapi import HTTPException, Query
 from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from models.consultas import ConsultaCreate, ConsultaResponse
-from models.medicos import Medico
-from models.paciente import Paciente
+from models.lote import ResultadoLote
 from models.consultas import Consulta
-from beanie import PydanticObjectId
+from services.agenda import filtrar_conflitos_do_lote, trava_agenda, travas_agenda, verificar_conflito
+from services.cache import cache_medicos, cache_pacientes, obter_medico_cache
+from services.lote import resultado_lote, validar_lote
+from services.paginacao import chave_cursor_por_data_hora, proximo_cursor_por_data_hora
+from services.repositorios import RevisaoDivergente, repositorio
 
 # Função para adicionar consulta no banco de dados
 async def adicionar_consulta_db(consulta_data: ConsultaCreate):
-    # Criar nova consulta
-    nova_consulta = Consulta(**consulta_data.dict())
-    await nova_consulta.save()
-
-    # Obter paciente e médico
-    paciente = await Paciente.get(nova_consulta.paciente_id)
-    medico = await Medico.get(nova_consulta.medico_id)
-
-    if not paciente:
+    # Valida paciente e médico antes de inserir a consulta, lendo só os IDs (sem as listas de consultas)
+    pacientes_existentes, medicos_existentes = await asyncio.gather(
+        repositorio().pacientes.existentes([consulta_data.paciente_id]),
+        repositorio().medicos.existentes([consulta_data.medico_id]),
+    )
+    if consulta_data.paciente_id not in pacientes_existentes:
         raise HTTPException(status_code=404, detail="Paciente não encontrado")
-    if not medico:
+    if consulta_data.medico_id not in medicos_existentes:
         raise HTTPException(status_code=404, detail="Médico não encontrado")
 
-    # Adicionar consulta ao paciente e ao médico
-    paciente.consultas.append(nova_consulta.id)
-    medico.consultas.append(nova_consulta.id)
-
-    await paciente.save()
-    await medico.save()
+    # Recusa horários já ocupados na agenda do médico, e cria a consulta (registrando-a no
+    # paciente e no médico) sem que outra requisição do processo ocupe o horário no meio
+    async with trava_agenda(consulta_data.medico_id):
+        await verificar_conflito(consulta_data)
+        nova_consulta = await repositorio().consultas.criar(consulta_data)
+    cache_pacientes.invalidar(nova_consulta.paciente_id)
+    cache_medicos.invalidar(nova_consulta.medico_id)
 
     return nova_consulta
 
+# Função para adicionar várias consultas de uma vez, com relatório por item
+async def adicionar_consultas_em_lote_db(itens: List[Dict]) -> ResultadoLote:
+    validos, erros = validar_lote(ConsultaCreate, itens)
+
+    # Confere a existência de todos os pacientes e médicos do lote com uma busca para cada tabela
+    pacientes_existentes, medicos_existentes = await asyncio.gather(
+        repositorio().pacientes.existentes(list({c.paciente_id for _, c in validos})),
+        repositorio().medicos.existentes(list({c.medico_id for _, c in validos})),
+    )
+
+    aceitos = []
+    for indice, consulta in validos:
+        if consulta.paciente_id not in pacientes_existentes:
+            erros[indice] = "Paciente não encontrado"
+        elif consulta.medico_id not in medicos_existentes:
+            erros[indice] = "Médico não encontrado"
+        else:
+            aceitos.append((indice, consulta))
+
+    # Como na consulta avulsa: horários ocupados no banco ou por outro item do lote são recusados,
+    # com as agendas dos médicos do lote travadas até a gravação
+    async with travas_agenda(consulta.medico_id for _, consulta in aceitos):
+        aceitos = await filtrar_conflitos_do_lote(aceitos, erros)
+        inseridos = await repositorio().consultas.criar_lote(aceitos, erros)
+    cache_pacientes.invalidar(*{consulta.paciente_id for _, consulta in inseridos})
+    cache_medicos.invalidar(*{consulta.medico_id for _, consulta in inseridos})
+
+    return resultado_lote(len(itens), inseridos, erros)
+
+# Modos de cálculo do total retornado em ConsultaResponse.quantidade:
+# "exato" conta no banco, "estimado" usa os metadados da coleção quando o banco tem (só sem filtro),
+# "cache" reaproveita uma contagem exata recente e "nenhum" não conta
+MODOS_TOTAL = ("exato", "estimado", "cache", "nenhum")
+TTL_CACHE_TOTAL = float(os.getenv("TTL_CACHE_TOTAL_CONSULTAS", "30"))  # segundos
+TAMANHO_CACHE_TOTAL = int(os.getenv("TAMANHO_CACHE_TOTAL_CONSULTAS", "1000"))  # filtros distintos
+
+# Em ordem de gravação, que com o TTL fixo é também a ordem de expiração: as expiradas e as que
+# passam do tamanho saem do início a cada gravação, e cada filtro novo não fica para sempre
+_cache_totais: "OrderedDict[tuple, Tuple[float, int]]" = OrderedDict()
+
+def _guardar_total(chave: tuple, total: int):
+    agora = time.monotonic()
+    _cache_totais.pop(chave, None)
+    _cache_totais[chave] = (agora, total)
+    while _cache_totais and (
+        len(_cache_totais) > TAMANHO_CACHE_TOTAL or agora - next(iter(_cache_totais.values()))[0] >= TTL_CACHE_TOTAL
+    ):
+        _cache_totais.popitem(last=False)
+
+# Função auxiliar que calcula o total de consultas de acordo com o modo escolhido
+async def _total_consultas(filtro: dict, modo: str) -> Optional[int]:
+    if modo == "nenhum":
+        return None
+    if modo == "estimado":
+        return await repositorio().consultas.contar(filtro, estimado=True)
+    if modo == "cache":
+        chave = tuple(sorted(filtro.items()))
+        em_cache = _cache_totais.get(chave)
+        if em_cache and time.monotonic() - em_cache[0] < TTL_CACHE_TOTAL:
+            return em_cache[1]
+        total = await repositorio().consultas.contar(filtro)
+        _guardar_total(chave, total)
+        return total
+    return await repositorio().consultas.contar(filtro)
+
 # Função para listar todas as consultas
-async def listar_consultas_db(skip: int = Query(0, ge=0), limit: int = Query(10, le=100)):
+# Com cursor, a página continua depois do último (data_hora, id) retornado (e o skip é ignorado)
+async def listar_consultas_db(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, le=100),
+    cursor: Optional[str] = None,
+    total: str = "exato",
+    paciente_id: Optional[str] = None,
+    medico_id: Optional[str] = None,
+    status: Optional[str] = None,
+):
+    if total not in MODOS_TOTAL:
+        raise HTTPException(status_code=400, detail=f"Modo de total inválido: {total}")
+    filtro = {
+        campo: valor
+        for campo, valor in (("paciente_id", paciente_id), ("medico_id", medico_id), ("status", status))
+        if valor is not None
+    }
+    depois_de = chave_cursor_por_data_hora(cursor)
     try:
-        consultas = await Consulta.find().skip(skip).limit(limit).to_list()
-        
-        total_consultas = await Consulta.find().count()  
-        return ConsultaResponse(consultas=consultas, quantidade=total_consultas)
+        # A página e o total rodam em paralelo
+        consultas, total_consultas = await asyncio.gather(
+            repositorio().consultas.listar(filtro, 0 if cursor else skip, limit, depois_de),
+            _total_consultas(filtro, total),
+        )
+        return ConsultaResponse(
+            consultas=consultas,
+            quantidade=total_consultas,
+            next_cursor=proximo_cursor_por_data_hora(consultas, limit),
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao listar consultas: {str(e)}")
 
 # Função para buscar consulta por ID
 async def buscar_consulta_por_id_db(id: str):
-    consulta = await Consulta.get(id)
+    consulta = await repositorio().consultas.obter(id)
     return consulta
 
-# Função para atualizar consulta no banco de dados
-async def atualizar_consulta_db(id: str, consulta: ConsultaCreate):
-    medico = await Medico.get(consulta.medico_id)
-    if not medico:
-        raise HTTPException(status_code=404, detail="Médico não encontrado")
-
-    update_data = {k: v for k, v in consulta.dict(exclude_unset=True).items()}
-    update_data["paciente_id"] = str(update_data["paciente_id"])
-    update_data["medico_id"] = str(update_data["medico_id"])
+# Função para ler só a revisão da consulta (ETag e Last-Modified), sem trazer o documento
+async def revisao_consulta_db(id: str):
+    return await repositorio().consultas.revisao(id)
 
-    consulta_atualizada = await Consulta.get(id)
-    if not consulta_atualizada:
+# Função para atualizar consulta no banco de dados
+# Com revisoes (If-Match), só grava se a consulta ainda estiver numa delas; senão, 412
+# O médico (em geral já no cache) é conferido junto com a busca de conflitos: antes da gravação
+# fica uma só ida ao banco
+async def atualizar_consulta_db(id: str, consulta: ConsultaCreate, revisoes: Optional[List[str]] = None):
+    # A própria consulta não conta como conflito ao remarcar
+    async with trava_agenda(consulta.medico_id):
+        medico, _ = await asyncio.gather(
+            obter_medico_cache(consulta.medico_id), verificar_conflito(consulta, ignorar_id=id),
+        )
+        if not medico:
+            raise HTTPException(status_code=404, detail="Médico não encontrado")
+        try:
+            atualizada = await repositorio().consultas.atualizar(id, consulta, revisoes)
+        except RevisaoDivergente:
+            raise HTTPException(status_code=412, detail="Consulta alterada por outra requisição")
+    if not atualizada:
         raise HTTPException(status_code=404, detail="Consulta não encontrada")
-
-    await consulta_atualizada.update({"$set": update_data})
-    return await Consulta.get(id)
+    # Trocando de paciente ou de médico, as listas e os contadores mudam nos dois lados
+    antes, consulta_atualizada = atualizada
+    cache_pacientes.invalidar(antes.paciente_id, consulta_atualizada.paciente_id)
+    cache_medicos.invalidar(antes.medico_id, consulta_atualizada.medico_id)
+    return consulta_atualizada
 
 # Função para excluir consulta no banco de dados
 async def excluir_consulta_db(id: str):
-    consulta = await Consulta.get(id)
+    # Exclui a consulta e a tira das listas do paciente e do médico
+    consulta = await repositorio().consultas.remover(id)
     if not consulta:
         raise HTTPException(status_code=404, detail="Consulta não encontrada")
-    
-    # Obter paciente e médico associados à consulta
-    paciente = await Paciente.get(consulta.paciente_id)
-    medico = await Medico.get(consulta.medico_id)
-
-    if not paciente:
-        raise HTTPException(status_code=404, detail="Paciente não encontrado")
-    if not medico:
-        raise HTTPException(status_code=404, detail="Médico não encontrado")
-    
-    # Remover a consulta das listas de consultas do paciente e do médico
-    paciente.consultas = [consulta_id for consulta_id in paciente.consultas if consulta_id != consulta.id]
-    medico.consultas = [consulta_id for consulta_id in medico.consultas if consulta_id != consulta.id]
-
-    # Salvar as alterações no paciente e no médico
-    await paciente.save()
-    await medico.save()
-
-    # Excluir a consulta
-    await consulta.delete()
+    cache_pacientes.invalidar(consulta.paciente_id)
+    cache_medicos.invalidar(consulta.medico_id)
 
     return True
 
 # Função para listar consultas de um paciente
-async def listar_consultas_por_paciente_db(paciente_id: str, skip: int, limit: int):
-    consultas = await Consulta.find({"paciente_id": str(paciente_id)}).skip(skip).limit(limit).to_list()
+async def listar_consultas_por_paciente_db(paciente_id: str, skip: int, limit: int, cursor: Optional[str] = None):
+    depois_de = chave_cursor_por_data_hora(cursor)
+    consultas = await repositorio().consultas.listar(
+        {"paciente_id": str(paciente_id)}, 0 if cursor else skip, limit, depois_de
+    )
     return consultas
 
+# Função para listar os pacientes sem consultas
+# O anti-join roda inteiro no banco e a paginação só é aplicada depois do filtro
 async def listar_pacientes_sem_consultas_db(skip: int, limit: int):
-    # Primeiramente, liste os pacientes com paginação
-    pacientes = await Paciente.find().skip(skip).limit(limit).to_list()
-    
-    pacientes_sem_consultas = []
-    for paciente in pacientes:
-        # Verifique se o paciente não tem consultas associadas
-        consultas = await Consulta.find({"paciente_id": paciente.id}).to_list()
-        if not consultas:
-            pacientes_sem_consultas.append(paciente)
-
-    return pacientes_sem_consultas
+    return await repositorio().pacientes.listar_sem_consultas(skip, limit)
 
 # Função para listar todas as consultas dentro de um período
 async def listar_consultas_por_periodo_db(inicio: datetime, fim: datetime):
     # Encontrando todas as consultas no período
-    consultas = await Consulta.find({
-        "data_hora": {"$gte": inicio, "$lte": fim}
-    }).to_list()
+    consultas = await repositorio().consultas.listar_periodo(inicio, fim)
 
     # Contando o número de consultas
     contagem = len(consultas)
@@ -122,64 +205,107 @@ async def listar_consultas_por_periodo_db(inicio: datetime, fim: datetime):
     # Retornando tanto a lista de consultas quanto a contagem
     return {"consultas": consultas, "contagem": contagem}
 
+# Função para contar as consultas de um período sem trazê-las (usa o índice de data_hora)
+async def contar_consultas_por_periodo_db(inicio: datetime, fim: datetime) -> int:
+    return await repositorio().consultas.contar_periodo(inicio, fim)
+
+# Colunas exportadas, na mesma ordem do JSON de Consulta
+COLUNAS_EXPORTACAO = ["_id", "paciente_id", "medico_id", "data_hora", "status", "observacoes"]
+TAMANHO_BLOCO_EXPORTACAO = 64 * 1024  # bytes acumulados antes de enviar um pedaço da resposta
+
+def _linha_exportacao(documento: dict) -> list:
+    return [
+        documento["_id"],
+        documento["paciente_id"],
+        documento["medico_id"],
+        documento["data_hora"].isoformat(),
+        documento["status"],
+        documento.get("observacoes") or "",
+    ]
+
+def _formatar_ndjson(linha: list) -> str:
+    return json.dumps(dict(zip(COLUNAS_EXPORTACAO, linha)), ensure_ascii=False, separators=(",", ":")) + "\n"
+
+def _formatar_csv(linha: list) -> str:
+    saida = io.StringIO()
+    csv.writer(saida).writerow(linha)
+    return saida.getvalue()
+
+# Função que exporta as consultas de um período em NDJSON ou CSV, em streaming
+# Lê as consultas do banco em lotes de batch_size, sem montar a lista em memória
+async def exportar_consultas_por_periodo_db(
+    inicio: datetime, fim: datetime, formato: str = "ndjson", batch_size: int = 500
+) -> AsyncIterator[str]:
+    formatar = _formatar_csv if formato == "csv" else _formatar_ndjson
+    bloco, tamanho = [], 0
+    if formato == "csv":
+        bloco.append(_formatar_csv(COLUNAS_EXPORTACAO))
+    async for documento in repositorio().consultas.iterar_periodo(inicio, fim, batch_size):
+        linha = formatar(_linha_exportacao(documento))
+        bloco.append(linha)
+        tamanho += len(linha)
+        if tamanho >= TAMANHO_BLOCO_EXPORTACAO:
+            yield "".join(bloco)
+            bloco, tamanho = [], 0
+    if bloco:
+        yield "".join(bloco)
+
 # Função para listar consultas com pacientes para um médico
-async def listar_consultas_com_pacientes(medico_id: str):
-    consultas = await Consulta.find({"medico_id": str(medico_id)}).to_list()
-    resultado = []
-    for consulta in consultas:
-        paciente = await Paciente.get(consulta.paciente_id)
-        consulta_info = {
+async def listar_consultas_com_pacientes(
+    medico_id: str,
+    inicio: Optional[datetime] = None,
+    fim: Optional[datetime] = None,
+    skip: int = 0,
+    limit: int = 10,
+):
+    consultas = await repositorio().consultas.listar({"medico_id": str(medico_id)}, skip, limit, inicio=inicio, fim=fim)
+
+    # Busca os nomes de todos os pacientes da página de uma vez só, trazendo apenas o nome
+    nomes = await repositorio().pacientes.nomes(list({consulta.paciente_id for consulta in consultas}))
+
+    return [
+        {
             "consulta_id": str(consulta.id),
-            "paciente": paciente.nome if paciente else "Desconhecido",
+            "paciente": nomes.get(consulta.paciente_id, "Desconhecido"),
             "status": consulta.status,
             "data": consulta.data_hora
         }
-        resultado.append(consulta_info)
-
-    return resultado
+        for consulta in consultas
+    ]
 
+# Lê só o contador de consultas do paciente, mantido nas escritas de consultas
 async def contar_consultas_por_paciente(paciente_id: str) -> int:
-    # Contagem de consultas associadas ao paciente
-    count = await Consulta.find({"paciente_id": paciente_id}).count()
-    return count
+    quantidade = await repositorio().pacientes.total_consultas(paciente_id)
+    if quantidade is None:
+        raise HTTPException(status_code=404, detail="Paciente não encontrado")
+    return quantidade
 
-async def calcular_media_tempo_entre_consultas(paciente_id: str) -> float:
-    consultas = await Consulta.find({"paciente_id": paciente_id}).to_list()
-    
-    if len(consultas) < 2:
+# A média do intervalo entre consultas consecutivas é (última - primeira) / (quantidade - 1),
+# então basta o resumo de cada paciente (primeira data, última data e quantidade), calculado no banco
+def _media_dias(resumo: Optional[dict]) -> float:
+    if not resumo or resumo["quantidade"] < 2:
         return 0  # Não há tempo suficiente para calcular a média
-    
-    # Ordena as consultas pela data de criação
-    consultas.sort(key=lambda consulta: consulta.data_hora)
-    
-    total_dias = 0
-    for i in range(1, len(consultas)):
-        # Calcula a diferença entre a data de duas consultas consecutivas
-        delta = consultas[i].data_hora - consultas[i - 1].data_hora
-        total_dias += delta.days
-    
-    media_dias = total_dias / (len(consultas) - 1)
-    return media_dias
+    intervalo = resumo["ultima"] - resumo["primeira"]
+    return intervalo.total_seconds() / 86400 / (resumo["quantidade"] - 1)
 
 async def calcular_media_tempo_entre_consultas(paciente_id: str) -> float:
-    consultas = await Consulta.find({"paciente_id": paciente_id}).to_list()
-    
-    if len(consultas) < 2:
-        return 0  # Não há tempo suficiente para calcular a média
-    
-    # Ordena as consultas pela data de criação
-    consultas.sort(key=lambda consulta: consulta.data_hora)
-    
-    total_dias = 0
-    for i in range(1, len(consultas)):
-        # Calcula a diferença entre a data de duas consultas consecutivas
-        delta = consultas[i].data_hora - consultas[i - 1].data_hora
-        total_dias += delta.days
-    
-    media_dias = total_dias / (len(consultas) - 1)
-    return media_dias
+    return _media_dias(await repositorio().consultas.resumo_do_paciente(paciente_id))
 
-async def contar_consultas_por_paciente(paciente_id: str) -> int:
-    # Contagem de consultas associadas ao paciente
-    count = await Consulta.find({"paciente_id": paciente_id}).count()
-    return count
+# Função auxiliar que monta contagem e média de consultas a partir dos resumos de cada paciente
+def _estatisticas(resumos: List[Tuple[str, Optional[dict]]]) -> List[Dict]:
+    return [
+        {
+            "paciente_id": paciente_id,
+            "contagem_consultas": resumo["quantidade"] if resumo else 0,
+            "media_tempo_consultas": _media_dias(resumo),
+        }
+        for paciente_id, resumo in resumos
+    ]
+
+# Função para calcular contagem e média de tempo entre consultas para uma lista de pacientes
+async def estatisticas_consultas_por_pacientes(paciente_ids: List[str]) -> List[Dict]:
+    return _estatisticas(await repositorio().consultas.resumos_de_pacientes(paciente_ids))
+
+# Função para calcular contagem e média de tempo entre consultas para todos os pacientes de um médico
+async def estatisticas_consultas_por_medico(medico_id: str) -> List[Dict]:
+    return _estatisticas(await repositorio().consultas.resumos_dos_pacientes_do_medico(medico_id))
@@ -0,0 +1,139 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Optional, Set
+from fastapi import HTTPException
+from models.tarefas import (
+    TAREFA_CONCLUIDA, TAREFA_EXCLUSAO_MEDICO, TAREFA_EXCLUSAO_PACIENTE, TAREFA_EXECUTANDO, TAREFA_FALHOU, Tarefa,
+)
+from services.cache import cache_medicos, cache_pacientes
+from services.repositorios import repositorio
+
+# Exclusão em cascata de pacientes e médicos. A rota remove o documento (e as associações) na hora
+# e responde 202 com uma tarefa; as consultas do paciente ou do médico saem depois, em lotes, numa
+# tarefa em segundo plano do próprio worker, que tira cada lote das listas dos pais e do resumo de
+# consultas. O andamento fica gravado no banco (GET /tarefas/{id}), e as tarefas interrompidas
+# (worker reiniciado no meio) são retomadas por outro worker, ou pelo mesmo ao reiniciar: cada lote
+# pode ser repetido sem efeito em dobro. Para bases com referências soltas de antes disso, ver
+# "python -m ferramentas orfaos".
+#
+# Cada lote gravado renova atualizada_em, que serve de concessão: uma tarefa inacabada só é
+# retomada quando ficou PRAZO_TAREFA sem andar, então um worker que inicia (reinício gradual ou
+# --workers N) não toma a tarefa que outro worker vivo está executando.
+
+TAMANHO_LOTE_EXCLUSAO = 1000  # Consultas removidas por vez
+PRAZO_TAREFA = timedelta(seconds=float(os.getenv("PRAZO_TAREFA_SEGUNDOS", "300")))  # Sem andar, a tarefa é retomada
+
+# Campo das consultas que aponta para o documento excluído, por tipo de tarefa
+CAMPO_EXCLUSAO = {TAREFA_EXCLUSAO_PACIENTE: "paciente_id", TAREFA_EXCLUSAO_MEDICO: "medico_id"}
+
+# Tarefas em execução neste worker (a referência evita que o asyncio as descarte no meio)
+_em_execucao: Set[asyncio.Task] = set()
+_vigia: Optional[asyncio.Task] = None
+
+
+# O ID do paciente ou do médico voltou a existir (num banco que reaproveita IDs):
+# as consultas com esse ID já não são só as do documento excluído
+# A revisão é lida do primário: um secundário atrasado ainda teria o documento recém-removido
+async def _alvo_existe(tarefa: Tarefa) -> bool:
+    if not repositorio().reaproveita_ids:
+        return False
+    if tarefa.tipo == TAREFA_EXCLUSAO_PACIENTE:
+        return await repositorio().pacientes.revisao(tarefa.alvo_id) is not None
+    return await repositorio().medicos.revisao(tarefa.alvo_id) is not None
+
+
+# Remove as consultas da tarefa em lotes, gravando o andamento a cada lote
+async def executar_exclusao(tarefa: Tarefa):
+    tarefas, campo = repositorio().tarefas, CAMPO_EXCLUSAO[tarefa.tipo]
+    removidas = tarefa.consultas_removidas
+    try:
+        await tarefas.atualizar(tarefa.id, status=TAREFA_EXECUTANDO)
+        while True:
+            if await _alvo_existe(tarefa):
+                raise RuntimeError(f"O ID {tarefa.alvo_id} voltou a existir; use python -m ferramentas orfaos")
+            lote = await repositorio().consultas.remover_em_lote(campo, tarefa.alvo_id, TAMANHO_LOTE_EXCLUSAO)
+            if not lote:
+                break
+            removidas += len(lote)
+            # O outro lado de cada consulta removida perdeu a referência a ela
+            cache_pacientes.invalidar(*{paciente_id for paciente_id, _ in lote})
+            cache_medicos.invalidar(*{medico_id for _, medico_id in lote})
+            await tarefas.atualizar(tarefa.id, consultas_removidas=removidas)
+        await tarefas.atualizar(tarefa.id, status=TAREFA_CONCLUIDA)
+    except asyncio.CancelledError:
+        raise  # O worker está encerrando: a tarefa continua em execução no banco e é retomada depois
+    except Exception as e:
+        await tarefas.atualizar(tarefa.id, status=TAREFA_FALHOU, erro=str(e))
+
+
+def _disparar(tarefa: Tarefa):
+    execucao = asyncio.create_task(executar_exclusao(tarefa))
+    _em_execucao.add(execucao)
+    execucao.add_done_callback(_em_execucao.discard)
+
+
+# Registra a tarefa de exclusão do documento já removido e a põe para rodar; com exclusao_imediata,
+# as consultas já saíram junto com o documento e a tarefa só registra quantas
+async def agendar_exclusao(tipo: str, alvo_id: str, consultas_removidas: int = 0) -> Tarefa:
+    if repositorio().exclusao_imediata:
+        return await repositorio().tarefas.criar(tipo, alvo_id, TAREFA_CONCLUIDA, consultas_removidas)
+    tarefa = await repositorio().tarefas.criar(tipo, alvo_id)
+    _disparar(tarefa)
+    return tarefa
+
+
+# Retoma as tarefas pendentes ou interrompidas que ficaram PRAZO_TAREFA sem andar.
+# Com vários workers procurando juntos, cada tarefa é reivindicada por um só deles
+async def retomar_exclusoes() -> int:
+    retomadas, limite = 0, datetime.utcnow() - PRAZO_TAREFA
+    for tarefa in await repositorio().tarefas.inacabadas():
+        if tarefa.atualizada_em > limite:
+            continue  # Concessão em vigor: outro worker (ou este) ainda está com a tarefa
+        if await repositorio().tarefas.reivindicar(tarefa.id, tarefa.atualizada_em):
+            _disparar(tarefa)
+            retomadas += 1
+    return retomadas
+
+
+# Procura tarefas abandonadas de tempos em tempos, enquanto o worker estiver no ar
+async def _vigiar():
+    while True:
+        await asyncio.sleep(PRAZO_TAREFA.total_seconds() / 2)
+        try:
+            await retomar_exclusoes()
+        except Exception:
+            pass  # Banco indisponível agora: tenta de novo na próxima volta
+
+
+# Retoma as tarefas abandonadas e passa a vigiá-las; chamada na inicialização da aplicação
+async def iniciar_exclusoes() -> int:
+    global _vigia
+    retomadas = await retomar_exclusoes()
+    _vigia = asyncio.create_task(_vigiar())
+    return retomadas
+
+
+# Espera as tarefas deste worker terminarem
+async def aguardar_exclusoes():
+    while _em_execucao:
+        await asyncio.gather(*_em_execucao, return_exceptions=True)
+
+
+# Interrompe as tarefas deste worker antes de fechar o banco (elas são retomadas na próxima inicialização)
+async def parar_exclusoes():
+    global _vigia
+    if _vigia is not None:
+        _vigia.cancel()
+        _vigia = None
+    for execucao in list(_em_execucao):
+        execucao.cancel()
+    await asyncio.gather(*_em_execucao, return_exceptions=True)
+
+
+# Função para obter uma tarefa pelo ID
+async def obter_tarefa_db(id: str) -> Tarefa:
+    tarefa = await repositorio().tarefas.obter(id)
+    if not tarefa:
+        raise HTTPException(status_code=404, detail="Tarefa não encontrada")
+    return tarefa
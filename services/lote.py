@@ -0,0 +1,60 @@
+from fastapi import HTTPException
+from pydantic import BaseModel, ValidationError
+from pymongo.errors import BulkWriteError
+from typing import Any, Dict, List, Tuple, Type
+from models.lote import ItemLote, ResultadoLote
+
+# Funções compartilhadas pelas criações em lote de pacientes, médicos e consultas
+
+TAMANHO_MAXIMO_LOTE = 10000
+
+
+def _mensagem_validacao(erro: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(parte) for parte in detalhe['loc'])}: {detalhe['msg']}"
+        for detalhe in erro.errors()
+    )
+
+
+# Valida todos os itens do lote e separa os válidos (com a posição original) dos erros
+def validar_lote(modelo: Type[BaseModel], itens: List[Dict[str, Any]]) -> Tuple[List[Tuple[int, Any]], Dict[int, str]]:
+    if len(itens) > TAMANHO_MAXIMO_LOTE:
+        raise HTTPException(status_code=400, detail=f"O lote pode ter no máximo {TAMANHO_MAXIMO_LOTE} itens")
+    validos, erros = [], {}
+    for indice, item in enumerate(itens):
+        try:
+            validos.append((indice, modelo.model_validate(item)))
+        except ValidationError as e:
+            erros[indice] = _mensagem_validacao(e)
+    return validos, erros
+
+
+# Insere os documentos com um insert_many não ordenado: um item com erro não impede os demais
+# Retorna os documentos inseridos (com a posição original) e acrescenta as falhas em erros
+async def inserir_lote(modelo, documentos: List[Tuple[int, Any]], erros: Dict[int, str]) -> List[Tuple[int, Any]]:
+    if not documentos:
+        return []
+    falhas = {}
+    try:
+        await modelo.insert_many([documento for _, documento in documentos], ordered=False)
+    except BulkWriteError as e:
+        falhas = {erro["index"]: erro.get("errmsg", "Erro ao inserir") for erro in e.details.get("writeErrors", [])}
+
+    inseridos = []
+    for posicao, (indice, documento) in enumerate(documentos):
+        if posicao in falhas:
+            erros[indice] = falhas[posicao]
+        else:
+            inseridos.append((indice, documento))
+    return inseridos
+
+
+# Monta o relatório por item, na ordem em que os itens foram enviados
+def resultado_lote(total: int, inseridos: List[Tuple[int, Any]], erros: Dict[int, str]) -> ResultadoLote:
+    ids = {indice: str(documento.id) for indice, documento in inseridos}
+    itens = [
+        ItemLote(indice=indice, sucesso=True, id=ids[indice]) if indice in ids
+        else ItemLote(indice=indice, sucesso=False, erro=erros.get(indice, "Item não processado"))
+        for indice in range(total)
+    ]
+    return ResultadoLote(inseridos=len(ids), falhas=total - len(ids), itens=itens)
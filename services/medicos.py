@@ -1,82 +1,113 @@
+import asyncio
 from fastapi import HTTPException
-from models.medicos import Medico, MedicoCreate
-from models.paciente import Paciente
-from typing import List, Dict
-from beanie import PydanticObjectId
-from bson import ObjectId
+from models.medicos import Medico, MedicoCreate, MedicoResumo, MedicoSemListas
+from models.lote import ResultadoLote
+from models.tarefas import TAREFA_EXCLUSAO_MEDICO, Tarefa
+from typing import List, Dict, Optional
+from services.cache import cache_medicos, cache_pacientes, obter_medico_cache, obter_paciente_cache
+from services.exclusoes import agendar_exclusao
+from services.lote import resultado_lote, validar_lote
+from services.paginacao import chave_cursor_por_id
+from services.repositorios import RevisaoDivergente, repositorio
 
 # Função para criar um médico
 async def criar_medico_db(medico: MedicoCreate) -> Medico:
-    db_medico = Medico(**medico.dict())
-    await db_medico.insert()
-    return db_medico
+    return await repositorio().medicos.criar(medico)
+
+# Função para criar vários médicos de uma vez, com relatório por item
+async def criar_medicos_em_lote_db(itens: List[Dict]) -> ResultadoLote:
+    validos, erros = validar_lote(MedicoCreate, itens)
+    inseridos = await repositorio().medicos.criar_lote(validos, erros)
+    return resultado_lote(len(itens), inseridos, erros)
 
-async def listar_medicos_db(skip: int = 0, limit: int = 10) -> List[Medico]:
+# A listagem projeta só os campos do resumo (ou só os campos pedidos)
+# Com cursor, a página continua depois do último id retornado (e o skip é ignorado)
+async def listar_medicos_db(
+    skip: int = 0, limit: int = 10, cursor: Optional[str] = None, campos: Optional[List[str]] = None
+) -> List[MedicoResumo]:
+    depois_de = chave_cursor_por_id(cursor)
     try:
         # Aplica a paginação usando os parâmetros skip e limit
-        return await Medico.find().skip(skip).limit(limit).to_list()
+        return await repositorio().medicos.listar(0 if cursor else skip, limit, depois_de, campos)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao listar médicos: {str(e)}")
 
 # Função para obter um médico pelo ID
-async def obter_medico_db(id: str) -> Medico:
-    db_medico = await Medico.get(id)
+# Com campos, lê só os campos pedidos direto do banco (sem passar pelo cache)
+async def obter_medico_db(id: str, campos: Optional[List[str]] = None) -> MedicoSemListas:
+    if campos:
+        documento = await repositorio().medicos.obter_campos(id, campos)
+        if not documento:
+            raise HTTPException(status_code=404, detail="Médico não encontrado")
+        return documento
+    db_medico = await obter_medico_cache(id)
     if not db_medico:
         raise HTTPException(status_code=404, detail="Médico não encontrado")
     return db_medico
 
+# Função para ler só a revisão do médico (ETag e Last-Modified), sem trazer o documento
+async def revisao_medico_db(id: str):
+    return await repositorio().medicos.revisao(id)
+
 # Função para atualizar um médico
-async def atualizar_medico_db(id: str, medico: MedicoCreate) -> Medico:
-    result = await Medico.get(id)
+# Com revisoes (If-Match), só grava se o médico ainda estiver numa delas; senão, 412
+async def atualizar_medico_db(id: str, medico: MedicoCreate, revisoes: Optional[List[str]] = None) -> Medico:
+    try:
+        result = await repositorio().medicos.atualizar(id, medico, revisoes)
+    except RevisaoDivergente:
+        raise HTTPException(status_code=412, detail="Médico alterado por outra requisição")
     if not result:
         raise HTTPException(status_code=404, detail="Médico não encontrado")
-    
-    await result.update({"$set": medico.dict(exclude_unset=True)})
+    cache_medicos.invalidar(id)
     return result
 
 # Função para deletar um médico
-async def deletar_medico_db(id: str) -> bool:
-    medico = await Medico.get(id)
-    if not medico:
-        return False
-    await medico.delete()
-    return True
+# As consultas dele saem depois, pela tarefa devolvida (ver services/exclusoes.py), ou junto com
+# ele quando o repositório tem exclusao_imediata; None se não existe
+async def deletar_medico_db(id: str) -> Optional[Tarefa]:
+    removido = await repositorio().medicos.remover(id)
+    if removido is None:
+        return None
+    # O médico sai da lista dos pacientes a que estava associado e dos pacientes das consultas removidas junto
+    pacientes, removidas = removido
+    cache_medicos.invalidar(id)
+    cache_pacientes.invalidar(*pacientes, *{paciente_id for paciente_id, _ in removidas})
+    return await agendar_exclusao(TAREFA_EXCLUSAO_MEDICO, id, len(removidas))
 
 # Função para obter médicos pelo nome
+# A busca é por prefixo dos termos normalizados: "joao sil" encontra "João da Silva"
 async def obter_medico_por_nome_db(nome: str):
-    return await Medico.find({"nome": {"$regex": nome, "$options": "i"}}).to_list()
+    return await repositorio().medicos.buscar_por_nome(nome)
 
 # Função para listar médicos por especialidade com paginação
-async def listar_medicos_por_especialidade_db(especialidade: str, skip: int, limit: int):
+async def listar_medicos_por_especialidade_db(
+    especialidade: str, skip: int, limit: int, cursor: Optional[str] = None, campos: Optional[List[str]] = None
+):
+    depois_de = chave_cursor_por_id(cursor)
     try:
-        medicos = await Medico.find({"especialidade": {"$regex": especialidade, "$options": "i"}}).skip(skip).limit(limit).to_list()
+        medicos = await repositorio().medicos.listar(0 if cursor else skip, limit, depois_de, campos, especialidade)
         return medicos
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar médicos por especialidade: {str(e)}")
 
-
-# Função para listar os pacientes de um médico
+# Função para listar os pacientes de um médico (só _id e nome saem do banco)
 async def listar_pacientes_por_medico(medico_id: str) -> List[Dict]:
-    pacientes = await Paciente.find({"medicos": str(medico_id)}).to_list()
+    pacientes = await repositorio().pacientes.listar_do_medico(medico_id)
     return [{"paciente_id": str(paciente.id), "nome": paciente.nome} for paciente in pacientes]
 
 # Função que vai associar o paciente ao médico da sua consulta
 async def associar_paciente_a_medico(paciente_id: str, medico_id: str):
-    paciente = await Paciente.get(paciente_id)
-    medico = await Medico.get(medico_id)
+    paciente, medico = await asyncio.gather(obter_paciente_cache(paciente_id), obter_medico_cache(medico_id))
 
     if not paciente:
         raise HTTPException(status_code=404, detail=f"Paciente com ID {paciente_id} não encontrado.")
     if not medico:
         raise HTTPException(status_code=404, detail=f"Médico com ID {medico_id} não encontrado.")
     
-    # Associa paciente ao médico
-    paciente.medicos.append(medico.id)
-    medico.pacientes.append(paciente.id)
-
-    # Atualiza os documentos de paciente e médico
-    await paciente.save()
-    await medico.save()
+    # Associa paciente ao médico nos dois sentidos, sem duplicar
+    await repositorio().medicos.associar_paciente(paciente.id, medico.id)
+    cache_pacientes.invalidar(paciente.id)
+    cache_medicos.invalidar(medico.id)
 
     return {"paciente_id": paciente.id,
         "medico_id": medico.id,
@@ -84,12 +115,9 @@ async def associar_paciente_a_medico(paciente_id: str, medico_id: str):
         "medico_nome": medico.nome       # Adicionando nome do médico
         }
 
+# Lê só o contador de pacientes do médico, mantido junto com as associações
 async def contar_pacientes_por_medico(medico_id: str) -> int:
-    # Obtém o médico com base no ID fornecido
-    medico = await Medico.get(medico_id)
-    
-    if not medico:
+    quantidade = await repositorio().medicos.total_pacientes(medico_id)
+    if quantidade is None:
         raise HTTPException(status_code=404, detail="Médico não encontrado")
-    
-    # Retorna a quantidade de pacientes associados ao médico
-    return len(medico.pacientes)
\ No newline at end of file
+    return quantidade
\ No newline at end of file
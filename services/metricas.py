@@ -0,0 +1,204 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+from pymongo import monitoring
+
+# Métricas por processo: latência de cada rota, comandos enviados ao MongoDB por coleção e
+# quantos comandos cada requisição fez. O MonitorComandos recebe os eventos de command monitoring
+# do pymongo e o MiddlewareMetricas delimita cada requisição; /metrics expõe tudo no formato
+# de texto do Prometheus e cada resposta traz o cabeçalho Server-Timing.
+#
+# O Motor executa os comandos em threads, copiando o contexto de quem chamou, então a
+# ContextVar da requisição chega até os eventos do pymongo.
+
+LIMITES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LIMITES_COMANDOS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Comandos de conexão e de sessão, que não contam como consultas
+COMANDOS_SEM_COLECAO = {"ping", "hello", "isMaster", "ismaster", "buildInfo", "endSessions", "killCursors"}
+
+
+class Histograma:
+    def __init__(self, limites: Sequence[float]):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float):
+        self.contagens[bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+    # Contagens acumuladas por limite (le), como o Prometheus espera
+    def acumulado(self) -> List[Tuple[str, int]]:
+        linhas, acumulado = [], 0
+        for limite, contagem in zip(list(self.limites) + ["+Inf"], self.contagens):
+            acumulado += contagem
+            linhas.append((str(limite), acumulado))
+        return linhas
+
+
+class ContagemRequisicao:
+    def __init__(self):
+        self.comandos = 0
+        self.duracao_banco = 0.0
+
+
+_requisicao_atual: ContextVar[Optional[ContagemRequisicao]] = ContextVar("requisicao_atual", default=None)
+
+
+class Metricas:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencia: Dict[Tuple[str, str], Histograma] = {}
+        self.comandos_por_requisicao: Dict[Tuple[str, str], Histograma] = {}
+        self.requisicoes: Dict[Tuple[str, str, str], int] = {}
+        # (coleção, comando) -> [quantidade, segundos, falhas]
+        self.comandos: Dict[Tuple[str, str], List[float]] = {}
+
+    def registrar_requisicao(self, metodo: str, rota: str, status: int, duracao: float, comandos: int):
+        with self._lock:
+            chave = (metodo, rota)
+            if chave not in self.latencia:
+                self.latencia[chave] = Histograma(LIMITES_LATENCIA)
+                self.comandos_por_requisicao[chave] = Histograma(LIMITES_COMANDOS)
+            self.latencia[chave].observar(duracao)
+            self.comandos_por_requisicao[chave].observar(comandos)
+            chave_status = (metodo, rota, str(status))
+            self.requisicoes[chave_status] = self.requisicoes.get(chave_status, 0) + 1
+
+    def registrar_comando(
+        self, colecao: str, comando: str, duracao: float, falhou: bool, requisicao: Optional[ContagemRequisicao]
+    ):
+        with self._lock:
+            totais = self.comandos.setdefault((colecao, comando), [0, 0.0, 0])
+            totais[0] += 1
+            totais[1] += duracao
+            totais[2] += int(falhou)
+            if requisicao is not None:
+                requisicao.comandos += 1
+                requisicao.duracao_banco += duracao
+
+    def limpar(self):
+        with self._lock:
+            self.latencia.clear()
+            self.comandos_por_requisicao.clear()
+            self.requisicoes.clear()
+            self.comandos.clear()
+
+    # Texto no formato de exposição do Prometheus (versão 0.0.4)
+    def formato_prometheus(self) -> str:
+        linhas: List[str] = []
+        with self._lock:
+            linhas += [
+                "# HELP http_requisicoes_total Requisições atendidas por rota e status.",
+                "# TYPE http_requisicoes_total counter",
+            ]
+            for (metodo, rota, status), total in sorted(self.requisicoes.items()):
+                linhas.append(f'http_requisicoes_total{{metodo="{metodo}",rota="{_escapar(rota)}",status="{status}"}} {total}')
+            _histogramas(
+                linhas, "http_requisicao_duracao_segundos", "Latência das requisições por rota.", self.latencia
+            )
+            _histogramas(
+                linhas, "http_requisicao_comandos_banco", "Comandos enviados ao MongoDB por requisição.",
+                self.comandos_por_requisicao,
+            )
+            series = sorted(self.comandos.items())
+            for nome, tipo, ajuda, indice in (
+                ("mongodb_comandos_total", "counter", "Comandos enviados ao MongoDB por coleção.", 0),
+                ("mongodb_comandos_duracao_segundos_total", "counter", "Tempo total dos comandos por coleção.", 1),
+                ("mongodb_comandos_falhas_total", "counter", "Comandos que falharam por coleção.", 2),
+            ):
+                linhas += [f"# HELP {nome} {ajuda}", f"# TYPE {nome} {tipo}"]
+                for (colecao, comando), totais in series:
+                    linhas.append(f'{nome}{{colecao="{_escapar(colecao)}",comando="{comando}"}} {totais[indice]}')
+        return "\n".join(linhas) + "\n"
+
+
+def _escapar(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histogramas(linhas: List[str], nome: str, ajuda: str, histogramas: Dict[Tuple[str, str], Histograma]):
+    linhas += [f"# HELP {nome} {ajuda}", f"# TYPE {nome} histogram"]
+    for (metodo, rota), histograma in sorted(histogramas.items()):
+        rotulos = f'metodo="{metodo}",rota="{_escapar(rota)}"'
+        for limite, acumulado in histograma.acumulado():
+            linhas.append(f'{nome}_bucket{{{rotulos},le="{limite}"}} {acumulado}')
+        linhas.append(f"{nome}_sum{{{rotulos}}} {histograma.soma}")
+        linhas.append(f"{nome}_count{{{rotulos}}} {histograma.total}")
+
+
+metricas = Metricas()
+
+
+# Listener de command monitoring do pymongo, registrado no cliente por criar_cliente
+class MonitorComandos(monitoring.CommandListener):
+    def __init__(self, registro: Metricas = metricas):
+        self.registro = registro
+        self._em_andamento: Dict[Tuple[int, object], Tuple[str, Optional[ContagemRequisicao]]] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        if event.command_name in COMANDOS_SEM_COLECAO:
+            return
+        # Em find, insert, update, delete, aggregate, count... o valor do comando é a coleção;
+        # o getMore guarda a coleção no campo "collection"
+        valor = event.command.get("collection") if event.command_name == "getMore" else event.command.get(event.command_name)
+        colecao = valor if isinstance(valor, str) else "-"
+        self._em_andamento[(event.request_id, event.connection_id)] = (colecao, _requisicao_atual.get())
+
+    def _concluir(self, event, falhou: bool):
+        inicio = self._em_andamento.pop((event.request_id, event.connection_id), None)
+        if inicio is None:
+            return
+        colecao, requisicao = inicio
+        self.registro.registrar_comando(colecao, event.command_name, event.duration_micros / 1e6, falhou, requisicao)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._concluir(event, falhou=False)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._concluir(event, falhou=True)
+
+
+# Middleware ASGI que mede cada requisição HTTP, conta os comandos feitos por ela
+# e acrescenta o cabeçalho Server-Timing (tempo no banco e tempo até o início da resposta)
+class MiddlewareMetricas:
+    def __init__(self, app, registro: Metricas = metricas):
+        self.app = app
+        self.registro = registro
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        contagem = ContagemRequisicao()
+        token = _requisicao_atual.set(contagem)
+        inicio = time.perf_counter()
+        status = 500
+
+        async def enviar(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+                decorrido = (time.perf_counter() - inicio) * 1000
+                cabecalho = (
+                    f'db;dur={contagem.duracao_banco * 1000:.1f};desc="{contagem.comandos} comandos", '
+                    f"app;dur={decorrido:.1f}"
+                )
+                mensagem["headers"] = list(mensagem.get("headers", [])) + [(b"server-timing", cabecalho.encode())]
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _requisicao_atual.reset(token)
+            # A rota é o caminho declarado (ex.: /medicos/{id}), para não criar uma série por ID
+            rota = getattr(scope.get("route"), "path", None) or "desconhecida"
+            self.registro.registrar_requisicao(
+                scope["method"], rota, status, time.perf_counter() - inicio, contagem.comandos
+            )
@@ -1,66 +1,93 @@
 from fastapi import HTTPException, Depends
 from datetime import datetime
-from models.paciente import Paciente, PacienteCreate, PacienteComConsultas
-from motor.motor_asyncio import AsyncIOMotorClient
+from models.paciente import Paciente, PacienteCreate, PacienteComConsultas, PacienteResumo, PacienteSemListas
 from typing import List, Dict
-from models.consultas import Consulta
-from beanie import PydanticObjectId
-from bson import ObjectId
-from typing import List
+from models.lote import ResultadoLote
+from models.tarefas import TAREFA_EXCLUSAO_PACIENTE, Tarefa
+from typing import List, Optional
+from services.cache import cache_medicos, cache_pacientes, obter_paciente_cache
+from services.exclusoes import agendar_exclusao
+from services.lote import resultado_lote, validar_lote
+from services.paginacao import chave_cursor_por_id
+from services.repositorios import RevisaoDivergente, repositorio
 
 # Função para criar um paciente
 async def criar_paciente_db(paciente: PacienteCreate) -> Paciente:
-    db_paciente = Paciente(**paciente.dict())
-    await db_paciente.insert()
-    return db_paciente
+    return await repositorio().pacientes.criar(paciente)
+
+# Função para criar vários pacientes de uma vez, com relatório por item
+async def criar_pacientes_em_lote_db(itens: List[Dict]) -> ResultadoLote:
+    validos, erros = validar_lote(PacienteCreate, itens)
+    inseridos = await repositorio().pacientes.criar_lote(validos, erros)
+    return resultado_lote(len(itens), inseridos, erros)
 
 # Função para listar todos os pacientes
-async def listar_pacientes_db(skip: int = 0, limit: int = 10) -> List[Paciente]:
+# Com cursor, a página continua depois do último id retornado (e o skip é ignorado)
+# A listagem projeta só os campos do resumo (as listas de consultas e médicos não saem do banco);
+# com campos, só os campos pedidos são lidos e a página vem como dicionários
+async def listar_pacientes_db(
+    skip: int = 0, limit: int = 10, cursor: Optional[str] = None, campos: Optional[List[str]] = None
+) -> List[PacienteResumo]:
+    depois_de = chave_cursor_por_id(cursor)
     try:
         # Aplica os parâmetros de paginação no banco de dados
-        pacientes = await Paciente.find().skip(skip).limit(limit).to_list()
-        return pacientes
+        return await repositorio().pacientes.listar(0 if cursor else skip, limit, depois_de, campos)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao listar pacientes: {str(e)}")
 
 # Função para obter um paciente pelo ID
-async def obter_paciente_db(id: str) -> Paciente:
-    db_paciente = await Paciente.get(id)
+# Com campos, lê só os campos pedidos direto do banco (sem passar pelo cache)
+async def obter_paciente_db(id: str, campos: Optional[List[str]] = None) -> PacienteSemListas:
+    if campos:
+        documento = await repositorio().pacientes.obter_campos(id, campos)
+        if not documento:
+            raise HTTPException(status_code=404, detail="Paciente não encontrado")
+        return documento
+    db_paciente = await obter_paciente_cache(id)
     if not db_paciente:
         raise HTTPException(status_code=404, detail="Paciente não encontrado")
     return db_paciente
 
+# Função para ler só a revisão do paciente (ETag e Last-Modified), sem trazer o documento
+async def revisao_paciente_db(id: str):
+    return await repositorio().pacientes.revisao(id)
+
 # Função para atualizar um paciente
-async def atualizar_paciente_db(id: str, paciente: PacienteCreate) -> Paciente:
-    paciente_db = await Paciente.get(id)
+# Com revisoes (If-Match), só grava se o paciente ainda estiver numa delas; senão, 412
+async def atualizar_paciente_db(id: str, paciente: PacienteCreate, revisoes: Optional[List[str]] = None) -> Paciente:
+    try:
+        paciente_db = await repositorio().pacientes.atualizar(id, paciente, revisoes)
+    except RevisaoDivergente:
+        raise HTTPException(status_code=412, detail="Paciente alterado por outra requisição")
     if not paciente_db:
         raise HTTPException(status_code=404, detail="Paciente não encontrado")
-    
-    # Atualiza o paciente com os dados fornecidos
-    await paciente_db.update({"$set": paciente.dict(exclude_unset=True)})
+    cache_pacientes.invalidar(id)
     return paciente_db
 
 # Função para deletar um paciente
-async def deletar_paciente_db(id: str) -> bool:
-    paciente = await Paciente.get(id)
-    if not paciente:
-        return False
-    await paciente.delete()
-    return True
+# As consultas dele saem depois, pela tarefa devolvida (ver services/exclusoes.py), ou junto com
+# ele quando o repositório tem exclusao_imediata; None se não existe
+async def deletar_paciente_db(id: str) -> Optional[Tarefa]:
+    removido = await repositorio().pacientes.remover(id)
+    if removido is None:
+        return None
+    # O paciente sai da lista (e do contador) dos médicos a que estava associado
+    # e dos médicos das consultas removidas junto
+    medicos, removidas = removido
+    cache_pacientes.invalidar(id)
+    cache_medicos.invalidar(*medicos, *{medico_id for _, medico_id in removidas})
+    return await agendar_exclusao(TAREFA_EXCLUSAO_PACIENTE, id, len(removidas))
 
 # Função para listar o paciente com todas as suas consultas
+# Lê do banco: o cache não guarda a lista de consultas
 async def obter_paciente_com_consultas_db(id: str) -> PacienteComConsultas:
-    paciente = await Paciente.get(id)
+    paciente = await repositorio().pacientes.obter(id)
     if not paciente:
         raise HTTPException(status_code=404, detail="Paciente não encontrado")
 
-    # Assumindo que você tenha um relacionamento entre paciente e consultas
-    consultas = await Consulta.find({"id": {"$in": paciente.consultas}}).to_list()
-
-
     paciente_dict = paciente.dict()
     paciente_dict.pop("consultas", None)  # Remove a chave 'consultas' se existir
 
-    paciente_com_consultas = PacienteComConsultas(consultas=consultas, **paciente_dict)
+    paciente_com_consultas = PacienteComConsultas(consultas=paciente.consultas, **paciente_dict)
     
     return paciente_com_consultas
@@ -0,0 +1,72 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+from fastapi import HTTPException, Response
+
+# Paginação por cursor (keyset): em vez de pular documentos com skip, a próxima página
+# começa logo depois da chave do último item retornado, usando o índice da ordenação.
+# O cursor é opaco para o cliente (JSON da chave codificado em base64).
+
+CABECALHO_PROXIMO_CURSOR = "X-Next-Cursor"
+
+
+def _codificar(chave: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(chave).encode()).decode()
+
+
+def _decodificar(cursor: str) -> list:
+    try:
+        chave = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if not isinstance(chave, list):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return chave
+
+
+# Último _id de uma listagem ordenada por _id (None sem cursor)
+def chave_cursor_por_id(cursor: Optional[str]) -> Optional[str]:
+    if not cursor:
+        return None
+    chave = _decodificar(cursor)
+    if len(chave) != 1:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return chave[0]
+
+
+# Último (data_hora, _id) de uma listagem ordenada por (data_hora, _id) (None sem cursor)
+def chave_cursor_por_data_hora(cursor: Optional[str]) -> Optional[Tuple[datetime, str]]:
+    if not cursor:
+        return None
+    chave = _decodificar(cursor)
+    try:
+        return datetime.fromisoformat(chave[0]), chave[1]
+    except (IndexError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+def _valor(item, campo: str):
+    return item[campo] if isinstance(item, dict) else getattr(item, campo)
+
+
+# Cursor da próxima página; None quando a página veio incompleta (não há mais itens)
+# Os itens podem ser documentos ou dicionários com "id" (respostas com seleção de campos)
+def proximo_cursor_por_id(itens: list, limit: int) -> Optional[str]:
+    if not itens or len(itens) < limit:
+        return None
+    return _codificar([str(_valor(itens[-1], "id"))])
+
+
+def proximo_cursor_por_data_hora(itens: list, limit: int) -> Optional[str]:
+    if not itens or len(itens) < limit:
+        return None
+    ultimo = itens[-1]
+    return _codificar([ultimo.data_hora.isoformat(), str(ultimo.id)])
+
+
+# Devolve o cursor da próxima página no cabeçalho das rotas que retornam listas
+def definir_proximo_cursor(response: Response, cursor: Optional[str]):
+    if cursor:
+        response.headers[CABECALHO_PROXIMO_CURSOR] = cursor
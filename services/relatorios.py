@@ -0,0 +1,47 @@
+from datetime import date
+from typing import Dict, List, Optional
+from fastapi import HTTPException
+from services.repositorios import repositorio
+
+# Relatórios de consultas a partir do resumo materializado por (dia, médico, status):
+# um mês de painel soma algumas centenas de linhas do resumo em vez de percorrer as consultas
+
+MAXIMO_DIAS_RELATORIO = 366
+
+
+def _validar_periodo(inicio: date, fim: date):
+    if fim < inicio:
+        raise HTTPException(status_code=400, detail="O fim do período deve ser depois do início")
+    if (fim - inicio).days >= MAXIMO_DIAS_RELATORIO:
+        raise HTTPException(status_code=400, detail=f"O período pode ter no máximo {MAXIMO_DIAS_RELATORIO} dias")
+
+
+# Junta as linhas (chave, status, quantidade), já ordenadas pela chave, em total e contagem por status
+def _por_status(linhas: List[dict], chave: str) -> List[Dict]:
+    grupos: Dict = {}
+    for linha in linhas:
+        grupo = grupos.setdefault(linha[chave], {chave: linha[chave], "total": 0, "por_status": {}})
+        grupo["total"] += linha["quantidade"]
+        grupo["por_status"][linha["status"]] = linha["quantidade"]
+    return list(grupos.values())
+
+
+# Função que conta as consultas de cada dia do período (de um médico, se informado)
+async def consultas_por_dia_db(inicio: date, fim: date, medico_id: Optional[str] = None) -> List[Dict]:
+    _validar_periodo(inicio, fim)
+    linhas = await repositorio().consultas.somar_resumos(inicio, fim, ["dia", "status"], medico_id)
+    return _por_status(linhas, "dia")
+
+
+# Função que conta as consultas de cada médico no período
+async def consultas_por_medico_db(inicio: date, fim: date) -> List[Dict]:
+    _validar_periodo(inicio, fim)
+    linhas = await repositorio().consultas.somar_resumos(inicio, fim, ["medico_id", "status"])
+    return _por_status(linhas, "medico_id")
+
+
+# Função que conta as consultas de cada especialidade no período
+async def consultas_por_especialidade_db(inicio: date, fim: date) -> List[Dict]:
+    _validar_periodo(inicio, fim)
+    linhas = await repositorio().consultas.somar_resumos(inicio, fim, ["especialidade", "status"])
+    return _por_status(linhas, "especialidade")
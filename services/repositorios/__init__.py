@@ -0,0 +1,49 @@
+from typing import Optional
+from database.config import ConfiguracaoBanco, carregar_configuracao
+from services.repositorios.base import (
+    HistoricoPerdido, Repositorio, RepositorioConsultas, RepositorioMedicos, RepositorioPacientes, RepositorioTarefas,
+    RevisaoDivergente,
+)
+from services.repositorios.mongo import RepositorioMongo
+from services.repositorios.sqlite import RepositorioSQLite
+
+# Repositório ativo do processo. O MongoDB é o padrão; com BANCO_BACKEND=sqlite o lifespan
+# abre o repositório sobre o arquivo SQLite (ver database/config.py)
+_ativo: Repositorio = RepositorioMongo()
+
+
+def repositorio() -> Repositorio:
+    return _ativo
+
+
+def definir_repositorio(novo: Repositorio):
+    global _ativo
+    _ativo = novo
+
+
+def criar_repositorio(config: ConfiguracaoBanco) -> Repositorio:
+    if config.backend == "sqlite":
+        return RepositorioSQLite(config.sqlite_caminho, config.sqlite_pool_size)
+    if config.backend == "mongo":
+        return RepositorioMongo(config)
+    raise ValueError(f"Backend de banco desconhecido: {config.backend}")
+
+
+# Cria o repositório do backend configurado, abre as conexões e o torna o ativo
+async def abrir_repositorio(config: Optional[ConfiguracaoBanco] = None) -> Repositorio:
+    novo = criar_repositorio(config or carregar_configuracao())
+    await novo.iniciar()
+    definir_repositorio(novo)
+    return novo
+
+
+async def fechar_repositorio():
+    await _ativo.fechar()
+
+
+__all__ = [
+    "HistoricoPerdido", "Repositorio", "RepositorioPacientes", "RepositorioMedicos", "RepositorioConsultas",
+    "RepositorioTarefas", "RevisaoDivergente",
+    "RepositorioMongo", "RepositorioSQLite",
+    "repositorio", "definir_repositorio", "criar_repositorio", "abrir_repositorio", "fechar_repositorio",
+]
@@ -0,0 +1,305 @@
+from abc import ABC, abstractmethod
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+from models.consultas import Consulta, ConsultaCreate
+from models.medicos import Medico, MedicoCreate, MedicoSemListas
+from models.paciente import Paciente, PacienteCreate, PacienteNome, PacienteSemListas
+from models.tarefas import TAREFA_PENDENTE, Tarefa
+
+# Contrato dos repositórios: o acesso ao banco de pacientes, médicos e consultas.
+# Os services tratam regras e erros HTTP e falam só com estas interfaces,
+# implementadas sobre o MongoDB (mongo.py) e sobre o SQLite (sqlite.py).
+#
+# Convenções comuns às implementações:
+# - IDs sempre como texto; um ID que não existe (ou não tem o formato do banco) é "não encontrado"
+# - listagens ordenadas por id ou por (data_hora, id), com o cursor vindo de services/paginacao
+# - campos: lista de campos de services/campos; a leitura traz só esses campos, como dicionários
+# - resumo de consultas: {"primeira": datetime, "ultima": datetime, "quantidade": int}
+# - contadores (total_consultas do paciente, total_pacientes do médico): atualizados na mesma
+#   escrita que acrescenta ou tira a consulta ou a associação
+# - resumo de consultas por (dia, medico_id, status): também atualizado em cada escrita de
+#   consultas (criação, lote, alteração, remoção e carga em massa); o dia é o de data_hora em UTC
+# - alterações de consultas (observar): {"token", "operacao", "id", "consulta", "antes"}, com operacao
+#   "insert", "update" ou "delete"; consulta é o estado atual (None se já foi removida) e antes é
+#   {"medico_id", "data_hora"} de antes da alteração (None na inclusão, ou quando o banco não o guarda)
+# - revisão (revisao, data_atualizacao) de pacientes, médicos e consultas: nova em cada criação e
+#   em cada atualizar(); as listas, contadores e associações não entram na revisão, porque não
+#   aparecem nas respostas de GET /pacientes/{id}, /medicos/{id} e /consultas/{id}
+# - atualizar() grava e devolve o documento já atualizado numa única operação; com revisoes (as do
+#   If-Match), só atualiza se a revisão atual for uma delas, e levanta RevisaoDivergente se não for
+# - a consulta atualizada vem com a de antes, (antes, depois), para quem chama saber de quais
+#   paciente e médico ela saiu
+# - remover paciente ou médico tira o documento e as associações; as consultas saem depois, em
+#   lotes (remover_em_lote), pela tarefa de exclusão em segundo plano (ver services/exclusoes.py),
+#   ou na mesma transação quando o repositório tem exclusao_imediata
+
+
+# O token de retomada das alterações não está mais no histórico do banco (ou não é deste banco)
+class HistoricoPerdido(Exception):
+    pass
+
+
+# O documento existe, mas com uma revisão diferente das esperadas: outra escrita chegou antes
+class RevisaoDivergente(Exception):
+    pass
+
+
+class RepositorioPacientes(ABC):
+    @abstractmethod
+    async def criar(self, dados: PacienteCreate) -> Paciente: ...
+
+    # Insere os pacientes válidos do lote; devolve os inseridos (com a posição original)
+    # e acrescenta as falhas em erros
+    @abstractmethod
+    async def criar_lote(self, validos: List[Tuple[int, PacienteCreate]], erros: Dict[int, str]) -> List[Tuple[int, Paciente]]: ...
+
+    @abstractmethod
+    async def obter(self, id: str) -> Optional[Paciente]: ...
+
+    # Só os campos do paciente e a revisão, sem ler as listas de consultas e médicos
+    @abstractmethod
+    async def obter_sem_listas(self, id: str) -> Optional[PacienteSemListas]: ...
+
+    @abstractmethod
+    async def obter_campos(self, id: str, campos: List[str]) -> Optional[dict]: ...
+
+    # Página ordenada por id, com o resumo do paciente (ou só os campos pedidos)
+    @abstractmethod
+    async def listar(self, skip: int, limit: int, depois_de: Optional[str] = None, campos: Optional[List[str]] = None) -> list: ...
+
+    @abstractmethod
+    async def atualizar(self, id: str, dados: PacienteCreate, revisoes: Optional[List[str]] = None) -> Optional[Paciente]: ...
+
+    # Remove o paciente e o tira das listas (e dos contadores) dos seus médicos; None se não existe.
+    # Devolve (médicos a que estava associado, (paciente_id, medico_id) das consultas removidas junto),
+    # sem consultas quando o repositório não tem exclusao_imediata
+    @abstractmethod
+    async def remover(self, id: str) -> Optional[Tuple[List[str], List[Tuple[str, str]]]]: ...
+
+    @abstractmethod
+    async def listar_sem_consultas(self, skip: int, limit: int) -> List[Paciente]: ...
+
+    @abstractmethod
+    async def listar_do_medico(self, medico_id: str) -> List[PacienteNome]: ...
+
+    # Nome de cada paciente encontrado entre os IDs informados
+    @abstractmethod
+    async def nomes(self, ids: List[str]) -> Dict[str, str]: ...
+
+    @abstractmethod
+    async def existentes(self, ids: List[str]) -> Set[str]: ...
+
+    # Contador de consultas do paciente, lido sem trazer o documento (None se não existe)
+    @abstractmethod
+    async def total_consultas(self, id: str) -> Optional[int]: ...
+
+    # Revisão e data da última alteração, lidas sem trazer o documento (None se não existe)
+    @abstractmethod
+    async def revisao(self, id: str) -> Optional[Tuple[str, datetime]]: ...
+
+
+class RepositorioMedicos(ABC):
+    @abstractmethod
+    async def criar(self, dados: MedicoCreate) -> Medico: ...
+
+    @abstractmethod
+    async def criar_lote(self, validos: List[Tuple[int, MedicoCreate]], erros: Dict[int, str]) -> List[Tuple[int, Medico]]: ...
+
+    @abstractmethod
+    async def obter(self, id: str) -> Optional[Medico]: ...
+
+    # Só os campos do médico e a revisão, sem ler as listas de consultas e pacientes
+    @abstractmethod
+    async def obter_sem_listas(self, id: str) -> Optional[MedicoSemListas]: ...
+
+    @abstractmethod
+    async def obter_campos(self, id: str, campos: List[str]) -> Optional[dict]: ...
+
+    # Página ordenada por id, com o resumo do médico (ou só os campos pedidos)
+    # Com especialidade, cada termo informado precisa ser prefixo de um termo da especialidade
+    @abstractmethod
+    async def listar(
+        self, skip: int, limit: int, depois_de: Optional[str] = None, campos: Optional[List[str]] = None,
+        especialidade: Optional[str] = None,
+    ) -> list: ...
+
+    # Busca por prefixo dos termos normalizados do nome ("joao sil" encontra "João da Silva")
+    @abstractmethod
+    async def buscar_por_nome(self, nome: str) -> List[Medico]: ...
+
+    @abstractmethod
+    async def atualizar(self, id: str, dados: MedicoCreate, revisoes: Optional[List[str]] = None) -> Optional[Medico]: ...
+
+    # Remove o médico e o tira das listas dos seus pacientes; devolve como o remover() de pacientes
+    @abstractmethod
+    async def remover(self, id: str) -> Optional[Tuple[List[str], List[Tuple[str, str]]]]: ...
+
+    # Associa paciente e médico nos dois sentidos, sem duplicar
+    @abstractmethod
+    async def associar_paciente(self, paciente_id: str, medico_id: str): ...
+
+    @abstractmethod
+    async def existentes(self, ids: List[str]) -> Set[str]: ...
+
+    # Contador de pacientes do médico, lido sem trazer o documento (None se não existe)
+    @abstractmethod
+    async def total_pacientes(self, id: str) -> Optional[int]: ...
+
+    @abstractmethod
+    async def revisao(self, id: str) -> Optional[Tuple[str, datetime]]: ...
+
+
+class RepositorioConsultas(ABC):
+    # Insere a consulta e a registra no paciente e no médico
+    @abstractmethod
+    async def criar(self, dados: ConsultaCreate) -> Consulta: ...
+
+    @abstractmethod
+    async def criar_lote(self, validos: List[Tuple[int, ConsultaCreate]], erros: Dict[int, str]) -> List[Tuple[int, Consulta]]: ...
+
+    @abstractmethod
+    async def obter(self, id: str) -> Optional[Consulta]: ...
+
+    @abstractmethod
+    async def atualizar(self, id: str, dados: ConsultaCreate, revisoes: Optional[List[str]] = None) -> Optional[Tuple[Consulta, Consulta]]: ...
+
+    @abstractmethod
+    async def revisao(self, id: str) -> Optional[Tuple[str, datetime]]: ...
+
+    # Remove a consulta (e a tira do paciente e do médico); devolve a consulta removida
+    @abstractmethod
+    async def remover(self, id: str) -> Optional[Consulta]: ...
+
+    # Remove até tamanho_lote consultas com campo ("paciente_id" ou "medico_id") igual a valor, com as
+    # mesmas atualizações de remover(); devolve (paciente_id, medico_id) de cada consulta removida
+    @abstractmethod
+    async def remover_em_lote(self, campo: str, valor: str, tamanho_lote: int) -> List[Tuple[str, str]]: ...
+
+    # Página ordenada por (data_hora, id); filtro com paciente_id, medico_id e status (igualdade)
+    # e período opcional sobre data_hora (inclusivo nas duas pontas)
+    @abstractmethod
+    async def listar(
+        self, filtro: Dict[str, str], skip: int, limit: int, depois_de: Optional[Tuple[datetime, str]] = None,
+        inicio: Optional[datetime] = None, fim: Optional[datetime] = None,
+    ) -> List[Consulta]: ...
+
+    # Total do filtro; com estimado e sem filtro, pode usar os metadados do banco
+    @abstractmethod
+    async def contar(self, filtro: Dict[str, str], estimado: bool = False) -> int: ...
+
+    @abstractmethod
+    async def listar_periodo(self, inicio: datetime, fim: datetime) -> List[Consulta]: ...
+
+    @abstractmethod
+    async def contar_periodo(self, inicio: datetime, fim: datetime) -> int: ...
+
+    # Consultas do período em ordem (data_hora, id), como dicionários no formato de exportação
+    # (_id, paciente_id, medico_id, data_hora, status, observacoes), lidas em lotes de tamanho_lote
+    @abstractmethod
+    def iterar_periodo(self, inicio: datetime, fim: datetime, tamanho_lote: int) -> AsyncIterator[dict]: ...
+
+    # Primeira consulta do médico, em ordem de data_hora, que ocupa a agenda (status fora de
+    # STATUS_SEM_HORARIO) e começa estritamente entre apos e antes; ignorar_id fica de fora
+    @abstractmethod
+    async def conflito(
+        self, medico_id: str, apos: datetime, antes: datetime, ignorar_id: Optional[str] = None,
+    ) -> Optional[Consulta]: ...
+
+    # Inícios das consultas que ocupam a agenda do médico em [inicio, fim), em ordem,
+    # lidos em lotes de tamanho_lote
+    @abstractmethod
+    def horarios_ocupados(
+        self, medico_id: str, inicio: datetime, fim: datetime, tamanho_lote: int,
+    ) -> AsyncIterator[datetime]: ...
+
+    # Soma o resumo de consultas entre os dias inicio e fim (inclusivos), agrupando pelas chaves
+    # pedidas ("dia", "medico_id", "status" e "especialidade", a do médico); devolve dicionários com
+    # as chaves e "quantidade", ordenados pelas chaves e sem grupos zerados
+    @abstractmethod
+    async def somar_resumos(
+        self, inicio: date, fim: date, chaves: List[str], medico_id: Optional[str] = None,
+    ) -> List[dict]: ...
+
+    # Alterações das consultas em ordem, a partir do token (None: a partir de agora). O primeiro item,
+    # {"operacao": "aberto", "token": ...}, avisa que o fluxo já está aberto e traz a posição de
+    # partida (o token pode ser None, se o banco ainda não tem uma); levanta HistoricoPerdido
+    # quando não há como retomar do token
+    @abstractmethod
+    def observar(self, token: Optional[str] = None) -> AsyncIterator[dict]: ...
+
+    @abstractmethod
+    async def resumo_do_paciente(self, paciente_id: str) -> Optional[dict]: ...
+
+    # Resumo das consultas de cada paciente existente entre os IDs (None para quem não tem consultas)
+    @abstractmethod
+    async def resumos_de_pacientes(self, paciente_ids: List[str]) -> List[Tuple[str, Optional[dict]]]: ...
+
+    # Resumo das consultas de cada paciente associado ao médico
+    @abstractmethod
+    async def resumos_dos_pacientes_do_medico(self, medico_id: str) -> List[Tuple[str, Optional[dict]]]: ...
+
+
+# Tarefas em segundo plano (ver models/tarefas.py)
+class RepositorioTarefas(ABC):
+    @abstractmethod
+    async def criar(self, tipo: str, alvo_id: str, status: str = TAREFA_PENDENTE, consultas_removidas: int = 0) -> Tarefa: ...
+
+    @abstractmethod
+    async def obter(self, id: str) -> Optional[Tarefa]: ...
+
+    # Grava os campos informados (status, consultas_removidas, erro) junto com atualizada_em
+    @abstractmethod
+    async def atualizar(self, id: str, **campos: Any): ...
+
+    # Tarefas pendentes ou em execução, na ordem de criação
+    @abstractmethod
+    async def inacabadas(self) -> List[Tarefa]: ...
+
+    # Marca a tarefa inacabada como em execução se ela não mudou desde a leitura (atualizada_em);
+    # devolve False se outro worker chegou antes
+    @abstractmethod
+    async def reivindicar(self, id: str, atualizada_em: datetime) -> bool: ...
+
+
+class Repositorio(ABC):
+    pacientes: RepositorioPacientes
+    medicos: RepositorioMedicos
+    consultas: RepositorioConsultas
+    tarefas: RepositorioTarefas
+    # As consultas do paciente ou do médico removido saem na mesma transação que ele, e a tarefa de
+    # exclusão já nasce concluída (no SQLite, que reaproveita o maior id: um paciente criado antes da
+    # tarefa terminar herdaria as consultas do removido)
+    exclusao_imediata: bool = False
+    # O banco pode dar a um documento novo o id de um removido (o SQLite dá o maior id livre); os
+    # ObjectIds do MongoDB nunca se repetem
+    reaproveita_ids: bool = False
+
+    # Abre as conexões e prepara o banco (índices, migrações leves)
+    @abstractmethod
+    async def iniciar(self): ...
+
+    @abstractmethod
+    async def fechar(self): ...
+
+    # Carga em massa de documentos já prontos (com _id, as listas de referências e a revisão), usada pela
+    # base sintética; colecao é "pacientes", "medicos" ou "consultas"
+    @abstractmethod
+    async def inserir_documentos(self, colecao: str, documentos: List[Dict[str, Any]]): ...
+
+    # Apaga pacientes, médicos e consultas
+    @abstractmethod
+    async def limpar(self): ...
+
+    # Recalcula os contadores e corrige os que divergem; devolve quantos foram corrigidos por contador
+    @abstractmethod
+    async def reconciliar_contadores(self) -> Dict[str, int]: ...
+
+    # Recalcula todo o resumo de consultas a partir das consultas; devolve quantas linhas ficaram
+    @abstractmethod
+    async def reconstruir_resumos(self) -> int: ...
+
+    # Procura referências órfãs (consultas de pacientes ou médicos que não existem mais e IDs das
+    # listas que não apontam para nada); com reparar, remove-as, e os contadores ficam para
+    # reconciliar_contadores(). Devolve quantas foram encontradas por tipo
+    @abstractmethod
+    async def reparar_orfaos(self, reparar: bool = False) -> Dict[str, int]: ...
@@ -0,0 +1,864 @@
+import asyncio
+import re
+from collections import Counter, defaultdict
+from datetime import date, datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import OperationFailure
+from database.config import ConfiguracaoBanco, carregar_configuracao
+from database.database import colecao_leitura, conectar, desconectar
+from models.consultas import STATUS_SEM_HORARIO, Consulta, ConsultaCreate, nova_revisao
+from models.medicos import Medico, MedicoCreate, MedicoResumo, MedicoSemListas, campos_busca_medico, termos_busca
+from models.paciente import Paciente, PacienteCreate, PacienteNome, PacienteResumo, PacienteSemListas
+from models.relatorios import ResumoConsultas
+from models.tarefas import STATUS_TAREFA_INACABADA, TAREFA_EXECUTANDO, TAREFA_PENDENTE, Tarefa, TarefaBase, data_reivindicacao
+from services.campos import documento_parcial, projecao_campos
+from services.lote import inserir_lote
+from services.repositorios.base import (
+    HistoricoPerdido, Repositorio, RepositorioConsultas, RepositorioMedicos, RepositorioPacientes, RepositorioTarefas,
+    RevisaoDivergente,
+)
+
+# Repositórios sobre o MongoDB, com Beanie para os documentos e Motor para as operações em massa
+
+# Ordenação estável das listagens de consultas, coberta pelos índices (..., data_hora, _id)
+ORDEM_CONSULTAS = [("data_hora", ASCENDING), ("_id", ASCENDING)]
+
+# Change stream das consultas: só as operações sobre documentos, com "replace" tratado como "update"
+PIPELINE_ALTERACOES = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+# InvalidResumeToken, ChangeStreamFatalError e ChangeStreamHistoryLost: o token não serve mais
+CODIGOS_HISTORICO_PERDIDO = {260, 280, 286}
+
+
+# Filtro de busca por prefixo sobre os termos normalizados (minúsculos e sem acentos)
+# Cada termo digitado precisa ser prefixo de algum termo do campo: "joao sil" encontra "João da Silva".
+# As regex são ancoradas e escapadas, então usam o índice e não interpretam a entrada do usuário
+def _filtro_busca(campo: str, texto: str) -> dict:
+    condicoes = [{campo: {"$regex": "^" + re.escape(termo)}} for termo in termos_busca(texto)]
+    if not condicoes:
+        return {}
+    return condicoes[0] if len(condicoes) == 1 else {"$and": condicoes}
+
+
+def _filtro_depois_do_id(depois_de: Optional[str]) -> dict:
+    return {"_id": {"$gt": depois_de}} if depois_de is not None else {}
+
+
+# Filtro para continuar uma listagem ordenada por (data_hora, _id)
+def _filtro_depois_da_data_hora(depois_de: Optional[Tuple[datetime, str]]) -> dict:
+    if depois_de is None:
+        return {}
+    data_hora, id = depois_de
+    return {"$or": [
+        {"data_hora": {"$gt": data_hora}},
+        {"data_hora": data_hora, "_id": {"$gt": id}},
+    ]}
+
+
+# Filtro de período sobre data_hora
+def _filtro_periodo(inicio: Optional[datetime], fim: Optional[datetime]) -> dict:
+    periodo = {}
+    if inicio is not None:
+        periodo["$gte"] = inicio
+    if fim is not None:
+        periodo["$lte"] = fim
+    return {"data_hora": periodo} if periodo else {}
+
+
+# Página de uma coleção ordenada por _id, projetando o resumo (ou só os campos pedidos)
+async def _pagina(modelo, resumo, filtro: dict, skip: int, limit: int, campos: Optional[List[str]]) -> list:
+    if campos:
+        documentos = await modelo.get_motor_collection().find(
+            filtro, projecao_campos(campos), sort=[("_id", ASCENDING)], skip=skip, limit=limit
+        ).to_list(limit)
+        return [documento_parcial(documento, campos) for documento in documentos]
+    return await modelo.find(filtro).sort([("_id", ASCENDING)]).skip(skip).limit(limit).project(resumo).to_list()
+
+
+async def _obter_campos(modelo, id: str, campos: List[str]) -> Optional[dict]:
+    documento = await modelo.get_motor_collection().find_one({"_id": id}, projecao_campos(campos))
+    return documento_parcial(documento, campos) if documento else None
+
+
+async def _existentes(modelo, ids: List[str]) -> Set[str]:
+    if not ids:
+        return set()
+    return set(await modelo.get_motor_collection().distinct("_id", {"_id": {"$in": list(ids)}}))
+
+
+# Acrescenta, com um único bulk_write, as consultas novas de cada paciente ou médico
+# (no paciente, o contador total_consultas sobe junto, na mesma operação)
+# Com sem_repetir, cada consulta vai numa operação filtrada pela sua ausência na lista, e repetir
+# a chamada (uma importação retomada) não a acrescenta nem conta duas vezes
+async def acrescentar_consultas_aos_pais(modelo, consultas_por_pai: Dict[str, List[str]], sem_repetir: bool = False):
+    if not consultas_por_pai:
+        return
+    if sem_repetir:
+        operacoes = [
+            UpdateOne({"_id": pai_id, "consultas": {"$ne": consulta_id}}, _referencia_consultas("$push", modelo, consulta_id))
+            for pai_id, consulta_ids in consultas_por_pai.items() for consulta_id in consulta_ids
+        ]
+    else:
+        operacoes = [
+            UpdateOne({"_id": pai_id}, _referencia_consultas("$push", modelo, {"$each": consulta_ids}, len(consulta_ids)))
+            for pai_id, consulta_ids in consultas_por_pai.items()
+        ]
+    await modelo.get_motor_collection().bulk_write(operacoes, ordered=False)
+
+
+# Atualização que põe ($push) ou tira ($pull) consultas da lista do paciente ou do médico;
+# no paciente, o contador acompanha a lista com $inc
+def _referencia_consultas(operador: str, modelo, valor, quantidade: int = 1) -> dict:
+    atualizacao = {operador: {"consultas": valor}}
+    if modelo is Paciente:
+        atualizacao["$inc"] = {"total_consultas": quantidade if operador == "$push" else -quantidade}
+    return atualizacao
+
+
+# Lê só o contador do documento; documentos gravados sem o contador (por fora da API, depois
+# da inicialização que os preenche) caem no cálculo antigo
+async def _contador(modelo, id: str, campo: str, calcular) -> Optional[int]:
+    documento = await colecao_leitura(modelo).find_one({"_id": id}, {campo: 1})
+    if documento is None:
+        return None
+    if campo not in documento:
+        return await calcular()
+    return documento[campo]
+
+
+# Campos gravados junto com cada atualização: uma revisão nova e a data da alteração
+def _nova_revisao() -> dict:
+    return {"revisao": nova_revisao(), "data_atualizacao": datetime.utcnow()}
+
+
+# Lê só a revisão do documento, pelo _id e no primário (um secundário atrasado responderia
+# 304 para uma revisão que já foi trocada)
+async def _revisao(modelo, id: str) -> Optional[Tuple[str, datetime]]:
+    documento = await modelo.get_motor_collection().find_one({"_id": id}, {"revisao": 1, "data_atualizacao": 1})
+    return (documento.get("revisao"), documento.get("data_atualizacao")) if documento else None
+
+
+# Atualiza o documento com um único find_one_and_update (os campos levam a revisão nova) e devolve o
+# documento de depois (ou de antes, com retorno=BEFORE); None se o _id não existe.
+# Com revisoes, o filtro exige uma delas, e só quando nada casa a revisão é lida, para separar
+# o documento inexistente (None) do alterado por outra escrita (RevisaoDivergente)
+async def _atualizar_documento(
+    modelo, id: str, campos: dict, revisoes: Optional[List[str]], retorno=ReturnDocument.AFTER,
+) -> Optional[dict]:
+    filtro = {"_id": id} if revisoes is None else {"_id": id, "revisao": {"$in": list(revisoes)}}
+    documento = await modelo.get_motor_collection().find_one_and_update(
+        filtro, {"$set": campos}, return_document=retorno,
+    )
+    if documento is None and revisoes is not None and await _revisao(modelo, id) is not None:
+        raise RevisaoDivergente(id)
+    return documento
+
+
+# Meia-noite (UTC) do dia, a chave de dia do resumo de consultas
+def _dia(valor) -> datetime:
+    if isinstance(valor, datetime) and valor.tzinfo is not None:
+        valor = valor.astimezone(timezone.utc)
+    return datetime(valor.year, valor.month, valor.day)
+
+
+# Aplica ao resumo as variações das consultas, dadas como (data_hora, medico_id, status, +1 ou -1):
+# as variações da mesma chave se somam antes e cada chave vira um $inc com upsert, num único bulk_write
+async def ajustar_resumos(variacoes):
+    totais = Counter()
+    for data_hora, medico_id, status, sinal in variacoes:
+        totais[(_dia(data_hora), medico_id, status)] += sinal
+    operacoes = [
+        UpdateOne({"dia": dia, "medico_id": medico_id, "status": status}, {"$inc": {"quantidade": quantidade}}, upsert=True)
+        for (dia, medico_id, status), quantidade in totais.items() if quantidade
+    ]
+    if operacoes:
+        await ResumoConsultas.get_motor_collection().bulk_write(operacoes, ordered=False)
+
+
+# Converte um evento do change stream para o formato de observar() (ver services/repositorios/base.py)
+def _alteracao(mudanca: dict) -> dict:
+    documento, anterior = mudanca.get("fullDocument"), mudanca.get("fullDocumentBeforeChange")
+    return {
+        "token": mudanca["_id"]["_data"],
+        "operacao": "update" if mudanca["operationType"] == "replace" else mudanca["operationType"],
+        "id": str(mudanca["documentKey"]["_id"]),
+        "consulta": Consulta.model_validate(documento) if documento else None,
+        "antes": {"medico_id": anterior["medico_id"], "data_hora": anterior["data_hora"]} if anterior else None,
+    }
+
+
+# Remove as consultas (dicionários com _id, paciente_id, medico_id, data_hora e status) em poucas
+# operações por lote: primeiro as tira das listas dos pais ($pull com $in nos médicos; nos pacientes,
+# um update com pipeline que filtra a lista e recalcula total_consultas pelo tamanho dela, então
+# repetir o lote não desconta duas vezes), depois um delete_one por consulta e por fim o resumo, só
+# das consultas que este chamador de fato removeu: duas execuções sobre o mesmo lote (dois workers
+# com a mesma tarefa) não descontam o resumo duas vezes. Uma interrupção no meio deixa consultas que
+# a próxima execução encontra de novo, nunca IDs soltos nas listas
+async def _remover_consultas(documentos: List[dict]) -> List[Tuple[str, str]]:
+    if not documentos:
+        return []
+    ids = [documento["_id"] for documento in documentos]
+    pacientes = list({documento["paciente_id"] for documento in documentos})
+    medicos = list({documento["medico_id"] for documento in documentos})
+    await asyncio.gather(
+        Paciente.get_motor_collection().update_many({"_id": {"$in": pacientes}}, [
+            {"$set": {"consultas": {"$filter": {
+                "input": {"$ifNull": ["$consultas", []]}, "as": "consulta", "cond": {"$not": [{"$in": ["$$consulta", ids]}]},
+            }}}},
+            {"$set": {"total_consultas": {"$size": "$consultas"}}},
+        ]),
+        Medico.get_motor_collection().update_many({"_id": {"$in": medicos}}, {"$pull": {"consultas": {"$in": ids}}}),
+    )
+    colecao = Consulta.get_motor_collection()
+    resultados = await asyncio.gather(*[colecao.delete_one({"_id": id}) for id in ids])
+    removidos = [documento for documento, resultado in zip(documentos, resultados) if resultado.deleted_count]
+    await ajustar_resumos([(d["data_hora"], d["medico_id"], d["status"], -1) for d in removidos])
+    return [(documento["paciente_id"], documento["medico_id"]) for documento in removidos]
+
+
+# Estágio que traz, em como, os _id do modelo referenciados por campo (um ID ou uma lista deles)
+def _lookup_ids(modelo, campo: str, como: str) -> dict:
+    return {"$lookup": {
+        "from": modelo.get_collection_name(),
+        "localField": campo,
+        "foreignField": "_id",
+        "pipeline": [{"$project": {"_id": 1}}],
+        "as": como,
+    }}
+
+
+# Conta (e, com reparar, tira com $pull) os IDs da lista campo que não existem na coleção do alvo;
+# o $lookup pela lista usa o índice de _id do alvo
+async def _ids_orfaos(modelo, campo: str, alvo, reparar: bool, tamanho_lote: int) -> int:
+    colecao = modelo.get_motor_collection()
+    cursor = colecao.aggregate([
+        {"$match": {f"{campo}.0": {"$exists": True}}},
+        {"$project": {campo: 1}},
+        _lookup_ids(alvo, campo, "_existentes"),
+        {"$project": {"orfaos": {"$setDifference": [f"${campo}", "$_existentes._id"]}}},
+        {"$match": {"orfaos.0": {"$exists": True}}},
+    ], batchSize=tamanho_lote)
+    encontrados, operacoes = 0, []
+    async for documento in cursor:
+        encontrados += len(documento["orfaos"])
+        if reparar:
+            operacoes.append(UpdateOne({"_id": documento["_id"]}, {"$pull": {campo: {"$in": documento["orfaos"]}}}))
+        if len(operacoes) >= tamanho_lote:
+            await colecao.bulk_write(operacoes, ordered=False)
+            operacoes = []
+    if operacoes:
+        await colecao.bulk_write(operacoes, ordered=False)
+    return encontrados
+
+
+# Liga as pré-imagens (MongoDB 6.0+) da coleção, para as alterações trazerem o estado anterior;
+# devolve False quando o servidor não aceita (versão antiga ou sem permissão de collMod)
+async def habilitar_pre_imagens(modelo) -> bool:
+    colecao = modelo.get_motor_collection()
+    try:
+        await colecao.database.command(
+            "collMod", colecao.name, changeStreamPreAndPostImages={"enabled": True}
+        )
+    except OperationFailure:
+        return False
+    return True
+
+
+# Preenche os campos de busca dos médicos cadastrados antes deles existirem
+async def preencher_campos_busca_medicos(tamanho_lote: int = 1000) -> int:
+    colecao = Medico.get_motor_collection()
+    cursor = colecao.find(
+        {"nome_busca": {"$exists": False}},
+        projection={"nome": 1, "especialidade": 1},
+        batch_size=tamanho_lote,
+    )
+    atualizados, operacoes = 0, []
+    async for documento in cursor:
+        operacoes.append(UpdateOne(
+            {"_id": documento["_id"]},
+            {"$set": campos_busca_medico(documento["nome"], documento["especialidade"])},
+        ))
+        if len(operacoes) >= tamanho_lote:
+            atualizados += (await colecao.bulk_write(operacoes, ordered=False)).modified_count
+            operacoes = []
+    if operacoes:
+        atualizados += (await colecao.bulk_write(operacoes, ordered=False)).modified_count
+    return atualizados
+
+
+# Dá uma revisão aos documentos gravados antes dela existir; pode ser a mesma para todos,
+# porque cada um ganha uma revisão própria na próxima atualização
+async def preencher_revisoes() -> int:
+    atualizados, campos = 0, _nova_revisao()
+    for modelo in (Paciente, Medico, Consulta):
+        resultado = await modelo.get_motor_collection().update_many({"revisao": {"$exists": False}}, {"$set": campos})
+        atualizados += resultado.modified_count
+    return atualizados
+
+
+# Dá os contadores aos pacientes e médicos gravados antes deles existirem, pelo tamanho das listas
+# (que o $inc acompanha); roda antes de qualquer escrita, senão o primeiro $inc criaria o campo em 1 ou -1
+async def preencher_contadores() -> int:
+    atualizados = 0
+    for modelo, contador, lista in ((Paciente, "total_consultas", "consultas"), (Medico, "total_pacientes", "pacientes")):
+        resultado = await modelo.get_motor_collection().update_many(
+            {contador: {"$exists": False}}, [{"$set": {contador: {"$size": {"$ifNull": [f"${lista}", []]}}}}],
+        )
+        atualizados += resultado.modified_count
+    return atualizados
+
+
+class RepositorioPacientesMongo(RepositorioPacientes):
+    async def criar(self, dados: PacienteCreate) -> Paciente:
+        paciente = Paciente(**dados.dict())
+        await paciente.insert()
+        return paciente
+
+    async def criar_lote(self, validos, erros):
+        documentos = [(indice, Paciente(**paciente.dict())) for indice, paciente in validos]
+        return await inserir_lote(Paciente, documentos, erros)
+
+    async def obter(self, id: str) -> Optional[Paciente]:
+        return await Paciente.get(id)
+
+    async def obter_sem_listas(self, id: str) -> Optional[PacienteSemListas]:
+        return await Paciente.find_one({"_id": id}, projection_model=PacienteSemListas)
+
+    async def obter_campos(self, id, campos):
+        return await _obter_campos(Paciente, id, campos)
+
+    async def listar(self, skip, limit, depois_de=None, campos=None):
+        return await _pagina(Paciente, PacienteResumo, _filtro_depois_do_id(depois_de), skip, limit, campos)
+
+    async def atualizar(self, id: str, dados: PacienteCreate, revisoes=None) -> Optional[Paciente]:
+        documento = await _atualizar_documento(
+            Paciente, id, {**dados.dict(exclude_unset=True), **_nova_revisao()}, revisoes,
+        )
+        return Paciente.model_validate(documento) if documento else None
+
+    # Tira o paciente da lista dos seus médicos; o filtro pela lista faz o contador descer
+    # só uma vez mesmo com remoções simultâneas
+    async def remover(self, id: str) -> Optional[Tuple[List[str], List[Tuple[str, str]]]]:
+        paciente = await Paciente.get(id)
+        if not paciente:
+            return None
+        await paciente.delete()
+        if paciente.medicos:
+            await Medico.get_motor_collection().update_many(
+                {"_id": {"$in": paciente.medicos}, "pacientes": id},
+                {"$pull": {"pacientes": id}, "$inc": {"total_pacientes": -1}},
+            )
+        return paciente.medicos, []
+
+    # O anti-join roda inteiro no servidor: o $lookup para na primeira consulta encontrada
+    # (usando o índice de paciente_id) e a paginação só é aplicada depois do filtro
+    async def listar_sem_consultas(self, skip, limit):
+        pipeline = [
+            {"$sort": {"_id": 1}},
+            {"$lookup": {
+                "from": Consulta.get_collection_name(),
+                "localField": "_id",
+                "foreignField": "paciente_id",
+                "pipeline": [{"$limit": 1}, {"$project": {"_id": 1}}],
+                "as": "_consultas",
+            }},
+            {"$match": {"_consultas": {"$size": 0}}},
+            {"$skip": skip},
+            {"$limit": limit},
+            {"$project": {"_consultas": 0}},
+        ]
+        return await Paciente.aggregate(pipeline, projection_model=Paciente).to_list()
+
+    async def listar_do_medico(self, medico_id):
+        return await Paciente.find({"medicos": str(medico_id)}).project(PacienteNome).to_list()
+
+    async def nomes(self, ids):
+        pacientes = await Paciente.find({"_id": {"$in": list(ids)}}, projection_model=PacienteNome).to_list()
+        return {paciente.id: paciente.nome for paciente in pacientes}
+
+    async def existentes(self, ids):
+        return await _existentes(Paciente, ids)
+
+    async def total_consultas(self, id):
+        return await _contador(
+            Paciente, id, "total_consultas",
+            lambda: colecao_leitura(Consulta).count_documents({"paciente_id": id}),
+        )
+
+    async def revisao(self, id):
+        return await _revisao(Paciente, id)
+
+
+class RepositorioMedicosMongo(RepositorioMedicos):
+    async def criar(self, dados: MedicoCreate) -> Medico:
+        medico = Medico(**dados.dict(), **campos_busca_medico(dados.nome, dados.especialidade))
+        await medico.insert()
+        return medico
+
+    async def criar_lote(self, validos, erros):
+        documentos = [
+            (indice, Medico(**medico.dict(), **campos_busca_medico(medico.nome, medico.especialidade)))
+            for indice, medico in validos
+        ]
+        return await inserir_lote(Medico, documentos, erros)
+
+    async def obter(self, id: str) -> Optional[Medico]:
+        return await Medico.get(id)
+
+    async def obter_sem_listas(self, id: str) -> Optional[MedicoSemListas]:
+        return await Medico.find_one({"_id": id}, projection_model=MedicoSemListas)
+
+    async def obter_campos(self, id, campos):
+        return await _obter_campos(Medico, id, campos)
+
+    async def listar(self, skip, limit, depois_de=None, campos=None, especialidade=None):
+        filtro = _filtro_depois_do_id(depois_de)
+        if especialidade is not None:
+            filtro = {**_filtro_busca("especialidade_busca", especialidade), **filtro}
+        return await _pagina(Medico, MedicoResumo, filtro, skip, limit, campos)
+
+    # Um nome em branco não tem termos, e o filtro vazio traria todos os médicos
+    async def buscar_por_nome(self, nome):
+        filtro = _filtro_busca("nome_busca", nome)
+        return await Medico.find(filtro).to_list() if filtro else []
+
+    async def atualizar(self, id: str, dados: MedicoCreate, revisoes=None) -> Optional[Medico]:
+        # Os campos de busca acompanham nome e especialidade
+        documento = await _atualizar_documento(Medico, id, {
+            **dados.dict(exclude_unset=True),
+            **campos_busca_medico(dados.nome, dados.especialidade),
+            **_nova_revisao(),
+        }, revisoes)
+        return Medico.model_validate(documento) if documento else None
+
+    # Tira o médico da lista dos seus pacientes, achados pelo _id a partir da lista do médico
+    async def remover(self, id: str) -> Optional[Tuple[List[str], List[Tuple[str, str]]]]:
+        medico = await Medico.get(id)
+        if not medico:
+            return None
+        await medico.delete()
+        if medico.pacientes:
+            await Paciente.get_motor_collection().update_many(
+                {"_id": {"$in": medico.pacientes}}, {"$pull": {"medicos": id}},
+            )
+        return medico.pacientes, []
+
+    # $addToSet no servidor: sem duplicar e sem reescrever os documentos
+    # No médico, o filtro pela ausência do paciente faz o $push e o $inc acontecerem juntos e uma vez só
+    async def associar_paciente(self, paciente_id, medico_id):
+        await asyncio.gather(
+            Paciente.find_one({"_id": paciente_id}).update({"$addToSet": {"medicos": medico_id}}),
+            Medico.get_motor_collection().update_one(
+                {"_id": medico_id, "pacientes": {"$ne": paciente_id}},
+                {"$push": {"pacientes": paciente_id}, "$inc": {"total_pacientes": 1}},
+            ),
+        )
+
+    async def existentes(self, ids):
+        return await _existentes(Medico, ids)
+
+    async def total_pacientes(self, id):
+        async def calcular():
+            documento = await colecao_leitura(Medico).find_one({"_id": id}, {"pacientes": 1})
+            return len(documento.get("pacientes", [])) if documento else 0
+        return await _contador(Medico, id, "total_pacientes", calcular)
+
+    async def revisao(self, id):
+        return await _revisao(Medico, id)
+
+
+class RepositorioConsultasMongo(RepositorioConsultas):
+    pre_imagens = False  # Ligado em iniciar(), quando a coleção guarda as pré-imagens
+
+    # As referências entram com $push no servidor, sem reescrever os documentos
+    # (e sem perder inserções concorrentes)
+    async def criar(self, dados: ConsultaCreate) -> Consulta:
+        consulta = Consulta(**dados.dict())
+        await consulta.insert()
+        await asyncio.gather(
+            Paciente.find_one({"_id": consulta.paciente_id}).update(_referencia_consultas("$push", Paciente, consulta.id)),
+            Medico.find_one({"_id": consulta.medico_id}).update(_referencia_consultas("$push", Medico, consulta.id)),
+            ajustar_resumos([(consulta.data_hora, consulta.medico_id, consulta.status, 1)]),
+        )
+        return consulta
+
+    async def criar_lote(self, validos, erros):
+        documentos = [(indice, Consulta(**consulta.dict())) for indice, consulta in validos]
+        inseridos = await inserir_lote(Consulta, documentos, erros)
+
+        por_paciente, por_medico = defaultdict(list), defaultdict(list)
+        for _, consulta in inseridos:
+            por_paciente[consulta.paciente_id].append(consulta.id)
+            por_medico[consulta.medico_id].append(consulta.id)
+        await asyncio.gather(
+            acrescentar_consultas_aos_pais(Paciente, por_paciente),
+            acrescentar_consultas_aos_pais(Medico, por_medico),
+            ajustar_resumos([(c.data_hora, c.medico_id, c.status, 1) for _, c in inseridos]),
+        )
+        return inseridos
+
+    async def obter(self, id: str) -> Optional[Consulta]:
+        return await Consulta.get(id)
+
+    # O find_one_and_update devolve a consulta de antes, que diz de quem tirar a referência e o
+    # que descontar do resumo; a de depois é ela com os campos gravados, sem outra leitura
+    async def atualizar(self, id: str, dados: ConsultaCreate, revisoes=None) -> Optional[Tuple[Consulta, Consulta]]:
+        update_data = {k: v for k, v in dados.dict(exclude_unset=True).items()}
+        update_data["paciente_id"] = str(update_data["paciente_id"])
+        update_data["medico_id"] = str(update_data["medico_id"])
+
+        revisao = _nova_revisao()
+        documento = await _atualizar_documento(
+            Consulta, id, {**update_data, **revisao}, revisoes, retorno=ReturnDocument.BEFORE,
+        )
+        if documento is None:
+            return None
+        antes = Consulta.model_validate(documento)
+        consulta = Consulta.model_validate({**documento, **update_data, **revisao})
+        anteriores = {Paciente: antes.paciente_id, Medico: antes.medico_id}
+        resumo_anterior = (antes.data_hora, antes.medico_id, antes.status, -1)
+
+        # Trocando de paciente ou de médico, a referência (e o contador) passa para o novo
+        novos = {Paciente: update_data["paciente_id"], Medico: update_data["medico_id"]}
+        await asyncio.gather(*[
+            operacao
+            for modelo, anterior in anteriores.items() if novos[modelo] != anterior
+            for operacao in (
+                modelo.find_one({"_id": anterior}).update(_referencia_consultas("$pull", modelo, id)),
+                modelo.find_one({"_id": novos[modelo]}).update(_referencia_consultas("$push", modelo, id)),
+            )
+        ], ajustar_resumos([
+            resumo_anterior,
+            (consulta.data_hora, consulta.medico_id, consulta.status, 1),
+        ]))
+        return antes, consulta
+
+    async def revisao(self, id):
+        return await _revisao(Consulta, id)
+
+    # Tira a consulta das listas do paciente e do médico com $pull no servidor
+    # Só quem de fato removeu a consulta atualiza os pais, então o contador desce uma vez só
+    async def remover(self, id: str) -> Optional[Consulta]:
+        consulta = await Consulta.get(id)
+        if not consulta:
+            return None
+        if not (await Consulta.get_motor_collection().delete_one({"_id": id})).deleted_count:
+            return None
+        await asyncio.gather(
+            Paciente.find_one({"_id": consulta.paciente_id}).update(_referencia_consultas("$pull", Paciente, consulta.id)),
+            Medico.find_one({"_id": consulta.medico_id}).update(_referencia_consultas("$pull", Medico, consulta.id)),
+            ajustar_resumos([(consulta.data_hora, consulta.medico_id, consulta.status, -1)]),
+        )
+        return consulta
+
+    # O lote sai pelo índice (paciente_id, ...) ou (medico_id, ...), trazendo só o que a remoção usa
+    async def remover_em_lote(self, campo, valor, tamanho_lote):
+        documentos = await Consulta.get_motor_collection().find(
+            {campo: valor}, {"paciente_id": 1, "medico_id": 1, "data_hora": 1, "status": 1}, limit=tamanho_lote,
+        ).to_list(tamanho_lote)
+        return await _remover_consultas(documentos)
+
+    async def listar(self, filtro, skip, limit, depois_de=None, inicio=None, fim=None):
+        filtro = {**filtro, **_filtro_periodo(inicio, fim), **_filtro_depois_da_data_hora(depois_de)}
+        return await Consulta.find(filtro).sort(ORDEM_CONSULTAS).skip(skip).limit(limit).to_list()
+
+    # Sem filtro, a estimativa vem dos metadados da coleção
+    async def contar(self, filtro, estimado=False):
+        if estimado and not filtro:
+            return await colecao_leitura(Consulta).estimated_document_count()
+        return await Consulta.find(filtro).count()
+
+    async def listar_periodo(self, inicio, fim):
+        return await Consulta.find(_filtro_periodo(inicio, fim)).to_list()
+
+    # Usa o índice de data_hora, sem trazer as consultas
+    async def contar_periodo(self, inicio, fim):
+        return await colecao_leitura(Consulta).count_documents(_filtro_periodo(inicio, fim))
+
+    # Percorre um cursor do servidor em lotes de tamanho_lote, sem montar a lista em memória
+    async def iterar_periodo(self, inicio, fim, tamanho_lote) -> AsyncIterator[dict]:
+        cursor = colecao_leitura(Consulta).find(_filtro_periodo(inicio, fim), sort=ORDEM_CONSULTAS, batch_size=tamanho_lote)
+        try:
+            async for documento in cursor:
+                yield documento
+        finally:
+            await cursor.close()
+
+    # Faixa de data_hora no índice (medico_id, data_hora, _id); lê do primário, porque a
+    # verificação antecede uma escrita
+    async def conflito(self, medico_id, apos, antes, ignorar_id=None):
+        filtro = {
+            "medico_id": medico_id,
+            "data_hora": {"$gt": apos, "$lt": antes},
+            "status": {"$nin": STATUS_SEM_HORARIO},
+        }
+        if ignorar_id is not None:
+            filtro["_id"] = {"$ne": ignorar_id}
+        return await Consulta.find(filtro).sort(ORDEM_CONSULTAS).first_or_none()
+
+    # Cursor ordenado pelo índice (medico_id, data_hora, _id), trazendo só data_hora
+    async def horarios_ocupados(self, medico_id, inicio, fim, tamanho_lote) -> AsyncIterator[datetime]:
+        cursor = colecao_leitura(Consulta).find(
+            {"medico_id": medico_id, "data_hora": {"$gte": inicio, "$lt": fim}, "status": {"$nin": STATUS_SEM_HORARIO}},
+            {"_id": 0, "data_hora": 1}, sort=ORDEM_CONSULTAS, batch_size=tamanho_lote,
+        )
+        try:
+            async for documento in cursor:
+                yield documento["data_hora"]
+        finally:
+            await cursor.close()
+
+    # A especialidade é a do médico: o resumo é somado primeiro por médico e só então cada
+    # médico (algumas centenas de grupos) busca a sua especialidade
+    async def somar_resumos(self, inicio, fim, chaves, medico_id=None):
+        filtro = {"dia": {"$gte": _dia(inicio), "$lte": _dia(fim)}}
+        if medico_id is not None:
+            filtro["medico_id"] = medico_id
+        grupo = [chave for chave in chaves if chave != "especialidade"]
+        if "especialidade" in chaves and "medico_id" not in grupo:
+            grupo.append("medico_id")
+        pipeline = [
+            {"$match": filtro},
+            {"$group": {"_id": {chave: f"${chave}" for chave in grupo}, "quantidade": {"$sum": "$quantidade"}}},
+        ]
+        if "especialidade" in chaves:
+            pipeline += [
+                {"$lookup": {
+                    "from": Medico.get_collection_name(),
+                    "localField": "_id.medico_id",
+                    "foreignField": "_id",
+                    "pipeline": [{"$project": {"especialidade": 1}}],
+                    "as": "_medico",
+                }},
+                {"$group": {
+                    "_id": {
+                        chave: (
+                            {"$arrayElemAt": ["$_medico.especialidade", 0]} if chave == "especialidade" else f"$_id.{chave}"
+                        )
+                        for chave in chaves
+                    },
+                    "quantidade": {"$sum": "$quantidade"},
+                }},
+            ]
+        pipeline += [{"$match": {"quantidade": {"$ne": 0}}}, {"$sort": {f"_id.{chave}": 1 for chave in chaves}}]
+        resultados = await colecao_leitura(ResumoConsultas).aggregate(pipeline).to_list(None)
+        return [
+            {
+                **{chave: resultado["_id"].get(chave) for chave in chaves},
+                **({"dia": resultado["_id"]["dia"].date()} if "dia" in chaves else {}),
+                "quantidade": resultado["quantidade"],
+            }
+            for resultado in resultados
+        ]
+
+    # Change stream com o documento atual (updateLookup) e, se ligadas, as pré-imagens.
+    # Exige replica set (um nó só já basta); o fluxo retoma sozinho de erros transitórios
+    async def observar(self, token=None) -> AsyncIterator[dict]:
+        opcoes = {"full_document": "updateLookup"}
+        if self.pre_imagens:
+            opcoes["full_document_before_change"] = "whenAvailable"
+        if token is not None:
+            opcoes["resume_after"] = {"_data": token}
+        try:
+            async with Consulta.get_motor_collection().watch(PIPELINE_ALTERACOES, **opcoes) as fluxo:
+                posicao = fluxo.resume_token
+                yield {"operacao": "aberto", "token": posicao["_data"] if posicao else token}
+                async for mudanca in fluxo:
+                    yield _alteracao(mudanca)
+        except OperationFailure as erro:
+            if erro.code in CODIGOS_HISTORICO_PERDIDO:
+                raise HistoricoPerdido(str(erro)) from erro
+            raise
+
+    async def resumo_do_paciente(self, paciente_id):
+        resumos = await Consulta.aggregate([
+            {"$match": {"paciente_id": paciente_id}},
+            {"$group": {"_id": None, **_RESUMO_CONSULTAS}},
+        ]).to_list()
+        return resumos[0] if resumos else None
+
+    async def resumos_de_pacientes(self, paciente_ids):
+        return await _resumos_de_pacientes({"_id": {"$in": [str(id) for id in paciente_ids]}})
+
+    async def resumos_dos_pacientes_do_medico(self, medico_id):
+        return await _resumos_de_pacientes({"medicos": str(medico_id)})
+
+
+# Estágio $group que resume as consultas em primeira data, última data e quantidade
+_RESUMO_CONSULTAS = {
+    "primeira": {"$min": "$data_hora"},
+    "ultima": {"$max": "$data_hora"},
+    "quantidade": {"$sum": 1},
+}
+
+
+# Resumo das consultas de vários pacientes numa única agregação: o filtro é aplicado sobre
+# os pacientes e o $lookup resume as consultas de cada um pelo índice de paciente_id
+async def _resumos_de_pacientes(filtro_pacientes: dict) -> List[Tuple[str, Optional[dict]]]:
+    resultados = await colecao_leitura(Paciente).aggregate([
+        {"$match": filtro_pacientes},
+        {"$project": {"_id": 1}},
+        {"$lookup": {
+            "from": Consulta.get_collection_name(),
+            "localField": "_id",
+            "foreignField": "paciente_id",
+            "pipeline": [{"$group": {"_id": None, **_RESUMO_CONSULTAS}}],
+            "as": "resumo",
+        }},
+    ]).to_list(None)
+    return [(resultado["_id"], resultado["resumo"][0] if resultado["resumo"] else None) for resultado in resultados]
+
+
+class RepositorioTarefasMongo(RepositorioTarefas):
+    async def criar(self, tipo, alvo_id, status=TAREFA_PENDENTE, consultas_removidas=0):
+        tarefa = Tarefa(**TarefaBase(tipo=tipo, alvo_id=alvo_id, status=status, consultas_removidas=consultas_removidas).dict())
+        await tarefa.insert()
+        return tarefa
+
+    async def obter(self, id):
+        return await Tarefa.get(id)
+
+    async def atualizar(self, id, **campos):
+        await Tarefa.get_motor_collection().update_one(
+            {"_id": id}, {"$set": {**campos, "atualizada_em": datetime.utcnow()}},
+        )
+
+    async def inacabadas(self):
+        return await Tarefa.find({"status": {"$in": STATUS_TAREFA_INACABADA}}).sort([("criada_em", ASCENDING)]).to_list()
+
+    async def reivindicar(self, id, atualizada_em):
+        resultado = await Tarefa.get_motor_collection().update_one(
+            {"_id": id, "status": {"$in": STATUS_TAREFA_INACABADA}, "atualizada_em": atualizada_em},
+            {"$set": {"status": TAREFA_EXECUTANDO, "atualizada_em": data_reivindicacao(atualizada_em)}},
+        )
+        return resultado.modified_count > 0
+
+
+_MODELOS = {"pacientes": Paciente, "medicos": Medico, "consultas": Consulta}
+
+
+class RepositorioMongo(Repositorio):
+    def __init__(self, config: Optional[ConfiguracaoBanco] = None):
+        self.config = config
+        self.pacientes = RepositorioPacientesMongo()
+        self.medicos = RepositorioMedicosMongo()
+        self.consultas = RepositorioConsultasMongo()
+        self.tarefas = RepositorioTarefasMongo()
+
+    # Cria o cliente, inicializa o Beanie e completa os campos de busca, as revisões, os contadores
+    # e o resumo de consultas dos documentos antigos
+    async def iniciar(self):
+        await conectar(self.config)
+        await preencher_campos_busca_medicos()
+        await preencher_revisoes()
+        await preencher_contadores()
+        await self.preencher_resumos()
+        if (self.config or carregar_configuracao()).pre_imagens_consultas:
+            self.consultas.pre_imagens = await habilitar_pre_imagens(Consulta)
+
+    async def fechar(self):
+        desconectar()
+
+    async def inserir_documentos(self, colecao: str, documentos: List[Dict[str, Any]]):
+        if documentos:
+            await _MODELOS[colecao].get_motor_collection().insert_many(documentos, ordered=False)
+            if colecao == "consultas":
+                await ajustar_resumos([(d["data_hora"], d["medico_id"], d["status"], 1) for d in documentos])
+
+    async def limpar(self):
+        for modelo in [*_MODELOS.values(), ResumoConsultas, Tarefa]:
+            await modelo.get_motor_collection().delete_many({})
+
+    # O total de consultas sai de uma contagem pelo índice de paciente_id e só os divergentes são
+    # regravados, com a condição de o contador não ter mudado desde a leitura (um $inc no meio
+    # fica para a próxima execução). O de pacientes é o tamanho da lista, corrigido num único update
+    async def reconciliar_contadores(self, tamanho_lote: int = 1000):
+        pacientes = Paciente.get_motor_collection()
+        cursor = pacientes.aggregate([
+            {"$project": {"total_consultas": 1}},
+            {"$lookup": {
+                "from": Consulta.get_collection_name(),
+                "localField": "_id",
+                "foreignField": "paciente_id",
+                "pipeline": [{"$count": "n"}],
+                "as": "_contagem",
+            }},
+            {"$project": {"total_consultas": 1, "contagem": {"$ifNull": [{"$arrayElemAt": ["$_contagem.n", 0]}, 0]}}},
+            {"$match": {"$expr": {"$ne": [{"$ifNull": ["$total_consultas", -1]}, "$contagem"]}}},
+        ], batchSize=tamanho_lote)
+        corrigidos, operacoes = 0, []
+        async for documento in cursor:
+            operacoes.append(UpdateOne(
+                {"_id": documento["_id"], "total_consultas": documento.get("total_consultas")},
+                {"$set": {"total_consultas": documento["contagem"]}},
+            ))
+            if len(operacoes) >= tamanho_lote:
+                corrigidos += (await pacientes.bulk_write(operacoes, ordered=False)).modified_count
+                operacoes = []
+        if operacoes:
+            corrigidos += (await pacientes.bulk_write(operacoes, ordered=False)).modified_count
+
+        tamanho_lista = {"$size": {"$ifNull": ["$pacientes", []]}}
+        medicos = await Medico.get_motor_collection().update_many(
+            {"$expr": {"$ne": [{"$ifNull": ["$total_pacientes", -1]}, tamanho_lista]}},
+            [{"$set": {"total_pacientes": tamanho_lista}}],
+        )
+        return {"paciente.total_consultas": corrigidos, "medico.total_pacientes": medicos.modified_count}
+
+    # Numa base gravada antes do resumo (coleção vazia e consultas gravadas), monta o resumo antes de
+    # qualquer escrita, senão alterar ou remover uma consulta antiga deixaria a sua linha em -1
+    async def preencher_resumos(self) -> bool:
+        if await ResumoConsultas.get_motor_collection().find_one({}, {"_id": 1}):
+            return False
+        if not await Consulta.get_motor_collection().find_one({}, {"_id": 1}):
+            return False
+        await self.reconstruir_resumos()
+        return True
+
+    # Refaz o resumo com uma agregação sobre as consultas; o $out troca a coleção inteira no fim,
+    # então as variações gravadas durante a reconstrução se perdem (rode fora do horário de uso)
+    async def reconstruir_resumos(self):
+        await Consulta.get_motor_collection().aggregate([
+            {"$group": {
+                "_id": {
+                    "dia": {"$dateFromParts": {
+                        "year": {"$year": "$data_hora"},
+                        "month": {"$month": "$data_hora"},
+                        "day": {"$dayOfMonth": "$data_hora"},
+                    }},
+                    "medico_id": "$medico_id",
+                    "status": "$status",
+                },
+                "quantidade": {"$sum": 1},
+            }},
+            {"$project": {"_id": 0, "dia": "$_id.dia", "medico_id": "$_id.medico_id", "status": "$_id.status", "quantidade": 1}},
+            {"$out": ResumoConsultas.get_collection_name()},
+        ], allowDiskUse=True).to_list(None)
+        return await ResumoConsultas.get_motor_collection().count_documents({})
+
+    # Primeiro as consultas sem paciente ou sem médico (o $lookup para no _id de cada um), removidas
+    # como na exclusão em segundo plano; depois os IDs soltos nas listas dos pacientes e dos médicos
+    async def reparar_orfaos(self, reparar=False, tamanho_lote: int = 1000):
+        cursor = Consulta.get_motor_collection().aggregate([
+            {"$project": {"paciente_id": 1, "medico_id": 1, "data_hora": 1, "status": 1}},
+            _lookup_ids(Paciente, "paciente_id", "_paciente_id"),
+            _lookup_ids(Medico, "medico_id", "_medico_id"),
+            {"$match": {"$or": [{"_paciente_id": {"$size": 0}}, {"_medico_id": {"$size": 0}}]}},
+            {"$project": {"_paciente_id": 0, "_medico_id": 0}},
+        ], batchSize=tamanho_lote)
+        consultas, lote = 0, []
+        async for documento in cursor:
+            consultas += 1
+            if reparar:
+                lote.append(documento)
+            if len(lote) >= tamanho_lote:
+                await _remover_consultas(lote)
+                lote = []
+        await _remover_consultas(lote)
+        return {
+            "consultas": consultas,
+            "paciente.consultas": await _ids_orfaos(Paciente, "consultas", Consulta, reparar, tamanho_lote),
+            "paciente.medicos": await _ids_orfaos(Paciente, "medicos", Medico, reparar, tamanho_lote),
+            "medico.consultas": await _ids_orfaos(Medico, "consultas", Consulta, reparar, tamanho_lote),
+            "medico.pacientes": await _ids_orfaos(Medico, "pacientes", Paciente, reparar, tamanho_lote),
+        }
@@ -0,0 +1,1160 @@
+import asyncio
+import json
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+from models.consultas import STATUS_SEM_HORARIO, Consulta, ConsultaCreate, nova_revisao
+from models.medicos import Medico, MedicoCreate, MedicoResumo, MedicoSemListas, campos_busca_medico, termos_busca
+from models.paciente import Paciente, PacienteCreate, PacienteNome, PacienteResumo, PacienteSemListas
+from models.tarefas import STATUS_TAREFA_INACABADA, TAREFA_EXECUTANDO, TAREFA_PENDENTE, Tarefa, data_reivindicacao
+from services.repositorios.base import (
+    HistoricoPerdido, Repositorio, RepositorioConsultas, RepositorioMedicos, RepositorioPacientes, RepositorioTarefas,
+    RevisaoDivergente,
+)
+
+# Repositórios sobre o SQLite, no mesmo esquema do database.db (tabelas paciente, medico,
+# consulta e pacientemedico, com IDs inteiros expostos como texto).
+#
+# O módulo sqlite3 é síncrono: cada conexão do pool roda numa thread do executor, e uma
+# requisição pega uma conexão livre, executa a operação inteira nela e a devolve ao pool.
+# As conexões usam WAL (leituras não esperam as escritas), guardam os comandos preparados
+# (cached_statements) e as escritas abrem a transação com BEGIN IMMEDIATE.
+# As listas de consultas, pacientes e médicos dos documentos são montadas a partir das tabelas
+# consulta e pacientemedico, então não há referências duplicadas para manter. Os contadores
+# (paciente.total_consultas e medico.total_pacientes) e o resumo de consultas (resumo_consulta)
+# são mantidos por gatilhos, na mesma transação que grava a consulta ou a associação.
+# Os gatilhos também registram cada alteração de consulta em alteracao_consulta, lida por observar().
+
+FORMATO_DATA = "%Y-%m-%d %H:%M:%S.%f"  # Mesmo formato de texto gravado pelo SQLAlchemy
+COMANDOS_PREPARADOS = 256
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS paciente (
+    nome VARCHAR NOT NULL,
+    telefone VARCHAR NOT NULL,
+    email VARCHAR,
+    sexo VARCHAR,
+    peso FLOAT,
+    altura FLOAT,
+    problemas_de_saude VARCHAR,
+    id INTEGER NOT NULL,
+    data_criacao DATETIME NOT NULL,
+    PRIMARY KEY (id)
+);
+CREATE TABLE IF NOT EXISTS medico (
+    nome VARCHAR NOT NULL,
+    especialidade VARCHAR NOT NULL,
+    crm VARCHAR NOT NULL,
+    email VARCHAR NOT NULL,
+    telefone VARCHAR NOT NULL,
+    id INTEGER NOT NULL,
+    data_criacao DATETIME NOT NULL,
+    PRIMARY KEY (id)
+);
+CREATE TABLE IF NOT EXISTS consulta (
+    id INTEGER NOT NULL,
+    paciente_id INTEGER NOT NULL,
+    medico_id INTEGER NOT NULL,
+    data_hora DATETIME NOT NULL,
+    status VARCHAR NOT NULL,
+    observacoes VARCHAR NOT NULL,
+    PRIMARY KEY (id)
+);
+CREATE TABLE IF NOT EXISTS pacientemedico (
+    paciente_id INTEGER NOT NULL,
+    medico_id INTEGER NOT NULL,
+    PRIMARY KEY (paciente_id, medico_id),
+    FOREIGN KEY(paciente_id) REFERENCES paciente (id),
+    FOREIGN KEY(medico_id) REFERENCES medico (id)
+);
+-- Mesmos índices das consultas no MongoDB: o id no final cobre a ordenação (data_hora, id)
+CREATE INDEX IF NOT EXISTS ix_consulta_paciente_data_hora_id ON consulta (paciente_id, data_hora, id);
+CREATE INDEX IF NOT EXISTS ix_consulta_medico_data_hora_id ON consulta (medico_id, data_hora, id);
+CREATE INDEX IF NOT EXISTS ix_consulta_data_hora_id ON consulta (data_hora, id);
+-- A chave primária de pacientemedico já começa por paciente_id; este cobre a busca por médico
+CREATE INDEX IF NOT EXISTS ix_pacientemedico_medico ON pacientemedico (medico_id, paciente_id);
+"""
+
+# Termos de busca normalizados, separados por espaço (ver campos_busca_medico)
+COLUNAS_BUSCA_MEDICO = ("nome_busca", "especialidade_busca")
+
+# Resumo de consultas por (dia, medico_id, status), mantido pelos gatilhos de consulta
+# O dia são os 10 primeiros caracteres de data_hora (AAAA-MM-DD), como gravados por _data
+RESUMOS = """
+CREATE TABLE IF NOT EXISTS resumo_consulta (
+    dia DATE NOT NULL,
+    medico_id INTEGER NOT NULL,
+    status VARCHAR NOT NULL,
+    quantidade INTEGER NOT NULL,
+    PRIMARY KEY (dia, medico_id, status)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ix_resumo_consulta_medico_dia ON resumo_consulta (medico_id, dia);
+CREATE TRIGGER IF NOT EXISTS tg_resumo_consulta_inserida AFTER INSERT ON consulta BEGIN
+    INSERT INTO resumo_consulta (dia, medico_id, status, quantidade)
+    VALUES (substr(NEW.data_hora, 1, 10), NEW.medico_id, NEW.status, 1)
+    ON CONFLICT (dia, medico_id, status) DO UPDATE SET quantidade = quantidade + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS tg_resumo_consulta_removida AFTER DELETE ON consulta BEGIN
+    UPDATE resumo_consulta SET quantidade = quantidade - 1
+    WHERE dia = substr(OLD.data_hora, 1, 10) AND medico_id = OLD.medico_id AND status = OLD.status;
+    DELETE FROM resumo_consulta
+    WHERE dia = substr(OLD.data_hora, 1, 10) AND medico_id = OLD.medico_id AND status = OLD.status AND quantidade = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS tg_resumo_consulta_alterada AFTER UPDATE OF data_hora, medico_id, status ON consulta
+WHEN substr(NEW.data_hora, 1, 10) IS NOT substr(OLD.data_hora, 1, 10)
+    OR NEW.medico_id IS NOT OLD.medico_id OR NEW.status IS NOT OLD.status BEGIN
+    UPDATE resumo_consulta SET quantidade = quantidade - 1
+    WHERE dia = substr(OLD.data_hora, 1, 10) AND medico_id = OLD.medico_id AND status = OLD.status;
+    DELETE FROM resumo_consulta
+    WHERE dia = substr(OLD.data_hora, 1, 10) AND medico_id = OLD.medico_id AND status = OLD.status AND quantidade = 0;
+    INSERT INTO resumo_consulta (dia, medico_id, status, quantidade)
+    VALUES (substr(NEW.data_hora, 1, 10), NEW.medico_id, NEW.status, 1)
+    ON CONFLICT (dia, medico_id, status) DO UPDATE SET quantidade = quantidade + 1;
+END;
+"""
+SQL_RECONSTRUIR_RESUMOS = (
+    "INSERT INTO resumo_consulta (dia, medico_id, status, quantidade)"
+    " SELECT substr(data_hora, 1, 10), medico_id, status, COUNT(*) FROM consulta GROUP BY 1, 2, 3"
+)
+# Colunas que os relatórios podem agrupar; a especialidade vem do médico
+COLUNAS_RESUMO = {"dia": "r.dia", "medico_id": "r.medico_id", "status": "r.status", "especialidade": "m.especialidade"}
+
+# Alterações das consultas na ordem em que foram gravadas, lidas por observar(): o seq é o token de
+# retomada e as alterações guardam o médico e a data de antes. Cada registro novo apaga os que
+# passaram de RETENCAO_ALTERACOES, então a tabela não cresce sem limite
+RETENCAO_ALTERACOES = 10000
+TAMANHO_LOTE_ALTERACOES = 500
+INTERVALO_ALTERACOES = 0.25  # Segundos entre as leituras da tabela quando não há alterações novas
+ALTERACOES = f"""
+CREATE TABLE IF NOT EXISTS alteracao_consulta (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    operacao VARCHAR NOT NULL,
+    consulta_id INTEGER NOT NULL,
+    medico_anterior INTEGER,
+    data_hora_anterior DATETIME
+);
+CREATE TRIGGER IF NOT EXISTS tg_alteracao_consulta_inserida AFTER INSERT ON consulta BEGIN
+    INSERT INTO alteracao_consulta (operacao, consulta_id) VALUES ('insert', NEW.id);
+END;
+CREATE TRIGGER IF NOT EXISTS tg_alteracao_consulta_alterada AFTER UPDATE ON consulta BEGIN
+    INSERT INTO alteracao_consulta (operacao, consulta_id, medico_anterior, data_hora_anterior)
+    VALUES ('update', NEW.id, OLD.medico_id, OLD.data_hora);
+END;
+CREATE TRIGGER IF NOT EXISTS tg_alteracao_consulta_removida AFTER DELETE ON consulta BEGIN
+    INSERT INTO alteracao_consulta (operacao, consulta_id, medico_anterior, data_hora_anterior)
+    VALUES ('delete', OLD.id, OLD.medico_id, OLD.data_hora);
+END;
+CREATE TRIGGER IF NOT EXISTS tg_alteracao_consulta_podada AFTER INSERT ON alteracao_consulta BEGIN
+    DELETE FROM alteracao_consulta WHERE seq <= NEW.seq - {RETENCAO_ALTERACOES};
+END;
+"""
+# O estado atual de cada consulta alterada vem na mesma leitura (como o updateLookup do MongoDB)
+SQL_ALTERACOES = """
+SELECT a.seq, a.operacao, a.consulta_id, a.medico_anterior, a.data_hora_anterior,
+    c.paciente_id, c.medico_id, c.data_hora, c.status, c.observacoes
+FROM alteracao_consulta a LEFT JOIN consulta c ON c.id = a.consulta_id
+WHERE a.seq > ? ORDER BY a.seq LIMIT ?"""
+SQL_ULTIMA_ALTERACAO = "SELECT seq FROM sqlite_sequence WHERE name = 'alteracao_consulta'"
+SQL_PRIMEIRA_ALTERACAO = "SELECT MIN(seq) FROM alteracao_consulta"
+
+# Tarefas em segundo plano (ver models/tarefas.py); alvo_id é o ID em texto, como na API
+TAREFAS = """
+CREATE TABLE IF NOT EXISTS tarefa (
+    id INTEGER NOT NULL,
+    tipo VARCHAR NOT NULL,
+    alvo_id VARCHAR NOT NULL,
+    status VARCHAR NOT NULL,
+    consultas_removidas INTEGER NOT NULL DEFAULT 0,
+    criada_em DATETIME NOT NULL,
+    atualizada_em DATETIME NOT NULL,
+    erro VARCHAR,
+    PRIMARY KEY (id)
+);
+CREATE INDEX IF NOT EXISTS ix_tarefa_status ON tarefa (status);
+"""
+COLUNAS_TAREFA = ("tipo", "alvo_id", "status", "consultas_removidas", "criada_em", "atualizada_em")
+SQL_INSERIR_TAREFA = f"INSERT INTO tarefa ({', '.join(COLUNAS_TAREFA)}) VALUES (?, ?, ?, ?, ?, ?)"
+SQL_OBTER_TAREFA = "SELECT * FROM tarefa WHERE id = ?"
+_INACABADA = f"status IN ({', '.join('?' * len(STATUS_TAREFA_INACABADA))})"
+SQL_TAREFAS_INACABADAS = f"SELECT * FROM tarefa WHERE {_INACABADA} ORDER BY id"
+SQL_REIVINDICAR_TAREFA = (
+    f"UPDATE tarefa SET status = ?, atualizada_em = ? WHERE id = ? AND atualizada_em = ? AND {_INACABADA}"
+)
+
+# Contadores acrescentados ao esquema do database.db: (tabela, coluna, recálculo a partir das tabelas)
+CONTADORES = (
+    ("paciente", "total_consultas", "SELECT COUNT(*) FROM consulta WHERE paciente_id = paciente.id"),
+    ("medico", "total_pacientes", "SELECT COUNT(*) FROM pacientemedico WHERE medico_id = medico.id"),
+)
+GATILHOS_CONTADORES = """
+CREATE TRIGGER IF NOT EXISTS tg_consulta_inserida AFTER INSERT ON consulta BEGIN
+    UPDATE paciente SET total_consultas = total_consultas + 1 WHERE id = NEW.paciente_id;
+END;
+CREATE TRIGGER IF NOT EXISTS tg_consulta_removida AFTER DELETE ON consulta BEGIN
+    UPDATE paciente SET total_consultas = total_consultas - 1 WHERE id = OLD.paciente_id;
+END;
+CREATE TRIGGER IF NOT EXISTS tg_consulta_trocou_paciente AFTER UPDATE OF paciente_id ON consulta
+WHEN NEW.paciente_id IS NOT OLD.paciente_id BEGIN
+    UPDATE paciente SET total_consultas = total_consultas - 1 WHERE id = OLD.paciente_id;
+    UPDATE paciente SET total_consultas = total_consultas + 1 WHERE id = NEW.paciente_id;
+END;
+CREATE TRIGGER IF NOT EXISTS tg_pacientemedico_inserido AFTER INSERT ON pacientemedico BEGIN
+    UPDATE medico SET total_pacientes = total_pacientes + 1 WHERE id = NEW.medico_id;
+END;
+CREATE TRIGGER IF NOT EXISTS tg_pacientemedico_removido AFTER DELETE ON pacientemedico BEGIN
+    UPDATE medico SET total_pacientes = total_pacientes - 1 WHERE id = OLD.medico_id;
+END;
+"""
+
+# Revisão e data da última alteração, acrescentadas ao esquema do database.db e gravadas a cada
+# criação e atualização; as linhas gravadas sem elas (bancos antigos) ganham uma na inicialização
+TABELAS_REVISAO = ("paciente", "medico", "consulta")
+COLUNAS_REVISAO = ("revisao", "data_atualizacao")
+
+COLUNAS_PACIENTE = ("nome", "telefone", "email", "sexo", "peso", "altura", "problemas_de_saude", "data_criacao")
+COLUNAS_MEDICO = ("nome", "especialidade", "crm", "email", "telefone", "data_criacao")
+COLUNAS_CONSULTA = ("paciente_id", "medico_id", "data_hora", "status", "observacoes")
+
+RESUMO_PACIENTE = "id, nome, telefone, email, sexo, peso, altura, problemas_de_saude, data_criacao"
+RESUMO_MEDICO = "id, nome, especialidade, crm, email, telefone"
+CONSULTA = "id, paciente_id, medico_id, data_hora, status, observacoes"
+
+# Documento completo, com as listas de referências agregadas na mesma leitura
+# (cada lista sai na ordem do índice que a atende, sem ordenação extra)
+PACIENTE_COMPLETO = """
+SELECT p.id, p.nome, p.telefone, p.email, p.sexo, p.peso, p.altura, p.problemas_de_saude, p.data_criacao, p.total_consultas,
+    p.revisao, p.data_atualizacao,
+    (SELECT group_concat(id) FROM (SELECT id FROM consulta WHERE paciente_id = p.id ORDER BY data_hora, id)) AS consultas,
+    (SELECT group_concat(medico_id) FROM (SELECT medico_id FROM pacientemedico WHERE paciente_id = p.id ORDER BY medico_id)) AS medicos
+FROM paciente p"""
+MEDICO_COMPLETO = """
+SELECT m.id, m.nome, m.especialidade, m.crm, m.email, m.telefone, m.data_criacao, m.nome_busca, m.especialidade_busca,
+    m.total_pacientes, m.revisao, m.data_atualizacao,
+    (SELECT group_concat(id) FROM (SELECT id FROM consulta WHERE medico_id = m.id ORDER BY data_hora, id)) AS consultas,
+    (SELECT group_concat(paciente_id) FROM (SELECT paciente_id FROM pacientemedico WHERE medico_id = m.id ORDER BY paciente_id)) AS pacientes
+FROM medico m"""
+
+SQL_INSERIR_PACIENTE = (
+    f"INSERT INTO paciente ({', '.join(COLUNAS_PACIENTE + COLUNAS_REVISAO)})"
+    f" VALUES ({', '.join('?' * len(COLUNAS_PACIENTE + COLUNAS_REVISAO))})"
+)
+SQL_OBTER_PACIENTE = PACIENTE_COMPLETO + " WHERE p.id = ?"
+SQL_OBTER_PACIENTE_SEM_LISTAS = f"SELECT {RESUMO_PACIENTE}, {', '.join(COLUNAS_REVISAO)} FROM paciente WHERE id = ?"
+SQL_LISTAR_PACIENTES = f"SELECT {RESUMO_PACIENTE} FROM paciente WHERE id > ? ORDER BY id LIMIT ? OFFSET ?"
+SQL_PACIENTES_SEM_CONSULTAS = (
+    PACIENTE_COMPLETO
+    + " WHERE NOT EXISTS (SELECT 1 FROM consulta c WHERE c.paciente_id = p.id) ORDER BY p.id LIMIT ? OFFSET ?"
+)
+SQL_PACIENTES_DO_MEDICO = (
+    "SELECT p.id, p.nome FROM pacientemedico pm JOIN paciente p ON p.id = pm.paciente_id"
+    " WHERE pm.medico_id = ? ORDER BY pm.paciente_id"
+)
+SQL_TOTAL_CONSULTAS_PACIENTE = "SELECT total_consultas FROM paciente WHERE id = ?"
+SQL_NOMES_PACIENTES = "SELECT id, nome FROM paciente WHERE id IN (SELECT value FROM json_each(?))"
+SQL_PACIENTES_EXISTENTES = "SELECT id FROM paciente WHERE id IN (SELECT value FROM json_each(?))"
+SQL_REMOVER_PACIENTE = "DELETE FROM paciente WHERE id = ?"
+SQL_MEDICOS_ASSOCIADOS = "SELECT medico_id FROM pacientemedico WHERE paciente_id = ?"
+SQL_DESASSOCIAR_PACIENTE = "DELETE FROM pacientemedico WHERE paciente_id = ?"
+
+SQL_INSERIR_MEDICO = (
+    f"INSERT INTO medico ({', '.join(COLUNAS_MEDICO + COLUNAS_BUSCA_MEDICO + COLUNAS_REVISAO)})"
+    f" VALUES ({', '.join('?' * len(COLUNAS_MEDICO + COLUNAS_BUSCA_MEDICO + COLUNAS_REVISAO))})"
+)
+SQL_OBTER_MEDICO = MEDICO_COMPLETO + " WHERE m.id = ?"
+SQL_OBTER_MEDICO_SEM_LISTAS = f"SELECT {RESUMO_MEDICO}, {', '.join(COLUNAS_REVISAO)} FROM medico WHERE id = ?"
+SQL_TOTAL_PACIENTES_MEDICO = "SELECT total_pacientes FROM medico WHERE id = ?"
+SQL_MEDICOS_EXISTENTES = "SELECT id FROM medico WHERE id IN (SELECT value FROM json_each(?))"
+SQL_REMOVER_MEDICO = "DELETE FROM medico WHERE id = ?"
+SQL_PACIENTES_ASSOCIADOS = "SELECT paciente_id FROM pacientemedico WHERE medico_id = ?"
+SQL_DESASSOCIAR_MEDICO = "DELETE FROM pacientemedico WHERE medico_id = ?"
+SQL_ASSOCIAR = "INSERT OR IGNORE INTO pacientemedico (paciente_id, medico_id) VALUES (?, ?)"
+SQL_MEDICOS_SEM_BUSCA = "SELECT id, nome, especialidade FROM medico WHERE nome_busca IS NULL OR especialidade_busca IS NULL"
+SQL_PREENCHER_BUSCA = "UPDATE medico SET nome_busca = ?, especialidade_busca = ? WHERE id = ?"
+
+SQL_INSERIR_CONSULTA = (
+    f"INSERT INTO consulta ({', '.join(COLUNAS_CONSULTA + COLUNAS_REVISAO)}) VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+SQL_OBTER_CONSULTA = f"SELECT {CONSULTA}, revisao, data_atualizacao FROM consulta WHERE id = ?"
+SQL_REMOVER_CONSULTA = "DELETE FROM consulta WHERE id = ?"
+# Lote da exclusão em segundo plano, pelo índice (paciente_id, ...) ou (medico_id, ...)
+SQL_LOTE_REMOCAO = {
+    campo: f"SELECT id, paciente_id, medico_id FROM consulta WHERE {campo} = ? LIMIT ?"
+    for campo in ("paciente_id", "medico_id")
+}
+SQL_REMOVER_CONSULTAS = "DELETE FROM consulta WHERE id IN (SELECT value FROM json_each(?))"
+# Referências órfãs: consultas sem paciente ou sem médico e associações soltas (bancos antigos,
+# gravados sem as chaves estrangeiras ligadas)
+CONDICAO_ORFAS = "paciente_id NOT IN (SELECT id FROM paciente) OR medico_id NOT IN (SELECT id FROM medico)"
+TABELAS_ORFAS = {"consultas": "consulta", "pacientemedico": "pacientemedico"}
+SQL_CONSULTAS_PERIODO = f"SELECT {CONSULTA} FROM consulta WHERE data_hora BETWEEN ? AND ? ORDER BY data_hora, id"
+SQL_CONTAR_PERIODO = "SELECT COUNT(*) FROM consulta WHERE data_hora BETWEEN ? AND ?"
+SQL_LOTE_PERIODO = (
+    f"SELECT {CONSULTA} FROM consulta WHERE data_hora BETWEEN ? AND ? AND (data_hora, id) > (?, ?)"
+    " ORDER BY data_hora, id LIMIT ?"
+)
+# Agenda do médico pelo índice (medico_id, data_hora, id), sem as consultas que liberam o horário
+_OCUPA_HORARIO = f"status NOT IN ({', '.join('?' * len(STATUS_SEM_HORARIO))})"
+SQL_CONFLITO = (
+    f"SELECT {CONSULTA} FROM consulta WHERE medico_id = ? AND data_hora > ? AND data_hora < ? AND id <> ?"
+    f" AND {_OCUPA_HORARIO} ORDER BY data_hora, id LIMIT 1"
+)
+SQL_LOTE_OCUPADOS = (
+    "SELECT data_hora, id FROM consulta WHERE medico_id = ? AND data_hora >= ? AND data_hora < ?"
+    f" AND (data_hora, id) > (?, ?) AND {_OCUPA_HORARIO} ORDER BY data_hora, id LIMIT ?"
+)
+SQL_RESUMO_PACIENTE = (
+    "SELECT MIN(data_hora) AS primeira, MAX(data_hora) AS ultima, COUNT(*) AS quantidade"
+    " FROM consulta WHERE paciente_id = ?"
+)
+_RESUMOS = (
+    "SELECT p.id, MIN(c.data_hora) AS primeira, MAX(c.data_hora) AS ultima, COUNT(c.id) AS quantidade"
+    " FROM paciente p LEFT JOIN consulta c ON c.paciente_id = p.id WHERE p.id IN ({}) GROUP BY p.id"
+)
+SQL_RESUMOS_PACIENTES = _RESUMOS.format("SELECT value FROM json_each(?)")
+SQL_RESUMOS_PACIENTES_DO_MEDICO = _RESUMOS.format("SELECT paciente_id FROM pacientemedico WHERE medico_id = ?")
+
+
+# ID do banco a partir do ID em texto (None quando não é um inteiro, ou seja, não existe aqui)
+def _id(valor: Optional[str]) -> Optional[int]:
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _ids(valores: List[str]) -> str:
+    return json.dumps([id for id in map(_id, valores) if id is not None])
+
+
+def _data(valor: Optional[datetime]) -> Optional[str]:
+    if valor is None:
+        return None
+    if valor.tzinfo is not None:
+        valor = valor.astimezone(timezone.utc).replace(tzinfo=None)
+    return valor.strftime(FORMATO_DATA)
+
+
+def _ler_data(valor: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(valor) if valor is not None else None
+
+
+# Revisão nova e data da alteração, nas colunas de COLUNAS_REVISAO
+def _valores_revisao() -> tuple:
+    return (nova_revisao(), _data(datetime.utcnow()))
+
+
+def _lista(valor: Optional[str]) -> List[str]:
+    return valor.split(",") if valor else []
+
+
+# Converte uma linha para o formato dos documentos: IDs em texto, datas e listas
+def _documento(linha: sqlite3.Row) -> Dict[str, Any]:
+    documento = {}
+    for campo in linha.keys():
+        valor = linha[campo]
+        if campo in ("id", "paciente_id", "medico_id"):
+            valor = str(valor) if valor is not None else None
+        elif campo in ("data_criacao", "data_hora", "data_atualizacao", "criada_em", "atualizada_em"):
+            valor = _ler_data(valor)
+        elif campo in ("consultas", "medicos", "pacientes"):
+            valor = _lista(valor)
+        elif campo in COLUNAS_BUSCA_MEDICO:
+            valor = (valor or "").split()
+        documento[campo] = valor
+    return documento
+
+
+def _termos(campos: Dict[str, List[str]]) -> Tuple[str, str]:
+    return tuple(" ".join(campos[coluna]) for coluna in COLUNAS_BUSCA_MEDICO)
+
+
+# Condições de busca por prefixo dos termos: cada termo digitado precisa começar algum termo da coluna
+# (o padrão do LIKE é escapado, então a entrada do usuário não vira curinga)
+def _condicoes_busca(coluna: str, texto: str) -> Tuple[List[str], List[str]]:
+    condicoes, parametros = [], []
+    for termo in termos_busca(texto):
+        escapado = termo.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        condicoes.append(f"(' ' || {coluna}) LIKE ? ESCAPE '\\'")
+        parametros.append(f"% {escapado}%")
+    return condicoes, parametros
+
+
+# Colunas da seleção de campos (os nomes já foram validados contra o modelo de resposta)
+def _colunas_campos(campos: List[str]) -> str:
+    return ", ".join(campos)
+
+
+def _parcial(linha: sqlite3.Row, campos: List[str]) -> Dict[str, Any]:
+    documento = _documento(linha)
+    return {campo: documento.get(campo) for campo in campos}
+
+
+class PoolSQLite:
+    def __init__(self, caminho: str, tamanho: int = 4, espera_bloqueio_ms: int = 5000):
+        self.caminho = caminho
+        self.tamanho = tamanho
+        self.espera_bloqueio_ms = espera_bloqueio_ms
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._livres: Optional[asyncio.Queue] = None
+        self._conexoes: List[sqlite3.Connection] = []
+
+    def _conectar(self) -> sqlite3.Connection:
+        # isolation_level=None: cada leitura é uma transação implícita e as escritas abrem a sua
+        conexao = sqlite3.connect(
+            self.caminho, isolation_level=None, check_same_thread=False, cached_statements=COMANDOS_PREPARADOS,
+        )
+        conexao.row_factory = sqlite3.Row
+        conexao.execute("PRAGMA journal_mode=WAL")
+        conexao.execute("PRAGMA synchronous=NORMAL")  # Seguro com WAL: só o último commit pode se perder numa queda de energia
+        conexao.execute("PRAGMA foreign_keys=ON")
+        conexao.execute(f"PRAGMA busy_timeout={int(self.espera_bloqueio_ms)}")
+        return conexao
+
+    async def abrir(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.tamanho, thread_name_prefix="sqlite")
+        self._livres = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        for _ in range(self.tamanho):
+            conexao = await loop.run_in_executor(self._executor, self._conectar)
+            self._conexoes.append(conexao)
+            self._livres.put_nowait(conexao)
+
+    # Espera as conexões voltarem ao pool (as operações em andamento terminam) antes de fechá-las
+    async def fechar(self):
+        if self._executor is None:
+            return
+        loop = asyncio.get_running_loop()
+        for _ in self._conexoes:
+            await self._livres.get()
+        for conexao in self._conexoes:
+            await loop.run_in_executor(self._executor, conexao.close)
+        self._conexoes = []
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    # Executa funcao(conexao, *args) numa conexão livre, na thread do executor.
+    # A conexão só volta ao pool quando a thread termina: se a corrotina for cancelada (cliente
+    # desconectado), o comando em andamento segue sozinho na conexão até o fim
+    async def executar(self, funcao: Callable, *args) -> Any:
+        conexao = await self._livres.get()
+        loop = asyncio.get_running_loop()
+        try:
+            futuro = self._executor.submit(funcao, conexao, *args)
+        except BaseException:
+            self._livres.put_nowait(conexao)
+            raise
+        futuro.add_done_callback(lambda _: loop.call_soon_threadsafe(self._livres.put_nowait, conexao))
+        return await asyncio.wrap_future(futuro)
+
+    # Como executar, mas dentro de uma transação de escrita
+    async def escrever(self, funcao: Callable, *args) -> Any:
+        return await self.executar(_transacao, funcao, *args)
+
+
+def _transacao(conexao: sqlite3.Connection, funcao: Callable, *args) -> Any:
+    # IMMEDIATE pega o bloqueio de escrita já no início, em vez de falhar no meio da transação
+    conexao.execute("BEGIN IMMEDIATE")
+    try:
+        resultado = funcao(conexao, *args)
+    except BaseException:
+        conexao.execute("ROLLBACK")
+        raise
+    conexao.execute("COMMIT")
+    return resultado
+
+
+# O executescript faz o próprio COMMIT, então o esquema não roda dentro de _transacao
+def _criar_esquema(conexao: sqlite3.Connection):
+    conexao.executescript(ESQUEMA)
+    resumo_novo = conexao.execute("SELECT 1 FROM sqlite_master WHERE name = 'resumo_consulta'").fetchone() is None
+    conexao.executescript(RESUMOS)
+    if resumo_novo:
+        _reconstruir_resumos(conexao)
+    colunas = {linha["name"] for linha in conexao.execute("PRAGMA table_info(medico)")}
+    for coluna in COLUNAS_BUSCA_MEDICO:
+        if coluna not in colunas:
+            conexao.execute(f"ALTER TABLE medico ADD COLUMN {coluna} VARCHAR")
+    # Completa os campos de busca dos médicos cadastrados antes deles existirem
+    atualizacoes = [
+        (*_termos(campos_busca_medico(linha["nome"], linha["especialidade"])), linha["id"])
+        for linha in conexao.execute(SQL_MEDICOS_SEM_BUSCA)
+    ]
+    conexao.executemany(SQL_PREENCHER_BUSCA, atualizacoes)
+    # Contadores: a coluna nova começa com o valor recalculado e os gatilhos a mantêm daí em diante
+    for tabela, coluna, recalculo in CONTADORES:
+        if coluna not in {linha["name"] for linha in conexao.execute(f"PRAGMA table_info({tabela})")}:
+            conexao.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} INTEGER NOT NULL DEFAULT 0")
+            conexao.execute(f"UPDATE {tabela} SET {coluna} = ({recalculo})")
+    conexao.executescript(GATILHOS_CONTADORES)
+    for tabela in TABELAS_REVISAO:
+        colunas = {linha["name"] for linha in conexao.execute(f"PRAGMA table_info({tabela})")}
+        for coluna, tipo in zip(COLUNAS_REVISAO, ("VARCHAR", "DATETIME")):
+            if coluna not in colunas:
+                conexao.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo}")
+        conexao.execute(
+            f"UPDATE {tabela} SET revisao = ?, data_atualizacao = ? WHERE revisao IS NULL", _valores_revisao(),
+        )
+    conexao.executescript(ALTERACOES)
+    conexao.executescript(TAREFAS)
+
+
+def _reconstruir_resumos(conexao: sqlite3.Connection) -> int:
+    conexao.execute("DELETE FROM resumo_consulta")
+    return conexao.execute(SQL_RECONSTRUIR_RESUMOS).rowcount
+
+
+# Corrige os contadores que divergem das tabelas; devolve quantas linhas foram corrigidas em cada um
+def _reconciliar_contadores(conexao: sqlite3.Connection) -> Dict[str, int]:
+    return {
+        f"{tabela}.{coluna}": conexao.execute(
+            f"UPDATE {tabela} SET {coluna} = ({recalculo}) WHERE {coluna} <> ({recalculo})"
+        ).rowcount
+        for tabela, coluna, recalculo in CONTADORES
+    }
+
+
+# Funções síncronas executadas nas threads do pool
+
+# Posição de partida das alterações: a última gravada ou, com token, o próprio token, se todas as
+# alterações seguintes a ele ainda estão na tabela
+def _posicao_alteracoes(conexao: sqlite3.Connection, token: Optional[str]) -> int:
+    ultima = _valor(conexao, SQL_ULTIMA_ALTERACAO, ()) or 0
+    if token is None:
+        return ultima
+    seq, primeira = _id(token), _valor(conexao, SQL_PRIMEIRA_ALTERACAO, ())
+    if seq is None or seq > ultima or (seq < ultima and (primeira is None or primeira > seq + 1)):
+        raise HistoricoPerdido(f"A alteração {token} não está mais no histórico")
+    return seq
+
+
+def _alteracoes(conexao: sqlite3.Connection, depois_de: int, limite: int) -> List[Dict[str, Any]]:
+    linhas = conexao.execute(SQL_ALTERACOES, (depois_de, limite)).fetchall()
+    # O seq não tem buracos; um salto quer dizer que a leitura ficou para trás da retenção
+    if linhas and linhas[0]["seq"] != depois_de + 1:
+        raise HistoricoPerdido(f"As alterações seguintes a {depois_de} já foram apagadas")
+    alteracoes = []
+    for linha in linhas:
+        consulta = None
+        if linha["operacao"] != "delete" and linha["medico_id"] is not None:
+            consulta = _consulta({
+                "id": str(linha["consulta_id"]), "paciente_id": str(linha["paciente_id"]),
+                "medico_id": str(linha["medico_id"]), "data_hora": _ler_data(linha["data_hora"]),
+                "status": linha["status"], "observacoes": linha["observacoes"],
+            })
+        antes = None
+        if linha["medico_anterior"] is not None:
+            antes = {"medico_id": str(linha["medico_anterior"]), "data_hora": _ler_data(linha["data_hora_anterior"])}
+        alteracoes.append({
+            "token": str(linha["seq"]), "operacao": linha["operacao"], "id": str(linha["consulta_id"]),
+            "consulta": consulta, "antes": antes,
+        })
+    return alteracoes
+
+
+def _um(conexao: sqlite3.Connection, sql: str, parametros: tuple) -> Optional[Dict[str, Any]]:
+    linha = conexao.execute(sql, parametros).fetchone()
+    return _documento(linha) if linha is not None else None
+
+
+def _todos(conexao: sqlite3.Connection, sql: str, parametros: tuple) -> List[Dict[str, Any]]:
+    return [_documento(linha) for linha in conexao.execute(sql, parametros)]
+
+
+def _campos(conexao: sqlite3.Connection, sql: str, parametros: tuple, campos: List[str]) -> List[Dict[str, Any]]:
+    return [_parcial(linha, campos) for linha in conexao.execute(sql, parametros)]
+
+
+def _valor(conexao: sqlite3.Connection, sql: str, parametros: tuple) -> Any:
+    linha = conexao.execute(sql, parametros).fetchone()
+    return linha[0] if linha is not None else None
+
+
+def _inserir_lote(conexao: sqlite3.Connection, sql: str, itens: List[Tuple[int, tuple]]) -> Tuple[List[Tuple[int, int]], Dict[int, str]]:
+    # Uma falha desfaz só o próprio INSERT; os demais itens do lote seguem na mesma transação
+    inseridos, falhas = [], {}
+    for indice, parametros in itens:
+        try:
+            inseridos.append((indice, conexao.execute(sql, parametros).lastrowid))
+        except sqlite3.DatabaseError as e:
+            falhas[indice] = str(e)
+    return inseridos, falhas
+
+
+# Um UPDATE pelo id, que com revisoes (as do If-Match) exige também uma delas; quando nada casa,
+# a existência da linha separa o id inexistente (False ou None) da revisão divergente.
+# Com sql_obter, devolve a linha já atualizada, lida na mesma transação
+def _atualizar(
+    conexao: sqlite3.Connection, tabela: str, id: int, valores: Dict[str, Any],
+    revisoes: Optional[List[str]] = None, sql_obter: Optional[str] = None,
+) -> Any:
+    condicao, parametros = "id = ?", [id]
+    if revisoes is not None:
+        condicao += f" AND revisao IN ({', '.join('?' for _ in revisoes)})"
+        parametros.extend(revisoes)
+    atribuicoes = ", ".join(f"{coluna} = ?" for coluna in valores)
+    sql = f"UPDATE {tabela} SET {atribuicoes} WHERE {condicao}"
+    if not conexao.execute(sql, (*valores.values(), *parametros)).rowcount:
+        if revisoes is not None and conexao.execute(f"SELECT 1 FROM {tabela} WHERE id = ?", (id,)).fetchone():
+            raise RevisaoDivergente(str(id))
+        return None if sql_obter else False
+    return _um(conexao, sql_obter, (id,)) if sql_obter else True
+
+
+# A consulta de antes é lida na mesma transação do UPDATE
+def _atualizar_consulta(
+    conexao: sqlite3.Connection, id: int, valores: Dict[str, Any], revisoes: Optional[List[str]],
+) -> Optional[Tuple[dict, dict]]:
+    antes = _um(conexao, SQL_OBTER_CONSULTA, (id,))
+    depois = _atualizar(conexao, "consulta", id, valores, revisoes, SQL_OBTER_CONSULTA)
+    return (antes, depois) if depois else None
+
+
+def _revisao(conexao: sqlite3.Connection, tabela: str, id: int) -> Optional[Tuple[str, datetime]]:
+    documento = _um(conexao, f"SELECT revisao, data_atualizacao FROM {tabela} WHERE id = ?", (id,))
+    return (documento["revisao"], documento["data_atualizacao"]) if documento else None
+
+
+# Remove o paciente ou o médico e, na mesma transação, as suas consultas (campo é "paciente_id" ou
+# "medico_id"): o SQLite reaproveita o maior id, e um documento criado depois herdaria as que ficassem
+def _remover(
+    conexao: sqlite3.Connection, associados: str, desassociar: str, remover: str, campo: str, id: int,
+) -> Optional[Tuple[List[str], List[Tuple[str, str]]]]:
+    ids_associados = [str(linha[0]) for linha in conexao.execute(associados, (id,))]
+    conexao.execute(desassociar, (id,))
+    if not conexao.execute(remover, (id,)).rowcount:
+        return None
+    return ids_associados, _remover_em_lote(conexao, campo, id, -1)  # LIMIT -1: todas
+
+
+def _remover_consulta(conexao: sqlite3.Connection, id: int) -> Optional[Dict[str, Any]]:
+    consulta = _um(conexao, SQL_OBTER_CONSULTA, (id,))
+    if consulta is not None:
+        conexao.execute(SQL_REMOVER_CONSULTA, (id,))
+    return consulta
+
+
+def _remover_em_lote(conexao: sqlite3.Connection, campo: str, valor: int, tamanho_lote: int) -> List[Tuple[str, str]]:
+    linhas = conexao.execute(SQL_LOTE_REMOCAO[campo], (valor, tamanho_lote)).fetchall()
+    if linhas:
+        conexao.execute(SQL_REMOVER_CONSULTAS, (json.dumps([linha["id"] for linha in linhas]),))
+    return [(str(linha["paciente_id"]), str(linha["medico_id"])) for linha in linhas]
+
+
+def _reparar_orfaos(conexao: sqlite3.Connection, reparar: bool) -> Dict[str, int]:
+    encontrados = {}
+    for tipo, tabela in TABELAS_ORFAS.items():
+        if reparar:
+            encontrados[tipo] = conexao.execute(f"DELETE FROM {tabela} WHERE {CONDICAO_ORFAS}").rowcount
+        else:
+            encontrados[tipo] = _valor(conexao, f"SELECT COUNT(*) FROM {tabela} WHERE {CONDICAO_ORFAS}", ())
+    return encontrados
+
+
+def _paciente(documento: Dict[str, Any]) -> Paciente:
+    return Paciente.model_construct(**documento)
+
+
+def _medico(documento: Dict[str, Any]) -> Medico:
+    return Medico.model_construct(**documento)
+
+
+def _consulta(documento: Dict[str, Any]) -> Consulta:
+    return Consulta.model_construct(**documento)
+
+
+def _parametros_paciente(dados: PacienteCreate) -> tuple:
+    valores = dados.dict()
+    valores["data_criacao"] = valores["data_criacao"] or datetime.utcnow()
+    return (
+        *(_data(valores[c]) if c == "data_criacao" else valores[c] for c in COLUNAS_PACIENTE), *_valores_revisao(),
+    )
+
+
+def _parametros_medico(dados: MedicoCreate) -> tuple:
+    valores = {**dados.dict(), "data_criacao": _data(datetime.utcnow())}
+    return (
+        *(valores[c] for c in COLUNAS_MEDICO), *_termos(campos_busca_medico(dados.nome, dados.especialidade)),
+        *_valores_revisao(),
+    )
+
+
+def _parametros_consulta(dados: ConsultaCreate) -> tuple:
+    return (
+        _id(dados.paciente_id), _id(dados.medico_id), _data(dados.data_hora), dados.status, dados.observacoes or "",
+        *_valores_revisao(),
+    )
+
+
+def _novo(construtor, colunas: Tuple[str, ...], parametros: tuple, id: int, **extras):
+    documento = dict(zip(colunas, parametros))
+    for campo in ("data_criacao", "data_hora", "data_atualizacao"):
+        if campo in documento:
+            documento[campo] = _ler_data(documento[campo])
+    for campo in ("paciente_id", "medico_id"):
+        if campo in documento:
+            documento[campo] = str(documento[campo])
+    return construtor({"id": str(id), **documento, **extras})
+
+
+def _novo_paciente(parametros: tuple, id: int) -> Paciente:
+    return _novo(_paciente, COLUNAS_PACIENTE + COLUNAS_REVISAO, parametros, id, consultas=[], medicos=[])
+
+
+def _novo_medico(parametros: tuple, id: int) -> Medico:
+    colunas = COLUNAS_MEDICO + COLUNAS_BUSCA_MEDICO + COLUNAS_REVISAO
+    documento = dict(zip(colunas, parametros))
+    busca = {coluna: documento.pop(coluna).split() for coluna in COLUNAS_BUSCA_MEDICO}
+    return _novo(_medico, tuple(documento), tuple(documento.values()), id, consultas=[], pacientes=[], **busca)
+
+
+def _novo_consulta(parametros: tuple, id: int) -> Consulta:
+    return _novo(_consulta, COLUNAS_CONSULTA + COLUNAS_REVISAO, parametros, id)
+
+
+async def _criar_lote(pool: PoolSQLite, sql: str, validos: list, parametros: Callable, novo: Callable, erros: Dict[int, str]) -> list:
+    if not validos:
+        return []
+    itens = [(indice, parametros(dados)) for indice, dados in validos]
+    inseridos, falhas = await pool.escrever(_inserir_lote, sql, itens)
+    erros.update(falhas)
+    parametros_por_indice = dict(itens)
+    return [(indice, novo(parametros_por_indice[indice], id)) for indice, id in inseridos]
+
+
+class RepositorioPacientesSQLite(RepositorioPacientes):
+    def __init__(self, pool: PoolSQLite):
+        self.pool = pool
+
+    async def criar(self, dados: PacienteCreate) -> Paciente:
+        parametros = _parametros_paciente(dados)
+        id = await self.pool.escrever(lambda conexao: conexao.execute(SQL_INSERIR_PACIENTE, parametros).lastrowid)
+        return _novo_paciente(parametros, id)
+
+    async def criar_lote(self, validos, erros):
+        return await _criar_lote(self.pool, SQL_INSERIR_PACIENTE, validos, _parametros_paciente, _novo_paciente, erros)
+
+    async def obter(self, id: str) -> Optional[Paciente]:
+        documento = await self.pool.executar(_um, SQL_OBTER_PACIENTE, (_id(id),))
+        return _paciente(documento) if documento else None
+
+    async def obter_sem_listas(self, id: str) -> Optional[PacienteSemListas]:
+        documento = await self.pool.executar(_um, SQL_OBTER_PACIENTE_SEM_LISTAS, (_id(id),))
+        return PacienteSemListas.model_construct(**documento) if documento else None
+
+    async def obter_campos(self, id, campos):
+        sql = f"SELECT {_colunas_campos(campos)} FROM paciente WHERE id = ?"
+        documentos = await self.pool.executar(_campos, sql, (_id(id),), campos)
+        return documentos[0] if documentos else None
+
+    async def listar(self, skip, limit, depois_de=None, campos=None):
+        parametros = (_id(depois_de) if depois_de is not None else -1, limit, skip)
+        if campos:
+            sql = f"SELECT {_colunas_campos(campos)} FROM paciente WHERE id > ? ORDER BY id LIMIT ? OFFSET ?"
+            return await self.pool.executar(_campos, sql, parametros, campos)
+        documentos = await self.pool.executar(_todos, SQL_LISTAR_PACIENTES, parametros)
+        return [PacienteResumo.model_construct(**documento) for documento in documentos]
+
+    async def atualizar(self, id: str, dados: PacienteCreate, revisoes=None) -> Optional[Paciente]:
+        valores = {
+            coluna: _data(valor) if coluna == "data_criacao" else valor
+            for coluna, valor in dados.dict(exclude_unset=True).items()
+            if coluna in COLUNAS_PACIENTE and not (coluna == "data_criacao" and valor is None)
+        }
+        valores.update(zip(COLUNAS_REVISAO, _valores_revisao()))
+        documento = await self.pool.escrever(_atualizar, "paciente", _id(id), valores, revisoes, SQL_OBTER_PACIENTE)
+        return _paciente(documento) if documento else None
+
+    async def remover(self, id: str) -> Optional[Tuple[List[str], List[Tuple[str, str]]]]:
+        return await self.pool.escrever(
+            _remover, SQL_MEDICOS_ASSOCIADOS, SQL_DESASSOCIAR_PACIENTE, SQL_REMOVER_PACIENTE, "paciente_id", _id(id),
+        )
+
+    # Anti-join com NOT EXISTS, que para na primeira consulta pelo índice de paciente_id
+    async def listar_sem_consultas(self, skip, limit):
+        documentos = await self.pool.executar(_todos, SQL_PACIENTES_SEM_CONSULTAS, (limit, skip))
+        return [_paciente(documento) for documento in documentos]
+
+    async def listar_do_medico(self, medico_id):
+        documentos = await self.pool.executar(_todos, SQL_PACIENTES_DO_MEDICO, (_id(medico_id),))
+        return [PacienteNome.model_construct(**documento) for documento in documentos]
+
+    async def nomes(self, ids):
+        documentos = await self.pool.executar(_todos, SQL_NOMES_PACIENTES, (_ids(ids),))
+        return {documento["id"]: documento["nome"] for documento in documentos}
+
+    async def existentes(self, ids):
+        documentos = await self.pool.executar(_todos, SQL_PACIENTES_EXISTENTES, (_ids(ids),))
+        return {documento["id"] for documento in documentos}
+
+    async def total_consultas(self, id):
+        return await self.pool.executar(_valor, SQL_TOTAL_CONSULTAS_PACIENTE, (_id(id),))
+
+    async def revisao(self, id):
+        return await self.pool.executar(_revisao, "paciente", _id(id))
+
+
+class RepositorioMedicosSQLite(RepositorioMedicos):
+    def __init__(self, pool: PoolSQLite):
+        self.pool = pool
+
+    async def criar(self, dados: MedicoCreate) -> Medico:
+        parametros = _parametros_medico(dados)
+        id = await self.pool.escrever(lambda conexao: conexao.execute(SQL_INSERIR_MEDICO, parametros).lastrowid)
+        return _novo_medico(parametros, id)
+
+    async def criar_lote(self, validos, erros):
+        return await _criar_lote(self.pool, SQL_INSERIR_MEDICO, validos, _parametros_medico, _novo_medico, erros)
+
+    async def obter(self, id: str) -> Optional[Medico]:
+        documento = await self.pool.executar(_um, SQL_OBTER_MEDICO, (_id(id),))
+        return _medico(documento) if documento else None
+
+    async def obter_sem_listas(self, id: str) -> Optional[MedicoSemListas]:
+        documento = await self.pool.executar(_um, SQL_OBTER_MEDICO_SEM_LISTAS, (_id(id),))
+        return MedicoSemListas.model_construct(**documento) if documento else None
+
+    async def obter_campos(self, id, campos):
+        sql = f"SELECT {_colunas_campos(campos)} FROM medico WHERE id = ?"
+        documentos = await self.pool.executar(_campos, sql, (_id(id),), campos)
+        return documentos[0] if documentos else None
+
+    async def listar(self, skip, limit, depois_de=None, campos=None, especialidade=None):
+        condicoes, parametros = ["id > ?"], [_id(depois_de) if depois_de is not None else -1]
+        if especialidade is not None:
+            busca, termos = _condicoes_busca("especialidade_busca", especialidade)
+            condicoes += busca
+            parametros += termos
+        colunas = _colunas_campos(campos) if campos else RESUMO_MEDICO
+        sql = f"SELECT {colunas} FROM medico WHERE {' AND '.join(condicoes)} ORDER BY id LIMIT ? OFFSET ?"
+        parametros = (*parametros, limit, skip)
+        if campos:
+            return await self.pool.executar(_campos, sql, parametros, campos)
+        documentos = await self.pool.executar(_todos, sql, parametros)
+        return [MedicoResumo.model_construct(**documento) for documento in documentos]
+
+    # Um nome em branco não tem termos, e a busca sem condições traria todos os médicos
+    async def buscar_por_nome(self, nome):
+        condicoes, parametros = _condicoes_busca("m.nome_busca", nome)
+        if not condicoes:
+            return []
+        filtro = f" WHERE {' AND '.join(condicoes)}"
+        documentos = await self.pool.executar(_todos, MEDICO_COMPLETO + filtro + " ORDER BY m.id", tuple(parametros))
+        return [_medico(documento) for documento in documentos]
+
+    async def atualizar(self, id: str, dados: MedicoCreate, revisoes=None) -> Optional[Medico]:
+        valores = {
+            coluna: valor for coluna, valor in dados.dict(exclude_unset=True).items() if coluna in COLUNAS_MEDICO
+        }
+        # Os campos de busca acompanham nome e especialidade
+        valores.update(zip(COLUNAS_BUSCA_MEDICO, _termos(campos_busca_medico(dados.nome, dados.especialidade))))
+        valores.update(zip(COLUNAS_REVISAO, _valores_revisao()))
+        documento = await self.pool.escrever(_atualizar, "medico", _id(id), valores, revisoes, SQL_OBTER_MEDICO)
+        return _medico(documento) if documento else None
+
+    async def remover(self, id: str) -> Optional[Tuple[List[str], List[Tuple[str, str]]]]:
+        return await self.pool.escrever(
+            _remover, SQL_PACIENTES_ASSOCIADOS, SQL_DESASSOCIAR_MEDICO, SQL_REMOVER_MEDICO, "medico_id", _id(id),
+        )
+
+    async def associar_paciente(self, paciente_id, medico_id):
+        await self.pool.escrever(lambda conexao: conexao.execute(SQL_ASSOCIAR, (_id(paciente_id), _id(medico_id))))
+
+    async def existentes(self, ids):
+        documentos = await self.pool.executar(_todos, SQL_MEDICOS_EXISTENTES, (_ids(ids),))
+        return {documento["id"] for documento in documentos}
+
+    async def total_pacientes(self, id):
+        return await self.pool.executar(_valor, SQL_TOTAL_PACIENTES_MEDICO, (_id(id),))
+
+    async def revisao(self, id):
+        return await self.pool.executar(_revisao, "medico", _id(id))
+
+
+# Filtro das listagens de consultas: igualdade nas colunas, período e continuação do cursor
+def _filtro_consultas(
+    filtro: Dict[str, str], depois_de: Optional[Tuple[datetime, str]], inicio: Optional[datetime], fim: Optional[datetime],
+) -> Tuple[str, list]:
+    condicoes, parametros = [], []
+    for coluna in ("paciente_id", "medico_id", "status"):
+        if coluna in filtro:
+            condicoes.append(f"{coluna} = ?")
+            parametros.append(filtro[coluna] if coluna == "status" else _id(filtro[coluna]))
+    if inicio is not None:
+        condicoes.append("data_hora >= ?")
+        parametros.append(_data(inicio))
+    if fim is not None:
+        condicoes.append("data_hora <= ?")
+        parametros.append(_data(fim))
+    if depois_de is not None:
+        # Comparação por valor de linha, que o SQLite resolve pelo índice (..., data_hora, id)
+        condicoes.append("(data_hora, id) > (?, ?)")
+        parametros += [_data(depois_de[0]), _id(depois_de[1])]
+    return (f" WHERE {' AND '.join(condicoes)}" if condicoes else ""), parametros
+
+
+def _resumo(documento: Optional[Dict[str, Any]]) -> Optional[dict]:
+    if not documento or not documento["quantidade"]:
+        return None
+    return {
+        "primeira": _ler_data(documento["primeira"]),
+        "ultima": _ler_data(documento["ultima"]),
+        "quantidade": documento["quantidade"],
+    }
+
+
+def _linhas_resumo(conexao: sqlite3.Connection, sql: str, parametros: tuple) -> List[Tuple[str, Optional[dict]]]:
+    return [(str(linha["id"]), _resumo(dict(linha))) for linha in conexao.execute(sql, parametros)]
+
+
+class RepositorioConsultasSQLite(RepositorioConsultas):
+    def __init__(self, pool: PoolSQLite):
+        self.pool = pool
+
+    async def criar(self, dados: ConsultaCreate) -> Consulta:
+        parametros = _parametros_consulta(dados)
+        id = await self.pool.escrever(lambda conexao: conexao.execute(SQL_INSERIR_CONSULTA, parametros).lastrowid)
+        return _novo_consulta(parametros, id)
+
+    async def criar_lote(self, validos, erros):
+        return await _criar_lote(self.pool, SQL_INSERIR_CONSULTA, validos, _parametros_consulta, _novo_consulta, erros)
+
+    async def obter(self, id: str) -> Optional[Consulta]:
+        documento = await self.pool.executar(_um, SQL_OBTER_CONSULTA, (_id(id),))
+        return _consulta(documento) if documento else None
+
+    async def atualizar(self, id: str, dados: ConsultaCreate, revisoes=None) -> Optional[Tuple[Consulta, Consulta]]:
+        valores = dict(zip(COLUNAS_CONSULTA, _parametros_consulta(dados)))
+        definidos = dados.dict(exclude_unset=True)
+        valores = {coluna: valor for coluna, valor in valores.items() if coluna in definidos}
+        valores.update(zip(COLUNAS_REVISAO, _valores_revisao()))
+        documentos = await self.pool.escrever(_atualizar_consulta, _id(id), valores, revisoes)
+        return (_consulta(documentos[0]), _consulta(documentos[1])) if documentos else None
+
+    async def revisao(self, id):
+        return await self.pool.executar(_revisao, "consulta", _id(id))
+
+    async def remover(self, id: str) -> Optional[Consulta]:
+        documento = await self.pool.escrever(_remover_consulta, _id(id))
+        return _consulta(documento) if documento else None
+
+    # Cada lote é uma transação; os gatilhos acertam contadores, resumo e alterações
+    async def remover_em_lote(self, campo, valor, tamanho_lote):
+        return await self.pool.escrever(_remover_em_lote, campo, _id(valor), tamanho_lote)
+
+    async def listar(self, filtro, skip, limit, depois_de=None, inicio=None, fim=None):
+        where, parametros = _filtro_consultas(filtro, depois_de, inicio, fim)
+        sql = f"SELECT {CONSULTA} FROM consulta{where} ORDER BY data_hora, id LIMIT ? OFFSET ?"
+        documentos = await self.pool.executar(_todos, sql, (*parametros, limit, skip))
+        return [_consulta(documento) for documento in documentos]
+
+    # O SQLite não guarda uma estimativa do total, então a contagem é sempre exata
+    async def contar(self, filtro, estimado=False):
+        where, parametros = _filtro_consultas(filtro, None, None, None)
+        return await self.pool.executar(_valor, f"SELECT COUNT(*) FROM consulta{where}", tuple(parametros))
+
+    async def listar_periodo(self, inicio, fim):
+        documentos = await self.pool.executar(_todos, SQL_CONSULTAS_PERIODO, (_data(inicio), _data(fim)))
+        return [_consulta(documento) for documento in documentos]
+
+    async def contar_periodo(self, inicio, fim):
+        return await self.pool.executar(_valor, SQL_CONTAR_PERIODO, (_data(inicio), _data(fim)))
+
+    # Lê o período em lotes pela chave (data_hora, id), sem manter um cursor aberto entre as threads
+    async def iterar_periodo(self, inicio, fim, tamanho_lote) -> AsyncIterator[dict]:
+        chave = ("", -1)
+        while True:
+            documentos = await self.pool.executar(
+                _todos, SQL_LOTE_PERIODO, (_data(inicio), _data(fim), *chave, tamanho_lote)
+            )
+            for documento in documentos:
+                yield {"_id": documento["id"], **{campo: valor for campo, valor in documento.items() if campo != "id"}}
+            if len(documentos) < tamanho_lote:
+                return
+            ultimo = documentos[-1]
+            chave = (_data(ultimo["data_hora"]), _id(ultimo["id"]))
+
+    async def conflito(self, medico_id, apos, antes, ignorar_id=None):
+        documento = await self.pool.executar(
+            _um, SQL_CONFLITO,
+            (_id(medico_id), _data(apos), _data(antes), _id(ignorar_id) or -1, *STATUS_SEM_HORARIO),
+        )
+        return _consulta(documento) if documento else None
+
+    # Lotes pela chave (data_hora, id), como em iterar_periodo
+    async def horarios_ocupados(self, medico_id, inicio, fim, tamanho_lote) -> AsyncIterator[datetime]:
+        chave = ("", -1)
+        while True:
+            linhas = await self.pool.executar(
+                _todos, SQL_LOTE_OCUPADOS,
+                (_id(medico_id), _data(inicio), _data(fim), *chave, *STATUS_SEM_HORARIO, tamanho_lote),
+            )
+            for linha in linhas:
+                yield linha["data_hora"]
+            if len(linhas) < tamanho_lote:
+                return
+            chave = (_data(linhas[-1]["data_hora"]), _id(linhas[-1]["id"]))
+
+    # Soma as linhas do resumo pelo índice de dia (ou de médico), com a especialidade do médico
+    async def somar_resumos(self, inicio, fim, chaves, medico_id=None):
+        colunas = ", ".join(f"{COLUNAS_RESUMO[chave]} AS {chave}" for chave in chaves)
+        grupo = ", ".join(COLUNAS_RESUMO[chave] for chave in chaves)
+        sql = f"SELECT {colunas}, SUM(r.quantidade) AS quantidade FROM resumo_consulta r"
+        if "especialidade" in chaves:
+            sql += " LEFT JOIN medico m ON m.id = r.medico_id"
+        sql += " WHERE r.dia BETWEEN ? AND ?"
+        parametros = [inicio.isoformat(), fim.isoformat()]
+        if medico_id is not None:
+            sql += " AND r.medico_id = ?"
+            parametros.append(_id(medico_id))
+        sql += f" GROUP BY {grupo} HAVING SUM(r.quantidade) <> 0 ORDER BY {grupo}"
+        linhas = await self.pool.executar(_todos, sql, tuple(parametros))
+        for linha in linhas:
+            if "dia" in linha:
+                linha["dia"] = date.fromisoformat(linha["dia"])
+        return linhas
+
+    # Lê a tabela de alterações em lotes a partir do seq; sem alterações novas, espera
+    # INTERVALO_ALTERACOES antes da próxima leitura
+    async def observar(self, token=None) -> AsyncIterator[dict]:
+        seq = await self.pool.executar(_posicao_alteracoes, token)
+        yield {"operacao": "aberto", "token": str(seq)}
+        while True:
+            alteracoes = await self.pool.executar(_alteracoes, seq, TAMANHO_LOTE_ALTERACOES)
+            for alteracao in alteracoes:
+                yield alteracao
+            if alteracoes:
+                seq = int(alteracoes[-1]["token"])
+            if len(alteracoes) < TAMANHO_LOTE_ALTERACOES:
+                await asyncio.sleep(INTERVALO_ALTERACOES)
+
+    async def resumo_do_paciente(self, paciente_id):
+        return _resumo(await self.pool.executar(_um, SQL_RESUMO_PACIENTE, (_id(paciente_id),)))
+
+    async def resumos_de_pacientes(self, paciente_ids):
+        return await self.pool.executar(_linhas_resumo, SQL_RESUMOS_PACIENTES, (_ids(paciente_ids),))
+
+    async def resumos_dos_pacientes_do_medico(self, medico_id):
+        return await self.pool.executar(_linhas_resumo, SQL_RESUMOS_PACIENTES_DO_MEDICO, (_id(medico_id),))
+
+
+class RepositorioTarefasSQLite(RepositorioTarefas):
+    def __init__(self, pool: PoolSQLite):
+        self.pool = pool
+
+    async def criar(self, tipo, alvo_id, status=TAREFA_PENDENTE, consultas_removidas=0):
+        agora = datetime.utcnow()
+        parametros = (tipo, alvo_id, status, consultas_removidas, _data(agora), _data(agora))
+        id = await self.pool.escrever(lambda conexao: conexao.execute(SQL_INSERIR_TAREFA, parametros).lastrowid)
+        return Tarefa.model_construct(
+            id=str(id), tipo=tipo, alvo_id=alvo_id, status=status, consultas_removidas=consultas_removidas,
+            criada_em=agora, atualizada_em=agora, erro=None,
+        )
+
+    async def obter(self, id):
+        documento = await self.pool.executar(_um, SQL_OBTER_TAREFA, (_id(id),))
+        return Tarefa.model_construct(**documento) if documento else None
+
+    async def atualizar(self, id, **campos):
+        await self.pool.escrever(_atualizar, "tarefa", _id(id), {**campos, "atualizada_em": _data(datetime.utcnow())})
+
+    async def inacabadas(self):
+        documentos = await self.pool.executar(_todos, SQL_TAREFAS_INACABADAS, tuple(STATUS_TAREFA_INACABADA))
+        return [Tarefa.model_construct(**documento) for documento in documentos]
+
+    async def reivindicar(self, id, atualizada_em):
+        parametros = (
+            TAREFA_EXECUTANDO, _data(data_reivindicacao(atualizada_em)), _id(id), _data(atualizada_em),
+            *STATUS_TAREFA_INACABADA,
+        )
+        return await self.pool.escrever(lambda conexao: conexao.execute(SQL_REIVINDICAR_TAREFA, parametros).rowcount > 0)
+
+
+def _revisao_documento(documento: Dict[str, Any]) -> tuple:
+    return (documento["revisao"], _data(documento["data_atualizacao"]))
+
+
+# Carga em massa dos documentos da base sintética, com os IDs informados
+# Os contadores saem das tabelas: o paciente conta as consultas já gravadas (as gravadas depois
+# passam pelo gatilho) e o médico conta as associações pelo gatilho de pacientemedico
+def _inserir_documentos(conexao: sqlite3.Connection, colecao: str, documentos: List[Dict[str, Any]]):
+    if colecao == "pacientes":
+        conexao.executemany(
+            f"INSERT INTO paciente (id, {', '.join(COLUNAS_PACIENTE + COLUNAS_REVISAO)}, total_consultas)"
+            f" VALUES (?, {', '.join('?' * len(COLUNAS_PACIENTE + COLUNAS_REVISAO))},"
+            " (SELECT COUNT(*) FROM consulta WHERE paciente_id = ?))",
+            [
+                (int(d["_id"]), *(_data(d[c]) if c == "data_criacao" else d.get(c) for c in COLUNAS_PACIENTE),
+                 *_revisao_documento(d), int(d["_id"]))
+                for d in documentos
+            ],
+        )
+    elif colecao == "medicos":
+        conexao.executemany(
+            f"INSERT INTO medico (id, {', '.join(COLUNAS_MEDICO + COLUNAS_BUSCA_MEDICO + COLUNAS_REVISAO)})"
+            f" VALUES (?, {', '.join('?' * len(COLUNAS_MEDICO + COLUNAS_BUSCA_MEDICO + COLUNAS_REVISAO))})",
+            [
+                (int(d["_id"]), *(_data(d[c]) if c == "data_criacao" else d[c] for c in COLUNAS_MEDICO),
+                 *_termos(campos_busca_medico(d["nome"], d["especialidade"])), *_revisao_documento(d))
+                for d in documentos
+            ],
+        )
+        # A associação fica só em pacientemedico (a lista "medicos" dos pacientes é a mesma relação)
+        conexao.executemany(
+            SQL_ASSOCIAR, [(int(paciente), int(d["_id"])) for d in documentos for paciente in d.get("pacientes", [])]
+        )
+    elif colecao == "consultas":
+        conexao.executemany(
+            f"INSERT INTO consulta (id, {', '.join(COLUNAS_CONSULTA + COLUNAS_REVISAO)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (int(d["_id"]), int(d["paciente_id"]), int(d["medico_id"]), _data(d["data_hora"]), d["status"],
+                 d.get("observacoes") or "", *_revisao_documento(d))
+                for d in documentos
+            ],
+        )
+    else:
+        raise ValueError(f"Coleção desconhecida: {colecao}")
+
+
+# Pacientes e resumo saem antes das consultas, para os gatilhos de remoção não terem o que atualizar
+def _limpar(conexao: sqlite3.Connection):
+    for tabela in ("pacientemedico", "paciente", "medico", "resumo_consulta", "consulta", "tarefa"):
+        conexao.execute(f"DELETE FROM {tabela}")
+
+
+class RepositorioSQLite(Repositorio):
+    exclusao_imediata = True
+    reaproveita_ids = True
+
+    def __init__(self, caminho: str = "database.db", tamanho_pool: int = 4):
+        self.pool = PoolSQLite(caminho, tamanho_pool)
+        self.pacientes = RepositorioPacientesSQLite(self.pool)
+        self.medicos = RepositorioMedicosSQLite(self.pool)
+        self.consultas = RepositorioConsultasSQLite(self.pool)
+        self.tarefas = RepositorioTarefasSQLite(self.pool)
+
+    # Abre o pool e cria as tabelas, os índices e as colunas de busca que faltarem
+    async def iniciar(self):
+        await self.pool.abrir()
+        await self.pool.executar(_criar_esquema)
+
+    async def fechar(self):
+        await self.pool.fechar()
+
+    async def inserir_documentos(self, colecao, documentos):
+        if documentos:
+            await self.pool.escrever(_inserir_documentos, colecao, documentos)
+
+    async def limpar(self):
+        await self.pool.escrever(_limpar)
+
+    # Na mesma transação de escrita, então nenhum gatilho roda entre a contagem e a correção
+    async def reconciliar_contadores(self):
+        return await self.pool.escrever(_reconciliar_contadores)
+
+    async def reconstruir_resumos(self):
+        return await self.pool.escrever(_reconstruir_resumos)
+
+    # Numa única transação; as consultas removidas passam pelos gatilhos como numa remoção comum
+    async def reparar_orfaos(self, reparar=False):
+        return await self.pool.escrever(_reparar_orfaos, reparar)
@@ -0,0 +1,82 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Awaitable, Callable, List, Optional, Tuple
+from fastapi import Response
+
+# Requisições condicionais nas leituras de paciente, médico e consulta pelo ID.
+# O ETag é a revisão do documento, trocada a cada atualização (ver services/repositorios/base.py),
+# e o Last-Modified é a data dessa atualização. Com If-None-Match (ou só If-Modified-Since), a rota
+# lê apenas a revisão pela chave primária e, se o cliente já tem a versão atual, responde 304 sem
+# carregar nem serializar o documento. As leituras com ?fields= saem sem esses cabeçalhos.
+# Nas atualizações, o If-Match vira a condição da própria escrita: a revisão gravada precisa ser
+# uma das enviadas, senão a resposta é 412 e a escrita de outro cliente não é sobrescrita.
+
+# (revisao, data_atualizacao) como devolvido por revisao() dos repositórios
+Revisao = Tuple[Optional[str], Optional[datetime]]
+
+
+def etag(revisao: str) -> str:
+    return f'"{revisao}"'
+
+
+def _utc(valor: datetime) -> datetime:
+    return valor.replace(tzinfo=timezone.utc) if valor.tzinfo is None else valor.astimezone(timezone.utc)
+
+
+# ETag e Last-Modified da resposta (documentos gravados sem revisão saem sem eles)
+def definir_validadores(resposta: Response, revisao: Optional[str], data_atualizacao: Optional[datetime]):
+    if revisao:
+        resposta.headers["ETag"] = etag(revisao)
+    if data_atualizacao:
+        resposta.headers["Last-Modified"] = format_datetime(_utc(data_atualizacao), usegmt=True)
+
+
+# Comparação fraca do If-None-Match: "*" ou uma lista de ETags, com W/"..." valendo como "..."
+def _etag_confere(if_none_match: str, revisao: Optional[str]) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    return revisao is not None and any(
+        item.strip().removeprefix("W/") == etag(revisao) for item in if_none_match.split(",")
+    )
+
+
+# O Last-Modified tem precisão de segundos, então a comparação também
+def _nao_modificado_desde(if_modified_since: str, data_atualizacao: Optional[datetime]) -> bool:
+    try:
+        desde = _utc(parsedate_to_datetime(if_modified_since))
+    except (TypeError, ValueError):
+        return False  # Data inválida: o cabeçalho é ignorado
+    return data_atualizacao is not None and _utc(data_atualizacao).replace(microsecond=0) <= desde
+
+
+# Resposta 304 quando a versão do cliente é a atual, ou None para a rota seguir com a leitura normal
+# (sem cabeçalho condicional, documento inexistente ou revisão diferente).
+# Com If-None-Match, o If-Modified-Since é ignorado, como manda o HTTP
+async def resposta_nao_modificada(
+    obter_revisao: Callable[[], Awaitable[Optional[Revisao]]],
+    if_none_match: Optional[str],
+    if_modified_since: Optional[str],
+) -> Optional[Response]:
+    if not if_none_match and not if_modified_since:
+        return None
+    atual = await obter_revisao()
+    if atual is None:
+        return None
+    revisao, data_atualizacao = atual
+    if if_none_match:
+        if not _etag_confere(if_none_match, revisao):
+            return None
+    elif not _nao_modificado_desde(if_modified_since, data_atualizacao):
+        return None
+    resposta = Response(status_code=304)
+    definir_validadores(resposta, revisao, data_atualizacao)
+    return resposta
+
+
+# Revisões aceitas pelo If-Match, para o atualizar() dos repositórios; None sem condição
+# (cabeçalho ausente ou "*"). A comparação é forte: um W/"..." nunca confere
+def revisoes_esperadas(if_match: Optional[str]) -> Optional[List[str]]:
+    if not if_match or if_match.strip() == "*":
+        return None
+    itens = (item.strip() for item in if_match.split(","))
+    return [item[1:-1] for item in itens if len(item) >= 2 and item.startswith('"') and item.endswith('"')]
@@ -0,0 +1,66 @@
+import os
+from typing import Any, Dict, Iterable, Optional, Type
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+from models.consultas import Consulta, ConsultaResponse
+from models.medicos import MedicoRetorno
+from models.paciente import PacienteRetorno
+
+# Caminho rápido de serialização das respostas (opcional, ligado com RESPOSTA_RAPIDA=1).
+# Pelo caminho normal, o FastAPI valida de novo cada documento contra o response_model,
+# converte para dicionário e só então gera o JSON. Aqui o serializador (em Rust) do próprio
+# documento gera os bytes de uma vez, restrito aos campos do modelo de resposta,
+# com o mesmo JSON que o caminho normal produziria.
+
+RESPOSTA_RAPIDA = os.getenv("RESPOSTA_RAPIDA", "").strip().lower() in ("1", "true", "sim", "yes", "on")
+
+
+class RespostaRapida(Response):
+    media_type = "application/json"
+
+
+class SerializadorResposta:
+    def __init__(self, modelo: Type[BaseModel]):
+        self.modelo = modelo
+        self.campos = set(modelo.model_fields)
+        self._ordem = list(modelo.model_fields)
+        self._sem_alias = all(campo.alias in (None, nome) for nome, campo in modelo.model_fields.items())
+        self._adaptador = TypeAdapter(modelo)
+        self._compativeis: Dict[type, bool] = {}
+
+    # Um documento de outra classe pode usar o próprio serializador quando tem os campos
+    # do modelo de resposta na mesma ordem e o modelo de resposta não usa alias
+    def _compativel(self, tipo: type) -> bool:
+        if tipo not in self._compativeis:
+            ordem = [nome for nome in tipo.model_fields if nome in self.campos]
+            self._compativeis[tipo] = self._sem_alias and ordem == self._ordem
+        return self._compativeis[tipo]
+
+    def para_json(self, objeto: Any) -> bytes:
+        tipo = type(objeto)
+        if tipo is self.modelo:
+            return objeto.__pydantic_serializer__.to_json(objeto, by_alias=True)
+        if isinstance(objeto, BaseModel) and self._compativel(tipo):
+            return objeto.__pydantic_serializer__.to_json(objeto, by_alias=False, include=self.campos)
+        # Qualquer outro caso segue o mesmo caminho do FastAPI: valida e serializa pelo modelo de resposta
+        validado = self._adaptador.validate_python(objeto, from_attributes=True)
+        return self._adaptador.dump_json(validado, by_alias=True)
+
+    def lista_json(self, itens: Iterable[Any]) -> bytes:
+        return b"[" + b",".join(self.para_json(item) for item in itens) + b"]"
+
+
+serializador_medico = SerializadorResposta(MedicoRetorno)
+serializador_paciente = SerializadorResposta(PacienteRetorno)
+serializador_consulta = SerializadorResposta(Consulta)
+serializador_pagina_consultas = SerializadorResposta(ConsultaResponse)
+
+
+# Resposta já serializada, ou None quando o caminho rápido está desligado
+# (aí a rota devolve os documentos e o FastAPI serializa pelo response_model)
+def resposta_rapida(serializador: SerializadorResposta, conteudo: Any) -> Optional[RespostaRapida]:
+    if not RESPOSTA_RAPIDA:
+        return None
+    if isinstance(conteudo, list):
+        return RespostaRapida(serializador.lista_json(conteudo))
+    return RespostaRapida(serializador.para_json(conteudo))
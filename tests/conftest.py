@@ -0,0 +1,66 @@
+import os
+import pytest
+from contextlib import AsyncExitStack, asynccontextmanager
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import ServerSelectionTimeoutError
+from database.database import init_database
+from services.cache import cache_medicos, cache_pacientes
+from services.exclusoes import aguardar_exclusoes
+from services.repositorios import RepositorioMongo, RepositorioSQLite, definir_repositorio, repositorio
+
+# Os testes de integração usam um banco separado, apagado ao final de cada teste
+MONGO_URL_TESTES = os.getenv("MONGO_URL_TESTES", "mongodb://localhost:27017")
+DB_NAME_TESTES = "banco_testes"
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+# Banco de testes do MongoDB com o Beanie inicializado (pula o teste sem servidor)
+@asynccontextmanager
+async def banco_mongo():
+    client = AsyncIOMotorClient(MONGO_URL_TESTES, serverSelectionTimeoutMS=1000)
+    try:
+        await client.admin.command("ping")
+    except ServerSelectionTimeoutError:
+        client.close()
+        pytest.skip("MongoDB não está disponível em " + MONGO_URL_TESTES)
+
+    banco = client[DB_NAME_TESTES]
+    await init_database(banco)
+    cache_medicos.limpar()
+    cache_pacientes.limpar()
+    try:
+        yield banco
+    finally:
+        await client.drop_database(DB_NAME_TESTES)
+        client.close()
+
+
+@pytest.fixture
+async def banco(anyio_backend):
+    async with banco_mongo() as banco:
+        yield banco
+
+
+# Os testes que passam só pelos services e pela API rodam nos dois backends:
+# no MongoDB (pulado sem servidor) e num arquivo SQLite temporário
+@pytest.fixture(params=["mongo", "sqlite"])
+async def backend(request, anyio_backend, tmp_path):
+    anterior = repositorio()
+    async with AsyncExitStack() as pilha:
+        if request.param == "mongo":
+            await pilha.enter_async_context(banco_mongo())
+            ativo = RepositorioMongo()
+        else:
+            ativo = RepositorioSQLite(str(tmp_path / "testes.db"))
+            await ativo.iniciar()
+            pilha.push_async_callback(ativo.fechar)
+        definir_repositorio(ativo)
+        pilha.callback(definir_repositorio, anterior)
+        pilha.push_async_callback(aguardar_exclusoes)  # Exclusões em segundo plano terminam antes de fechar o banco
+        cache_medicos.limpar()
+        cache_pacientes.limpar()
+        yield ativo
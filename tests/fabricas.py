@@ -0,0 +1,26 @@
+from datetime import datetime
+from models.consultas import ConsultaCreate
+from models.medicos import Medico, MedicoCreate
+from models.paciente import Paciente, PacienteCreate
+from services.medicos import criar_medico_db
+from services.paciente import criar_paciente_db
+
+# Pacientes, médicos e consultas dos testes, criados pelos services no repositório ativo
+
+
+async def criar_paciente(nome: str = "João Silva") -> Paciente:
+    return await criar_paciente_db(PacienteCreate(
+        nome=nome, telefone="999999999", email="joao.silva@email.com", sexo="M",
+        peso=70.0, altura=1.75, problemas_de_saude="", data_criacao=datetime(2024, 1, 1),
+    ))
+
+
+async def criar_medico(nome: str = "Maria Souza", especialidade: str = "Cardiologia") -> Medico:
+    return await criar_medico_db(MedicoCreate(
+        nome=nome, especialidade=especialidade, crm="12345-CE",
+        email="medico@email.com", telefone="888888888",
+    ))
+
+
+def nova_consulta(paciente: Paciente, medico: Medico, data_hora: datetime, status: str = "Agendada") -> ConsultaCreate:
+    return ConsultaCreate(paciente_id=paciente.id, medico_id=medico.id, data_hora=data_hora, status=status)
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import main
+import pytest
+from datetime import date, datetime
+from models.consultas import Consulta
+from services.agenda_ao_vivo import DifusorConsultas, agenda_ao_vivo, difusor_consultas
+from services.consultas import adicionar_consulta_db, atualizar_consulta_db, excluir_consulta_db
+from services.repositorios import HistoricoPerdido, RepositorioMongo, RepositorioSQLite
+from fabricas import criar_medico, criar_paciente, nova_consulta
+
+pytestmark = pytest.mark.anyio
+
+DIA = date(2024, 6, 3)
+
+
+# O change stream do MongoDB exige replica set (um nó só basta: mongod --replSet rs0 e rs.initiate())
+async def exigir_fluxo(backend):
+    if isinstance(backend, RepositorioMongo):
+        hello = await Consulta.get_motor_collection().database.command("hello")
+        if "setName" not in hello:
+            pytest.skip("O MongoDB de testes não é um replica set")
+
+
+# Próximo evento do fluxo SSE como {"id", "event", "data"}, pulando o retry
+async def proximo(eventos) -> dict:
+    while True:
+        bruto = await asyncio.wait_for(eventos.__anext__(), 5)
+        campos = dict(linha.split(": ", 1) for linha in bruto.strip().split("\n"))
+        if "event" in campos:
+            campos["data"] = json.loads(campos["data"])
+            return campos
+
+
+# (tipo, id da consulta) do próximo evento
+async def resumo(eventos) -> tuple:
+    evento = await proximo(eventos)
+    return evento["event"], evento["data"].get("_id", evento["data"].get("id"))
+
+
+def ids_do_retrato(evento: dict) -> list:
+    assert evento["event"] == "retrato"
+    return [consulta["_id"] for consulta in evento["data"]["consultas"]]
+
+
+async def test_agenda_ao_vivo_envia_retrato_e_so_as_alteracoes_do_dia(backend):
+    await exigir_fluxo(backend)
+    paciente = await criar_paciente()
+    medico, outro = await criar_medico("Maria"), await criar_medico("Pedro")
+    primeira = await adicionar_consulta_db(nova_consulta(paciente, medico, datetime(2024, 6, 3, 9)))
+    difusor = DifusorConsultas()
+    eventos = await agenda_ao_vivo(medico.id, DIA, difusor=difusor)
+    try:
+        assert ids_do_retrato(await proximo(eventos)) == [primeira.id]
+
+        # Cada alteração chega com o estado atual da consulta, então cada passo espera o seu evento
+        segunda = await adicionar_consulta_db(nova_consulta(paciente, medico, datetime(2024, 6, 3, 10)))
+        assert await resumo(eventos) == ("insert", segunda.id)
+        await adicionar_consulta_db(nova_consulta(paciente, outro, datetime(2024, 6, 3, 10)))  # Outro médico
+        amanha = await adicionar_consulta_db(nova_consulta(paciente, medico, datetime(2024, 6, 4, 9)))  # Outro dia
+        await atualizar_consulta_db(segunda.id, nova_consulta(paciente, medico, datetime(2024, 6, 4, 10)))
+        assert await resumo(eventos) == ("delete", segunda.id)
+        await atualizar_consulta_db(amanha.id, nova_consulta(paciente, medico, datetime(2024, 6, 3, 11)))
+        evento = await proximo(eventos)
+        assert (evento["event"], evento["data"]["_id"], evento["data"]["data_hora"]) == ("update", amanha.id, "2024-06-03T11:00:00")
+        await excluir_consulta_db(primeira.id)
+        assert await resumo(eventos) == ("delete", primeira.id)
+    finally:
+        await eventos.aclose()
+        await difusor.parar()
+
+
+async def test_reconexao_recebe_so_o_que_perdeu(backend):
+    await exigir_fluxo(backend)
+    paciente = await criar_paciente()
+    medico, outro = await criar_medico("Maria"), await criar_medico("Pedro")
+    difusor = DifusorConsultas()
+    try:
+        eventos = await agenda_ao_vivo(medico.id, DIA, difusor=difusor)
+        assert ids_do_retrato(await proximo(eventos)) == []
+        primeira = await adicionar_consulta_db(nova_consulta(paciente, medico, datetime(2024, 6, 3, 9)))
+        ultimo = await proximo(eventos)
+        await eventos.aclose()
+
+        # Desconectada, a tela perde uma consulta nova do dia (e uma de outro médico, que não lhe diz respeito)
+        await adicionar_consulta_db(nova_consulta(paciente, outro, datetime(2024, 6, 3, 9)))
+        segunda = await adicionar_consulta_db(nova_consulta(paciente, medico, datetime(2024, 6, 3, 10)))
+        eventos = await agenda_ao_vivo(medico.id, DIA, ultimo["id"], difusor=difusor)
+        evento = await proximo(eventos)
+        assert (evento["event"], evento["data"]["_id"]) == ("insert", segunda.id)
+        await eventos.aclose()
+
+        # No SQLite as alterações guardam o estado anterior, então a remoção perdida também é reenviada
+        if isinstance(backend, RepositorioSQLite):
+            await excluir_consulta_db(primeira.id)
+            eventos = await agenda_ao_vivo(medico.id, DIA, evento["id"], difusor=difusor)
+            perdido = await proximo(eventos)
+            assert (perdido["event"], perdido["data"]) == ("delete", {"id": primeira.id})
+            await eventos.aclose()
+            with pytest.raises(HistoricoPerdido):
+                await backend.consultas.observar("999999999").__anext__()
+
+        # Um id que o worker não conhece leva a um retrato novo
+        eventos = await agenda_ao_vivo(medico.id, DIA, "desconhecido", difusor=difusor)
+        assert segunda.id in ids_do_retrato(await proximo(eventos))
+        await eventos.aclose()
+    finally:
+        await difusor.parar()
+
+
+async def test_encerramento_para_o_fluxo_antes_de_fechar_o_banco(backend, monkeypatch):
+    await exigir_fluxo(backend)
+
+    async def abrir():
+        pass
+
+    async def fechar():
+        fluxo_no_fechamento.append(tarefa.done())
+
+    await difusor_consultas.iniciar()
+    tarefa, fluxo_no_fechamento = difusor_consultas._tarefa, []
+    monkeypatch.setattr(main, "abrir_repositorio", abrir)
+    monkeypatch.setattr(main, "fechar_repositorio", fechar)
+    async with main.lifespan(main.app):
+        pass
+
+    assert fluxo_no_fechamento == [True]
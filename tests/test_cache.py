@@ -0,0 +1,85 @@
+import asyncio
+import pytest
+from pydantic import BaseModel
+from services.cache import CacheDocumentos
+
+pytestmark = pytest.mark.anyio
+
+
+class Documento(BaseModel):
+    id: str
+    valor: int = 0
+
+
+class Carregador:
+    def __init__(self, atraso: float = 0):
+        self.chamadas = 0
+        self.atraso = atraso
+
+    async def __call__(self):
+        self.chamadas += 1
+        await asyncio.sleep(self.atraso)
+        return Documento(id="1", valor=self.chamadas)
+
+
+async def test_leitura_repetida_usa_o_cache(anyio_backend):
+    cache = CacheDocumentos("teste", capacidade=10, ttl=60)
+    carregar = Carregador()
+
+    primeiro = await cache.obter("1", carregar)
+    segundo = await cache.obter("1", carregar)
+
+    assert carregar.chamadas == 1
+    assert primeiro == segundo and primeiro is not segundo
+    assert (cache.acertos, cache.faltas) == (1, 1)
+
+
+async def test_leituras_simultaneas_compartilham_o_carregamento(anyio_backend):
+    cache = CacheDocumentos("teste", capacidade=10, ttl=60)
+    carregar = Carregador(atraso=0.01)
+
+    resultados = await asyncio.gather(*[cache.obter("1", carregar) for _ in range(20)])
+
+    assert carregar.chamadas == 1
+    assert {resultado.valor for resultado in resultados} == {1}
+
+
+async def test_invalidacao_durante_o_carregamento_nao_guarda_valor_antigo(anyio_backend):
+    cache = CacheDocumentos("teste", capacidade=10, ttl=60)
+    carregar = Carregador(atraso=0.01)
+
+    leitura = asyncio.ensure_future(cache.obter("1", carregar))
+    await asyncio.sleep(0)
+    cache.invalidar("1")
+    await leitura
+    await cache.obter("1", carregar)
+
+    assert carregar.chamadas == 2
+
+
+async def test_carregamento_cancelado_nao_prende_quem_espera(anyio_backend):
+    cache = CacheDocumentos("teste", capacidade=10, ttl=60)
+    carregar = Carregador(atraso=0.05)
+
+    primeira = asyncio.ensure_future(cache.obter("1", carregar))
+    await asyncio.sleep(0)
+    segunda = asyncio.ensure_future(cache.obter("1", carregar))
+    await asyncio.sleep(0)
+    primeira.cancel()
+
+    assert (await asyncio.wait_for(segunda, 1)).valor == 2
+    assert carregar.chamadas == 2
+
+
+async def test_capacidade_e_ttl_limitam_o_cache(anyio_backend):
+    cache = CacheDocumentos("teste", capacidade=2, ttl=60)
+    for chave in ("1", "2", "3"):
+        await cache.obter(chave, Carregador())
+    assert cache.estatisticas()["itens"] == 2
+
+    expirado = CacheDocumentos("teste", capacidade=10, ttl=0.01)
+    carregar = Carregador()
+    await expirado.obter("1", carregar)
+    await asyncio.sleep(0.02)
+    await expirado.obter("1", carregar)
+    assert carregar.chamadas == 2
@@ -0,0 +1,43 @@
+from bson import ObjectId
+from datetime import timezone
+from fastapi.routing import APIRoute
+from ferramentas.carga import CENARIOS, comparar, percentil
+from ferramentas.sintetico import INICIO_PERIODO, BaseSintetica
+from main import app
+
+
+def test_toda_rota_tem_cenario_de_carga():
+    rotas = {
+        f"{metodo} {rota.path}"
+        for rota in app.routes if isinstance(rota, APIRoute)
+        for metodo in rota.methods
+    }
+    assert rotas - set(CENARIOS) == set()
+
+
+def test_base_sintetica_e_reproduzivel():
+    base, outra = BaseSintetica(semente=7, pacientes=50, medicos=5, consultas=200), BaseSintetica(semente=7, pacientes=50, medicos=5, consultas=200)
+
+    assert [base.consulta(j) for j in range(200)] == [outra.consulta(j) for j in range(200)]
+    assert base.paciente(3, [], []) == outra.paciente(3, [], [])
+    ids = [base.id_paciente(i) for i in range(50)]
+    assert len(set(ids)) == 50 and all(ObjectId.is_valid(id) for id in ids)
+    assert ids == sorted(ids)
+    assert BaseSintetica(semente=8).id_paciente(0) != base.id_paciente(0)
+    # O instante dos IDs é o de INICIO_PERIODO em UTC, qualquer que seja o fuso da máquina
+    assert ObjectId(ids[0]).generation_time == INICIO_PERIODO.replace(tzinfo=timezone.utc)
+
+
+def test_percentil_nearest_rank():
+    valores = [float(v) for v in range(1, 101)]
+    assert (percentil(valores, 50), percentil(valores, 95), percentil(valores, 99)) == (50.0, 95.0, 99.0)
+    assert percentil([], 50) == 0.0
+
+
+def test_comparar_aponta_regressoes_acima_da_tolerancia():
+    def execucao(p95: float, rps: float, erros: int = 0) -> dict:
+        return {"rotas": {"GET /medicos/{id}": {"p50_ms": 2.0, "p95_ms": p95, "p99_ms": 9.0, "rps": rps, "erros": erros}}}
+
+    assert comparar(execucao(5.0, 100.0), execucao(5.4, 95.0)) == []
+    regressoes = comparar(execucao(5.0, 100.0), execucao(6.0, 80.0, erros=1))
+    assert [(r["metrica"], r["depois"]) for r in regressoes] == [("p95_ms", 6.0), ("rps", 80.0), ("erros", 1)]
@@ -0,0 +1,380 @@
+import asyncio
+import csv
+import httpx
+import json
+import pytest
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta
+from fastapi import HTTPException
+from main import app
+from models.medicos import Medico, MedicoCreate
+from models.paciente import Paciente, PacienteCreate
+from services.consultas import (
+    adicionar_consulta_db, excluir_consulta_db, listar_pacientes_sem_consultas_db,
+    listar_consultas_com_pacientes, listar_consultas_por_paciente_db, listar_consultas_db,
+    calcular_media_tempo_entre_consultas, estatisticas_consultas_por_pacientes, estatisticas_consultas_por_medico,
+    adicionar_consultas_em_lote_db, atualizar_consulta_db, contar_consultas_por_paciente,
+    exportar_consultas_por_periodo_db,
+)
+import services.consultas
+from services.agenda import horarios_livres_db
+from services.cache import obter_medico_cache, obter_paciente_cache
+from services.medicos import associar_paciente_a_medico, contar_pacientes_por_medico
+from services.paginacao import proximo_cursor_por_data_hora
+from services.paciente import deletar_paciente_db
+from services.repositorios.mongo import RepositorioMongo, preencher_contadores
+from services.repositorios.sqlite import RepositorioSQLite
+from fabricas import criar_medico, criar_paciente, nova_consulta
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_agendamentos_concorrentes_nao_perdem_ids(backend):
+    paciente = await criar_paciente()
+    medico = await criar_medico()
+    inicio = datetime(2024, 1, 1, 8)
+
+    consultas = await asyncio.gather(*[
+        adicionar_consulta_db(nova_consulta(paciente, medico, inicio + timedelta(hours=i)))
+        for i in range(300)
+    ])
+    ids = {consulta.id for consulta in consultas}
+
+    paciente = await backend.pacientes.obter(paciente.id)
+    medico = await backend.medicos.obter(medico.id)
+    assert set(paciente.consultas) == ids
+    assert set(medico.consultas) == ids
+    assert len(medico.consultas) == 300
+
+
+async def test_excluir_consulta_remove_ids_dos_pais(backend):
+    paciente = await criar_paciente()
+    medico = await criar_medico()
+    consulta = await adicionar_consulta_db(nova_consulta(paciente, medico, datetime(2024, 1, 1, 8)))
+
+    assert await excluir_consulta_db(consulta.id)
+
+    paciente = await backend.pacientes.obter(paciente.id)
+    medico = await backend.medicos.obter(medico.id)
+    assert paciente.consultas == []
+    assert medico.consultas == []
+
+
+async def test_pacientes_sem_consultas_retorna_paginas_completas(backend):
+    medico = await criar_medico()
+    pacientes = [await criar_paciente(f"Paciente {i}") for i in range(30)]
+    # Metade dos pacientes tem consulta, intercalados com os que não têm
+    for i, paciente in enumerate(pacientes[::2]):
+        await adicionar_consulta_db(nova_consulta(paciente, medico, datetime(2024, 1, 1, 8) + timedelta(hours=i)))
+    esperados = [paciente.id for paciente in pacientes[1::2]]
+
+    paginas = [await listar_pacientes_sem_consultas_db(skip, 5) for skip in (0, 5, 10)]
+
+    assert [len(pagina) for pagina in paginas] == [5, 5, 5]
+    assert [paciente.id for pagina in paginas for paciente in pagina] == esperados
+
+
+async def test_consultas_com_pacientes_filtra_periodo_e_resolve_nomes(backend):
+    medico = await criar_medico()
+    ana, bruno = await criar_paciente("Ana"), await criar_paciente("Bruno")
+    for dia in range(1, 11):
+        paciente = ana if dia % 2 else bruno
+        await adicionar_consulta_db(nova_consulta(paciente, medico, datetime(2024, 3, dia, 9)))
+
+    resultado = await listar_consultas_com_pacientes(
+        medico.id, inicio=datetime(2024, 3, 3), fim=datetime(2024, 3, 8), skip=1, limit=3,
+    )
+
+    assert [item["data"] for item in resultado] == [datetime(2024, 3, dia, 9) for dia in (4, 5, 6)]
+    assert [item["paciente"] for item in resultado] == ["Bruno", "Ana", "Bruno"]
+
+
+async def test_periodo_em_streaming_negocia_o_formato_pelo_accept(backend, monkeypatch):
+    paciente, medico = await criar_paciente(), await criar_medico()
+    consultas = [await adicionar_consulta_db(nova_consulta(paciente, medico, datetime(2024, 4, dia, 9))) for dia in (1, 2, 3)]
+    ids = [consulta.id for consulta in consultas]
+    inicio, fim = datetime(2024, 4, 1), datetime(2024, 4, 30)
+
+    # Um bloco por consulta (e o cabeçalho do CSV junto da primeira)
+    monkeypatch.setattr(services.consultas, "TAMANHO_BLOCO_EXPORTACAO", 1)
+    blocos = [bloco async for bloco in exportar_consultas_por_periodo_db(inicio, fim, "csv", batch_size=2)]
+    assert len(blocos) == 3 and blocos[0].startswith("_id,paciente_id,medico_id,data_hora,status,observacoes\r\n")
+
+    params = {"inicio": inicio.isoformat(), "fim": fim.isoformat(), "batch_size": 2}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://teste") as client:
+        async def pedir(accept: str) -> httpx.Response:
+            return await client.get("/consultas/periodo/", params=params, headers={"Accept": accept})
+
+        ndjson = await pedir("application/x-ndjson")
+        assert ndjson.headers["content-type"].startswith("application/x-ndjson")
+        assert [json.loads(linha)["_id"] for linha in ndjson.text.splitlines()] == ids
+
+        texto = await pedir("text/csv;q=0.9, application/json;q=0.5")
+        assert texto.headers["content-type"].startswith("text/csv")
+        linhas = list(csv.DictReader(texto.text.splitlines()))
+        assert [linha["_id"] for linha in linhas] == ids and linhas[0]["status"] == "Agendada"
+
+        # Só a faixa do tipo conta: nem "q=0" nem um tipo que apenas contém "text/csv" pedem streaming
+        for accept in ("application/json", "*/*", "text/csv;q=0, application/json", "text/csvx", "application/json, text/csv;q=0.5"):
+            resposta = await pedir(accept)
+            assert resposta.headers["content-type"].startswith("application/json"), accept
+            assert resposta.json()["contagem"] == 3
+
+
+async def test_paginacao_por_cursor_percorre_consultas_sem_repetir(backend):
+    paciente = await criar_paciente()
+    medicos = [await criar_medico() for _ in range(3)]
+    # Algumas consultas empatam em data_hora para exercitar o desempate por id
+    # (com médicos diferentes, já que o mesmo médico não pode ter duas consultas no mesmo horário)
+    datas = [datetime(2024, 5, 1, 9)] * 3 + [datetime(2024, 5, dia, 9) for dia in range(2, 6)]
+    for i, data_hora in enumerate(datas):
+        await adicionar_consulta_db(nova_consulta(paciente, medicos[i % 3], data_hora))
+    todas = await listar_consultas_por_paciente_db(paciente.id, 0, 100)
+
+    percorridas, cursor = [], None
+    while True:
+        pagina = await listar_consultas_por_paciente_db(paciente.id, 0, 3, cursor)
+        percorridas.extend(pagina)
+        cursor = proximo_cursor_por_data_hora(pagina, 3)
+        if not cursor:
+            break
+
+    assert [consulta.id for consulta in percorridas] == [consulta.id for consulta in todas]
+    assert len(percorridas) == len(datas)
+
+
+async def test_modos_de_total_da_listagem_de_consultas(backend):
+    paciente = await criar_paciente()
+    medico = await criar_medico()
+    await adicionar_consulta_db(nova_consulta(paciente, medico, datetime(2024, 6, 1, 9)))
+
+    em_cache = await listar_consultas_db(0, 10, total="cache", paciente_id=paciente.id)
+    await adicionar_consulta_db(nova_consulta(paciente, medico, datetime(2024, 6, 2, 9)))
+
+    assert em_cache.quantidade == 1
+    # Dentro do TTL o total em cache continua o mesmo; o exato já vê a nova consulta
+    assert (await listar_consultas_db(0, 10, total="cache", paciente_id=paciente.id)).quantidade == 1
+    assert (await listar_consultas_db(0, 10, total="exato", paciente_id=paciente.id)).quantidade == 2
+    assert (await listar_consultas_db(0, 10, total="nenhum", paciente_id=paciente.id)).quantidade is None
+
+
+async def test_cache_de_totais_tem_tamanho_limitado_e_descarta_os_expirados(backend, monkeypatch):
+    medico = await criar_medico()
+    monkeypatch.setattr(services.consultas, "_cache_totais", OrderedDict())
+    monkeypatch.setattr(services.consultas, "TAMANHO_CACHE_TOTAL", 2)
+    for status in ("Agendada", "Cancelada", "Concluída"):
+        await listar_consultas_db(0, 10, total="cache", medico_id=medico.id, status=status)
+    assert [dict(chave)["status"] for chave in services.consultas._cache_totais] == ["Cancelada", "Concluída"]
+
+    # Passado o TTL, a próxima gravação leva junto as expiradas
+    monkeypatch.setattr(services.consultas, "TTL_CACHE_TOTAL", 0.01)
+    await asyncio.sleep(0.02)
+    await listar_consultas_db(0, 10, total="cache", medico_id=medico.id)
+    assert [dict(chave).get("status") for chave in services.consultas._cache_totais] == [None]
+
+
+async def test_media_de_tempo_entre_consultas_individual_e_em_lote(backend):
+    medico = await criar_medico()
+    ana, bruno, carla = await criar_paciente("Ana"), await criar_paciente("Bruno"), await criar_paciente("Carla")
+    for dia in (31, 1, 11):  # intervalos de 10 e 20 dias, fora de ordem
+        await adicionar_consulta_db(nova_consulta(ana, medico, datetime(2024, 1, dia, 9)))
+    await adicionar_consulta_db(nova_consulta(bruno, medico, datetime(2024, 1, 1, 10)))
+    await associar_paciente_a_medico(ana.id, medico.id)
+    await associar_paciente_a_medico(carla.id, medico.id)
+
+    assert await calcular_media_tempo_entre_consultas(ana.id) == 15
+    assert await calcular_media_tempo_entre_consultas(bruno.id) == 0
+
+    por_paciente = {item["paciente_id"]: item for item in await estatisticas_consultas_por_pacientes([ana.id, bruno.id])}
+    assert por_paciente[ana.id] == {"paciente_id": ana.id, "contagem_consultas": 3, "media_tempo_consultas": 15}
+    assert por_paciente[bruno.id]["contagem_consultas"] == 1
+
+    do_medico = {item["paciente_id"]: item for item in await estatisticas_consultas_por_medico(medico.id)}
+    assert set(do_medico) == {ana.id, carla.id}
+    assert do_medico[carla.id]["contagem_consultas"] == 0
+
+
+async def test_consultas_em_lote_relatam_cada_item_e_atualizam_os_pais(backend):
+    paciente = await criar_paciente()
+    medico = await criar_medico()
+    valido = {"paciente_id": paciente.id, "medico_id": medico.id, "data_hora": "2024-07-01T09:00:00", "status": "Agendada"}
+    itens = [valido, {**valido, "paciente_id": "inexistente"}, {"status": "Agendada"}, {**valido, "data_hora": "2024-07-01T10:00:00"}]
+
+    resultado = await adicionar_consultas_em_lote_db(itens)
+
+    assert (resultado.inseridos, resultado.falhas) == (2, 2)
+    assert [item.sucesso for item in resultado.itens] == [True, False, False, True]
+    assert resultado.itens[1].erro == "Paciente não encontrado"
+    ids = {resultado.itens[0].id, resultado.itens[3].id}
+    assert set((await backend.pacientes.obter(paciente.id)).consultas) == ids
+    assert set((await backend.medicos.obter(medico.id)).consultas) == ids
+
+
+async def test_consulta_sobreposta_do_mesmo_medico_e_recusada(backend):
+    paciente = await criar_paciente()
+    medico, outro_medico = await criar_medico(), await criar_medico("Outro Médico")
+    consulta = await adicionar_consulta_db(nova_consulta(paciente, medico, datetime(2024, 8, 1, 9)))
+
+    with pytest.raises(HTTPException) as erro:
+        await adicionar_consulta_db(nova_consulta(paciente, medico, datetime(2024, 8, 1, 9, 20)))
+    assert erro.value.status_code == 409
+    # Encostadas (uma termina quando a outra começa) não se sobrepõem, nem consultas de outro médico
+    seguinte = await adicionar_consulta_db(nova_consulta(paciente, medico, datetime(2024, 8, 1, 9, 30)))
+    await adicionar_consulta_db(nova_consulta(paciente, outro_medico, datetime(2024, 8, 1, 9)))
+
+    # Remarcar a consulta no próprio horário não conflita com ela mesma
+    remarcada = await atualizar_consulta_db(consulta.id, nova_consulta(paciente, medico, datetime(2024, 8, 1, 8, 50)))
+    assert remarcada.data_hora == datetime(2024, 8, 1, 8, 50)
+    with pytest.raises(HTTPException) as erro:
+        await atualizar_consulta_db(seguinte.id, nova_consulta(paciente, medico, datetime(2024, 8, 1, 9)))
+    assert erro.value.status_code == 409
+    # O médico é conferido junto com os conflitos: remarcar para um que não existe é 404
+    sem_medico = nova_consulta(paciente, medico, datetime(2024, 8, 2, 9))
+    sem_medico.medico_id = "999999"
+    with pytest.raises(HTTPException) as erro:
+        await atualizar_consulta_db(seguinte.id, sem_medico)
+    assert erro.value.status_code == 404
+
+    # Cancelada, a consulta libera o horário
+    cancelada = nova_consulta(paciente, medico, datetime(2024, 8, 1, 8, 50))
+    cancelada.status = "Cancelada"
+    await atualizar_consulta_db(consulta.id, cancelada)
+    await adicionar_consulta_db(nova_consulta(paciente, medico, datetime(2024, 8, 1, 9)))
+
+
+async def test_consultas_em_lote_sobrepostas_sao_recusadas_item_a_item(backend):
+    paciente = await criar_paciente()
+    medico, outro_medico = await criar_medico(), await criar_medico("Outro Médico")
+    existente = await adicionar_consulta_db(nova_consulta(paciente, medico, datetime(2024, 8, 1, 9)))
+
+    def item(medico: Medico, hora: str, status: str = "Agendada") -> dict:
+        return {"paciente_id": paciente.id, "medico_id": medico.id, "data_hora": f"2024-08-01T{hora}:00", "status": status}
+
+    resultado = await adicionar_consultas_em_lote_db([
+        item(medico, "09:15"),                # sobrepõe a consulta já gravada
+        item(medico, "10:20"),                # sobrepõe o item 3, que começa antes
+        item(outro_medico, "10:00"),          # outro médico
+        item(medico, "10:00"),
+        item(medico, "10:30"),                # encosta no item 3
+        item(medico, "10:35", "Cancelada"),   # não ocupa a agenda
+    ])
+
+    assert [item.sucesso for item in resultado.itens] == [False, False, True, True, True, True]
+    assert existente.id in resultado.itens[0].erro
+    assert "item 3 do lote" in resultado.itens[1].erro
+    # Os recusados não chegaram ao banco
+    assert len(await listar_consultas_por_paciente_db(paciente.id, 0, 10)) == 5
+
+
+async def test_horarios_livres_descontam_consultas_do_dia_e_da_semana(backend):
+    paciente = await criar_paciente()
+    medico = await criar_medico()
+    for data_hora in (datetime(2024, 9, 2, 7, 45), datetime(2024, 9, 2, 9, 10), datetime(2024, 9, 3, 11)):
+        await adicionar_consulta_db(nova_consulta(paciente, medico, data_hora))
+    cancelada = nova_consulta(paciente, medico, datetime(2024, 9, 2, 10))
+    cancelada.status = "Cancelada"
+    await adicionar_consulta_db(cancelada)
+
+    dia = await horarios_livres_db(medico.id, date(2024, 9, 2), inicio_expediente=time(8), fim_expediente=time(11))
+    # 08:00 está ocupado pela consulta das 07:45; a das 09:10 ocupa 09:00 e 09:30
+    assert [horario.inicio.time() for horario in dia.horarios] == [time(8, 30), time(10), time(10, 30)]
+    assert dia.duracao_minutos == 30
+
+    semana = await horarios_livres_db(medico.id, date(2024, 9, 2), dias=7)
+    assert len(semana.horarios) == 7 * 20 - 4
+    assert datetime(2024, 9, 3, 11) not in {horario.inicio for horario in semana.horarios}
+
+    with pytest.raises(HTTPException) as erro:
+        await horarios_livres_db("inexistente", date(2024, 9, 2))
+    assert erro.value.status_code == 404
+
+
+async def test_contadores_acompanham_consultas_e_associacoes(backend):
+    ana, bruno = await criar_paciente("Ana"), await criar_paciente("Bruno")
+    medico = await criar_medico()
+    consultas = [
+        await adicionar_consulta_db(nova_consulta(ana, medico, datetime(2024, 10, dia, 9))) for dia in (1, 2, 3)
+    ]
+    await adicionar_consultas_em_lote_db([
+        {"paciente_id": bruno.id, "medico_id": medico.id, "data_hora": "2024-10-04T09:00:00", "status": "Agendada"},
+    ])
+    await excluir_consulta_db(consultas[0].id)
+    await atualizar_consulta_db(consultas[1].id, nova_consulta(bruno, medico, datetime(2024, 10, 2, 9)))
+
+    assert await contar_consultas_por_paciente(ana.id) == 1
+    assert await contar_consultas_por_paciente(bruno.id) == 2
+
+    # Associar de novo o mesmo paciente não conta duas vezes; remover o paciente desconta
+    for paciente in (ana, ana, bruno):
+        await associar_paciente_a_medico(paciente.id, medico.id)
+    assert await contar_pacientes_por_medico(medico.id) == 2
+    await deletar_paciente_db(bruno.id)
+    assert await contar_pacientes_por_medico(medico.id) == 1
+    assert (await backend.medicos.obter(medico.id)).pacientes == [ana.id]
+
+    with pytest.raises(HTTPException) as erro:
+        await contar_consultas_por_paciente(bruno.id)
+    assert erro.value.status_code == 404
+
+
+async def test_remarcar_para_outro_paciente_e_medico_atualiza_os_dois_lados(backend):
+    ana, bruno = await criar_paciente("Ana"), await criar_paciente("Bruno")
+    maria, pedro = await criar_medico("Maria Souza"), await criar_medico("Pedro Lima")
+    consulta = await adicionar_consulta_db(nova_consulta(ana, maria, datetime(2024, 10, 1, 9)))
+
+    # Os quatro ficam no cache antes da troca
+    for obter, id in ((obter_paciente_cache, ana.id), (obter_paciente_cache, bruno.id),
+                      (obter_medico_cache, maria.id), (obter_medico_cache, pedro.id)):
+        await obter(id)
+    await atualizar_consulta_db(consulta.id, nova_consulta(bruno, pedro, datetime(2024, 10, 1, 9)))
+
+    # O cache guarda só a projeção sem as listas: as listas dos quatro vêm do banco
+    assert not hasattr(await obter_paciente_cache(ana.id), "consultas")
+    assert not hasattr(await obter_medico_cache(maria.id), "consultas")
+    assert consulta.id not in (await backend.pacientes.obter(ana.id)).consultas
+    assert consulta.id in (await backend.pacientes.obter(bruno.id)).consultas
+    assert consulta.id not in (await backend.medicos.obter(maria.id)).consultas
+    assert consulta.id in (await backend.medicos.obter(pedro.id)).consultas
+
+
+async def test_reconciliacao_corrige_contadores_divergentes(backend):
+    paciente = await criar_paciente()
+    medico = await criar_medico()
+    await adicionar_consulta_db(nova_consulta(paciente, medico, datetime(2024, 11, 1, 9)))
+    await associar_paciente_a_medico(paciente.id, medico.id)
+    assert await backend.reconciliar_contadores() == {"paciente.total_consultas": 0, "medico.total_pacientes": 0}
+
+    # Simula a divergência gravando valores errados direto no banco
+    if isinstance(backend, RepositorioSQLite):
+        await backend.pool.escrever(lambda conexao: conexao.execute("UPDATE paciente SET total_consultas = 7"))
+        await backend.pool.escrever(lambda conexao: conexao.execute("UPDATE medico SET total_pacientes = 5"))
+    else:
+        await Paciente.get_motor_collection().update_one({"_id": paciente.id}, {"$set": {"total_consultas": 7}})
+        await Medico.get_motor_collection().update_one({"_id": medico.id}, {"$unset": {"total_pacientes": ""}})
+
+    assert await backend.reconciliar_contadores() == {"paciente.total_consultas": 1, "medico.total_pacientes": 1}
+    assert await contar_consultas_por_paciente(paciente.id) == 1
+    assert await contar_pacientes_por_medico(medico.id) == 1
+
+
+async def test_contadores_antigos_preenchidos_antes_das_escritas(banco):
+    repositorio = RepositorioMongo()
+    paciente = await repositorio.pacientes.criar(PacienteCreate(
+        nome="Ana", telefone="999999999", email="ana@email.com", sexo="F",
+        peso=60.0, altura=1.65, problemas_de_saude="", data_criacao=datetime(2024, 1, 1),
+    ))
+    medico = await repositorio.medicos.criar(MedicoCreate(
+        nome="Maria", especialidade="Cardiologia", crm="12345-CE", email="maria@email.com", telefone="888888888",
+    ))
+    for dia in (1, 2):
+        await repositorio.consultas.criar(nova_consulta(paciente, medico, datetime(2024, 12, dia, 9)))
+    await repositorio.medicos.associar_paciente(paciente.id, medico.id)
+
+    # Documentos gravados antes dos contadores existirem
+    await Paciente.get_motor_collection().update_many({}, {"$unset": {"total_consultas": ""}})
+    await Medico.get_motor_collection().update_many({}, {"$unset": {"total_pacientes": ""}})
+    assert await preencher_contadores() == 2
+
+    await repositorio.consultas.criar(nova_consulta(paciente, medico, datetime(2024, 12, 3, 9)))
+    assert await repositorio.pacientes.total_consultas(paciente.id) == 3
+    assert await repositorio.medicos.total_pacientes(medico.id) == 1
@@ -0,0 +1,79 @@
+import json
+import pytest
+from datetime import datetime
+from ferramentas import dados
+from models.consultas import Consulta
+from models.medicos import Medico
+from models.paciente import Paciente
+from fabricas import criar_medico, criar_paciente
+
+pytestmark = pytest.mark.anyio
+
+
+async def criar_pais():
+    return await criar_paciente(), await criar_medico()
+
+
+# Simula a execução parando logo depois da chamada número `parar_em` da função assíncrona substituída
+def interromper(monkeypatch, nome: str, parar_em: int):
+    original, chamadas = getattr(dados, nome), []
+
+    async def ou_parar(*args, **kwargs):
+        await original(*args, **kwargs)
+        chamadas.append(1)
+        if len(chamadas) == parar_em:
+            raise RuntimeError("interrompida")
+    monkeypatch.setattr(dados, nome, ou_parar)
+    return lambda: monkeypatch.setattr(dados, nome, original)
+
+
+# Para depois de gravar o lote: sem upsert, antes de acrescentá-lo aos pais; com upsert, depois de
+# acrescentá-lo ao paciente (a retomada grava o lote de novo)
+@pytest.mark.parametrize("upsert, parar_depois_de", [
+    (False, "_ajustar_resumo_importado"), (True, "acrescentar_consultas_aos_pais"),
+])
+async def test_importacao_retomada_nao_duplica_consultas_nem_referencias(banco, tmp_path, monkeypatch, upsert, parar_depois_de):
+    paciente, medico = await criar_pais()
+    arquivo, checkpoint = tmp_path / "consultas.ndjson", str(tmp_path / "consultas.ckpt")
+    arquivo.write_text("".join(json.dumps({
+        "_id": f"c{dia}", "paciente_id": paciente.id, "medico_id": medico.id,
+        "data_hora": f"2024-08-0{dia}T08:00:00", "status": "Agendada",
+    }) + "\n" for dia in (1, 2, 3)), encoding="utf-8")
+
+    restaurar = interromper(monkeypatch, parar_depois_de, 1)
+    with pytest.raises(RuntimeError):
+        await dados.importar("consultas", str(arquivo), upsert=upsert, checkpoint=checkpoint, atualizar_referencias=True)
+    restaurar()
+    await dados.importar("consultas", str(arquivo), upsert=upsert, checkpoint=checkpoint, atualizar_referencias=True)
+
+    assert await Consulta.count() == 3
+    paciente, medico = await Paciente.get(paciente.id), await Medico.get(medico.id)
+    assert sorted(paciente.consultas) == ["c1", "c2", "c3"] and paciente.total_consultas == 3
+    assert sorted(medico.consultas) == ["c1", "c2", "c3"]
+
+
+@pytest.mark.parametrize("formato", ["ndjson", "csv"])
+async def test_exportacao_retomada_corta_o_que_passou_do_checkpoint(banco, tmp_path, monkeypatch, formato):
+    paciente, medico = await criar_pais()
+    for dia in range(1, 6):
+        await Consulta(
+            id=f"c{dia}", paciente_id=paciente.id, medico_id=medico.id, data_hora=datetime(2024, 8, dia, 8), status="Agendada",
+        ).insert()
+    completo, retomado, checkpoint = tmp_path / "completo", tmp_path / "retomado", str(tmp_path / "exportar.ckpt")
+    await dados.exportar("consultas", str(completo), formato, tamanho_lote=2)
+
+    # Para com quatro consultas escritas e o checkpoint ainda nas duas primeiras
+    gravar_checkpoint, chamadas = dados._gravar_checkpoint, []
+
+    def ou_parar(*args):
+        chamadas.append(1)
+        if len(chamadas) == 2:
+            raise RuntimeError("interrompida")
+        gravar_checkpoint(*args)
+    monkeypatch.setattr(dados, "_gravar_checkpoint", ou_parar)
+    with pytest.raises(RuntimeError):
+        await dados.exportar("consultas", str(retomado), formato, tamanho_lote=2, checkpoint=checkpoint)
+    monkeypatch.setattr(dados, "_gravar_checkpoint", gravar_checkpoint)
+    await dados.exportar("consultas", str(retomado), formato, tamanho_lote=2, checkpoint=checkpoint)
+
+    assert retomado.read_text(encoding="utf-8") == completo.read_text(encoding="utf-8")
@@ -0,0 +1,142 @@
+import asyncio
+import database.database
+import httpx
+import pytest
+from datetime import date, datetime, timedelta
+from main import app
+from models.medicos import Medico
+from models.paciente import Paciente
+from models.tarefas import TAREFA_CONCLUIDA, TAREFA_EXCLUSAO_PACIENTE, TAREFA_EXECUTANDO
+from services import exclusoes
+from services.consultas import adicionar_consulta_db, contar_consultas_por_paciente
+from services.exclusoes import aguardar_exclusoes, retomar_exclusoes
+from services.medicos import associar_paciente_a_medico
+from services.paciente import deletar_paciente_db
+from services.relatorios import consultas_por_medico_db
+from services.repositorios import RepositorioSQLite
+from services.repositorios.mongo import RepositorioPacientesMongo
+from fabricas import criar_medico, criar_paciente, nova_consulta
+
+pytestmark = pytest.mark.anyio
+
+
+async def agendar(paciente: Paciente, medico: Medico, quantidade: int, inicio: datetime):
+    for i in range(quantidade):
+        await adicionar_consulta_db(nova_consulta(paciente, medico, inicio + timedelta(hours=i)))
+
+
+async def test_exclusao_de_paciente_remove_consultas_em_lotes(backend, monkeypatch):
+    monkeypatch.setattr(exclusoes, "TAMANHO_LOTE_EXCLUSAO", 2)
+    ana, bruno = await criar_paciente("Ana"), await criar_paciente("Bruno")
+    maria, pedro = await criar_medico("Maria"), await criar_medico("Pedro")
+    await agendar(ana, maria, 3, datetime(2024, 3, 1, 8))
+    await agendar(ana, pedro, 2, datetime(2024, 3, 2, 8))
+    await agendar(bruno, maria, 1, datetime(2024, 3, 3, 8))
+    for medico in (maria, pedro):
+        await associar_paciente_a_medico(ana.id, medico.id)
+
+    tarefa = await deletar_paciente_db(ana.id)
+    assert tarefa.tipo == TAREFA_EXCLUSAO_PACIENTE and tarefa.alvo_id == ana.id
+    await aguardar_exclusoes()
+
+    tarefa = await backend.tarefas.obter(tarefa.id)
+    assert (tarefa.status, tarefa.consultas_removidas, tarefa.erro) == (TAREFA_CONCLUIDA, 5, None)
+    maria, pedro = await backend.medicos.obter(maria.id), await backend.medicos.obter(pedro.id)
+    assert (maria.pacientes, maria.total_pacientes, pedro.consultas) == ([], 0, [])
+    assert maria.consultas == (await backend.pacientes.obter(bruno.id)).consultas
+    assert await consultas_por_medico_db(date(2024, 3, 1), date(2024, 3, 31)) == [
+        {"medico_id": maria.id, "total": 1, "por_status": {"Agendada": 1}},
+    ]
+
+    # Uma tarefa interrompida só é retomada depois do prazo sem andar (antes dele, outro worker pode
+    # estar com ela), uma vez só, e repetir a remoção não desconta duas vezes
+    interrompida = await backend.tarefas.criar(TAREFA_EXCLUSAO_PACIENTE, ana.id)
+    await backend.tarefas.atualizar(interrompida.id, status=TAREFA_EXECUTANDO)
+    interrompida = await backend.tarefas.obter(interrompida.id)
+    assert await retomar_exclusoes() == 0
+    monkeypatch.setattr(exclusoes, "PRAZO_TAREFA", timedelta(0))
+    assert await retomar_exclusoes() == 1
+    assert not await backend.tarefas.reivindicar(interrompida.id, interrompida.atualizada_em)
+    await aguardar_exclusoes()
+    assert (await backend.tarefas.obter(interrompida.id)).status == TAREFA_CONCLUIDA
+    assert await backend.tarefas.inacabadas() == []
+    assert (await backend.pacientes.obter(bruno.id)).total_consultas == 1
+
+
+async def test_exclusao_de_medico_responde_202_com_a_tarefa(backend):
+    paciente, medico = await criar_paciente("Ana"), await criar_medico("Maria")
+    await agendar(paciente, medico, 2, datetime(2024, 4, 1, 8))
+    await associar_paciente_a_medico(paciente.id, medico.id)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://teste") as client:
+        resposta = await client.delete(f"/medicos/{medico.id}")
+        assert resposta.status_code == 202
+        assert resposta.headers["Location"] == f"/tarefas/{resposta.json()['id']}"
+        await aguardar_exclusoes()
+        tarefa = await client.get(resposta.headers["Location"])
+        assert (await client.delete(f"/medicos/{medico.id}")).status_code == 404
+        assert (await client.get("/tarefas/999999")).status_code == 404
+
+    assert tarefa.status_code == 200
+    assert (tarefa.json()["status"], tarefa.json()["consultas_removidas"]) == (TAREFA_CONCLUIDA, 2)
+    paciente = await backend.pacientes.obter(paciente.id)
+    assert (paciente.consultas, paciente.medicos, paciente.total_consultas) == ([], [], 0)
+
+
+async def test_id_reaproveitado_pelo_sqlite_nao_herda_consultas(backend):
+    ana, medico = await criar_paciente("Ana"), await criar_medico("Maria")
+    await agendar(ana, medico, 2, datetime(2024, 7, 1, 8))
+    tarefa = await deletar_paciente_db(ana.id)
+
+    # O SQLite dá ao próximo paciente o maior id livre, que pode ser o de Ana
+    bruno = await criar_paciente("Bruno")
+    await aguardar_exclusoes()
+    assert (await backend.tarefas.obter(tarefa.id)).consultas_removidas == 2
+    assert (await backend.pacientes.obter(bruno.id)).consultas == []
+    assert await contar_consultas_por_paciente(bruno.id) == 0
+    assert (await backend.medicos.obter(medico.id)).consultas == []
+
+
+async def test_mesmo_lote_removido_duas_vezes_desconta_o_resumo_uma_vez(backend):
+    paciente, medico = await criar_paciente("Ana"), await criar_medico("Maria")
+    await agendar(paciente, medico, 3, datetime(2024, 6, 1, 8))
+
+    # Dois workers com a mesma tarefa leem o mesmo lote
+    lotes = await asyncio.gather(*[backend.consultas.remover_em_lote("paciente_id", paciente.id, 10) for _ in range(2)])
+    assert sum(len(lote) for lote in lotes) == 3
+    assert await consultas_por_medico_db(date(2024, 6, 1), date(2024, 6, 30)) == []
+
+
+async def test_orfaos_encontrados_e_reparados(backend):
+    paciente, medico = await criar_paciente("Ana"), await criar_medico("Maria")
+    await agendar(paciente, medico, 2, datetime(2024, 5, 1, 8))
+    # Remoção sem a tarefa de exclusão (no SQLite, direto na tabela): as consultas ficam órfãs
+    if isinstance(backend, RepositorioSQLite):
+        await backend.pool.escrever(lambda conexao: conexao.execute("DELETE FROM paciente WHERE id = ?", (int(paciente.id),)))
+    else:
+        assert await backend.pacientes.remover(paciente.id) == ([], [])
+
+    encontrados = await backend.reparar_orfaos()
+    assert encontrados["consultas"] == 2
+    assert await backend.reparar_orfaos(reparar=True) == encontrados
+    assert set((await backend.reparar_orfaos()).values()) == {0}
+    assert (await backend.medicos.obter(medico.id)).consultas == []
+    assert await consultas_por_medico_db(date(2024, 5, 1), date(2024, 5, 31)) == []
+
+
+async def test_secundario_atrasado_nao_interrompe_a_exclusao(banco, monkeypatch):
+    ana, maria = await criar_paciente("Ana"), await criar_medico("Maria")
+    await agendar(ana, maria, 2, datetime(2024, 9, 1, 8))
+
+    # Com as leituras nos secundários, um atrasado ainda tem o paciente e conta as suas consultas
+    monkeypatch.setattr(database.database.configuracao, "leitura_secundaria", True)
+    async def ainda_existe(self, id):
+        return 2
+    monkeypatch.setattr(RepositorioPacientesMongo, "total_consultas", ainda_existe)
+
+    tarefa = await deletar_paciente_db(ana.id)
+    await aguardar_exclusoes()
+
+    tarefa = await exclusoes.obter_tarefa_db(tarefa.id)
+    assert (tarefa.status, tarefa.consultas_removidas, tarefa.erro) == (TAREFA_CONCLUIDA, 2, None)
+    assert (await Medico.get(maria.id)).consultas == []
@@ -0,0 +1,70 @@
+import pytest
+from datetime import datetime
+from models.consultas import Consulta
+from models.medicos import Medico
+from models.paciente import Paciente
+from services.repositorios import sqlite
+
+pytestmark = pytest.mark.anyio
+
+
+# Percorre o plano de execução do explain() procurando os estágios usados
+def estagios(plano) -> set:
+    encontrados = set()
+    if isinstance(plano, dict):
+        if "stage" in plano:
+            encontrados.add(plano["stage"])
+        for valor in plano.values():
+            encontrados |= estagios(valor)
+    elif isinstance(plano, list):
+        for item in plano:
+            encontrados |= estagios(item)
+    return encontrados
+
+
+async def plano_vencedor(modelo, filtro: dict, ordenacao=None) -> set:
+    cursor = modelo.get_motor_collection().find(filtro)
+    if ordenacao:
+        cursor = cursor.sort(ordenacao)
+    explicacao = await cursor.explain()
+    return estagios(explicacao["queryPlanner"]["winningPlan"])
+
+
+@pytest.mark.parametrize("modelo, filtro", [
+    (Consulta, {"paciente_id": "p1"}),
+    (Consulta, {"medico_id": "m1"}),
+    (Consulta, {"data_hora": {"$gte": datetime(2024, 1, 1), "$lte": datetime(2024, 12, 31)}}),
+    (Paciente, {"medicos": "m1"}),
+    (Consulta, {"medico_id": "m1", "data_hora": {"$gt": datetime(2024, 1, 1, 8, 30), "$lt": datetime(2024, 1, 1, 9, 30)}}),
+    (Medico, {"nome_busca": {"$regex": "^joao"}}),
+    (Medico, {"especialidade_busca": {"$regex": "^cardio"}}),
+])
+async def test_consultas_dos_services_usam_indice(banco, modelo, filtro):
+    estagios_usados = await plano_vencedor(modelo, filtro)
+
+    assert "IXSCAN" in estagios_usados
+    assert "COLLSCAN" not in estagios_usados
+
+
+@pytest.mark.parametrize("sql, parametros", [
+    ("SELECT * FROM consulta WHERE paciente_id = ? ORDER BY data_hora, id", (1,)),
+    ("SELECT * FROM consulta WHERE medico_id = ? AND (data_hora, id) > (?, ?) ORDER BY data_hora, id", (1, "2024-01-01", 0)),
+    (sqlite.SQL_CONSULTAS_PERIODO, ("2024-01-01", "2024-12-31")),
+    (sqlite.SQL_CONFLITO, (1, "2024-01-01 08:30", "2024-01-01 09:30", -1, "Cancelada")),
+    (sqlite.SQL_LOTE_OCUPADOS, (1, "2024-01-01", "2024-01-08", "", -1, "Cancelada", 500)),
+    (sqlite.SQL_PACIENTES_DO_MEDICO, (1,)),
+    (sqlite.SQL_PACIENTES_SEM_CONSULTAS, (10, 0)),
+])
+async def test_consultas_do_sqlite_usam_indice(tmp_path, sql, parametros):
+    repositorio = sqlite.RepositorioSQLite(str(tmp_path / "indices.db"), tamanho_pool=1)
+    await repositorio.iniciar()
+    try:
+        plano = await repositorio.pool.executar(
+            lambda conexao: [linha["detail"] for linha in conexao.execute("EXPLAIN QUERY PLAN " + sql, parametros)]
+        )
+    finally:
+        await repositorio.fechar()
+
+    # Nenhuma varredura completa de consulta ou pacientemedico, nem ordenação fora do índice
+    assert not any(passo.startswith(("SCAN consulta", "SCAN pacientemedico", "SCAN c", "SCAN pm")) for passo in plano), plano
+    assert not any("TEMP B-TREE" in passo for passo in plano), plano
@@ -0,0 +1,83 @@
+import pytest
+from models.medicos import Medico, MedicoCreate, MedicoResumo, MedicoSemListas, normalizar_busca
+from services.cache import cache_pacientes
+from services.medicos import (
+    associar_paciente_a_medico, atualizar_medico_db, criar_medico_db, deletar_medico_db, listar_medicos_db,
+    listar_medicos_por_especialidade_db, obter_medico_db, obter_medico_por_nome_db,
+)
+from services.paciente import obter_paciente_db
+from fabricas import criar_paciente
+
+pytestmark = pytest.mark.anyio
+
+
+def dados_medico(nome: str, especialidade: str) -> MedicoCreate:
+    return MedicoCreate(
+        nome=nome, especialidade=especialidade, crm="12345-CE",
+        email="medico@email.com", telefone="888888888",
+    )
+
+
+def test_normalizar_busca_remove_acentos_e_maiusculas():
+    assert normalizar_busca("João Conceição") == "joao conceicao"
+    assert normalizar_busca("CLÍNICA Geral") == "clinica geral"
+
+
+async def test_busca_por_nome_ignora_acentos_e_casa_prefixos(backend):
+    joao = await criar_medico_db(dados_medico("João da Silva", "Cardiologia"))
+    await criar_medico_db(dados_medico("Maria Souza", "Pediatria"))
+
+    assert [m.id for m in await obter_medico_por_nome_db("joao")] == [joao.id]
+    assert [m.id for m in await obter_medico_por_nome_db("SIL")] == [joao.id]
+    assert [m.id for m in await obter_medico_por_nome_db("jo sil")] == [joao.id]
+    # A entrada não é interpretada como regex
+    assert await obter_medico_por_nome_db(".*") == []
+    # Sem termos, nenhum médico (e não todos)
+    assert await obter_medico_por_nome_db("") == [] and await obter_medico_por_nome_db("   ") == []
+
+
+async def test_busca_acompanha_atualizacao_do_medico(backend):
+    medico = await criar_medico_db(dados_medico("Ana Lima", "Cardiologia"))
+
+    await atualizar_medico_db(medico.id, dados_medico("Ana Lima", "Clínica Geral"))
+
+    assert [m.id for m in await listar_medicos_por_especialidade_db("clinica", 0, 10)] == [medico.id]
+    assert await listar_medicos_por_especialidade_db("cardio", 0, 10) == []
+    assert (await backend.medicos.obter(medico.id)).especialidade_busca == ["clinica", "geral"]
+
+
+async def test_listagem_projeta_resumo_e_campos_pedidos(backend):
+    medico = await criar_medico_db(dados_medico("Ana Lima", "Cardiologia"))
+    paciente = await criar_paciente("Bruno")
+    await associar_paciente_a_medico(paciente.id, medico.id)
+
+    [resumo] = await listar_medicos_db(0, 10)
+    assert isinstance(resumo, MedicoResumo)
+    assert not hasattr(resumo, "consultas") and resumo.nome == "Ana Lima"
+
+    assert await listar_medicos_db(0, 10, campos=["id", "crm"]) == [{"id": medico.id, "crm": "12345-CE"}]
+    assert await obter_medico_db(medico.id, ["id", "nome"]) == {"id": medico.id, "nome": "Ana Lima"}
+
+
+async def test_cache_guarda_o_medico_sem_as_listas(backend):
+    medico = await criar_medico_db(dados_medico("Ana Lima", "Cardiologia"))
+    paciente = await criar_paciente("Bruno")
+    await associar_paciente_a_medico(paciente.id, medico.id)
+
+    cacheado = await obter_medico_db(medico.id)
+    assert isinstance(cacheado, MedicoSemListas)
+    assert not hasattr(cacheado, "pacientes") and not hasattr(cacheado, "consultas")
+    assert cacheado.revisao == (await backend.medicos.obter(medico.id)).revisao
+
+
+async def test_exclusao_do_medico_invalida_os_pacientes_associados_fora_do_cache(backend):
+    medico = await criar_medico_db(dados_medico("Ana Lima", "Cardiologia"))
+    paciente = await criar_paciente("Bruno")
+    # O médico entra no cache antes da associação, feita direto no banco (como por outro worker)
+    await obter_medico_db(medico.id)
+    await backend.medicos.associar_paciente(paciente.id, medico.id)
+    await obter_paciente_db(paciente.id)
+
+    await deletar_medico_db(medico.id)
+
+    assert cache_pacientes.estatisticas()["itens"] == 0
@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from services.metricas import Metricas, MiddlewareMetricas, MonitorComandos
+
+
+def evento(request_id: int, comando: str, **documento):
+    return SimpleNamespace(
+        request_id=request_id, connection_id=("localhost", 27017), command_name=comando,
+        command={comando: documento.pop("colecao", None), **documento}, duration_micros=2500,
+    )
+
+
+def criar_app(registro: Metricas, monitor: MonitorComandos) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(MiddlewareMetricas, registro=registro)
+
+    # Simula um service N+1: um find e um getMore por paciente
+    @app.get("/pacientes/{id}")
+    async def obter(id: str):
+        for i, (comando, documento) in enumerate([("find", {"colecao": "pacientes"}), ("getMore", {"collection": "pacientes"})]):
+            monitor.started(evento(i, comando, **documento))
+            monitor.succeeded(evento(i, comando))
+        return {"id": id}
+
+    return app
+
+
+def test_conta_comandos_por_requisicao_e_expoe_no_formato_prometheus():
+    registro = Metricas()
+    monitor = MonitorComandos(registro)
+    cliente = TestClient(criar_app(registro, monitor))
+
+    resposta = cliente.get("/pacientes/123")
+    cliente.get("/pacientes/456")
+
+    assert resposta.headers["server-timing"].startswith('db;dur=5.0;desc="2 comandos", app;dur=')
+    texto = registro.formato_prometheus()
+    # A rota aparece pelo caminho declarado, não pelo ID
+    assert 'http_requisicoes_total{metodo="GET",rota="/pacientes/{id}",status="200"} 2' in texto
+    assert 'http_requisicao_comandos_banco_bucket{metodo="GET",rota="/pacientes/{id}",le="1"} 0' in texto
+    assert 'http_requisicao_comandos_banco_bucket{metodo="GET",rota="/pacientes/{id}",le="2"} 2' in texto
+    assert 'http_requisicao_comandos_banco_sum{metodo="GET",rota="/pacientes/{id}"} 4' in texto
+    assert 'mongodb_comandos_total{colecao="pacientes",comando="find"} 2' in texto
+    assert 'mongodb_comandos_total{colecao="pacientes",comando="getMore"} 2' in texto
+
+
+def test_comandos_fora_de_requisicao_contam_so_por_colecao():
+    registro = Metricas()
+    monitor = MonitorComandos(registro)
+
+    monitor.started(evento(1, "ping"))
+    monitor.succeeded(evento(1, "ping"))
+    monitor.started(evento(2, "insert", colecao="consultas"))
+    monitor.failed(evento(2, "insert"))
+
+    assert registro.comandos == {("consultas", "insert"): [1, 0.0025, 1]}
+    assert registro.latencia == {}
@@ -1,21 +1,25 @@
-from fastapi.testclient import TestClient
-from app import app  # Importe sua aplicação FastAPI
+import httpx
+import pytest
+from main import app
 
-client = TestClient(app)
+pytestmark = pytest.mark.anyio
 
-def test_criar_paciente():
+
+async def test_criar_paciente(backend):
     paciente_data = {
         "nome": "João Silva",
-        "data_nascimento": "1990-05-20",
         "telefone": "999999999",
-        "endereco": "Rua Exemplo, 123",
         "email": "joao.silva@email.com",
-        "cpf": "12345678901",
-        "historico_medico": ["Alergia a penicilina"],
-        "status": True
+        "sexo": "M",
+        "peso": 80.5,
+        "altura": 1.75,
+        "problemas_de_saude": "Alergia a penicilina",
+        "data_criacao": "2024-05-20T10:00:00",
     }
-    
-    response = client.post("/pacientes/", json=paciente_data)
+
+    # O repositório já foi aberto pela fixture, então o lifespan da aplicação não é executado
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://teste") as client:
+        response = await client.post("/pacientes/", json=paciente_data)
 
     assert response.status_code == 200
     assert response.json()["nome"] == "João Silva"
@@ -0,0 +1,29 @@
+import asyncio
+import threading
+import pytest
+from services.repositorios.sqlite import PoolSQLite
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_conexao_so_volta_ao_pool_quando_o_comando_termina(tmp_path):
+    pool = PoolSQLite(str(tmp_path / "pool.db"), tamanho=1)
+    await pool.abrir()
+    liberar = threading.Event()
+    try:
+        # Cancelada a espera (cliente desconectado), a thread continua usando a conexão
+        tarefa = asyncio.create_task(pool.executar(lambda conexao: liberar.wait(5)))
+        await asyncio.sleep(0.05)
+        tarefa.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await tarefa
+        assert pool._livres.qsize() == 0
+
+        proxima = asyncio.create_task(pool.executar(lambda conexao: conexao.execute("SELECT 1").fetchone()[0]))
+        await asyncio.sleep(0.05)
+        assert not proxima.done()
+        liberar.set()
+        assert await asyncio.wait_for(proxima, 5) == 1
+    finally:
+        liberar.set()
+        await pool.fechar()
@@ -0,0 +1,88 @@
+import json
+import pytest
+from datetime import date, datetime
+from fastapi import HTTPException
+from ferramentas import dados
+from models.relatorios import ResumoConsultas
+from services.consultas import adicionar_consulta_db, adicionar_consultas_em_lote_db, atualizar_consulta_db, excluir_consulta_db
+from services.repositorios import RepositorioMongo
+from services.relatorios import consultas_por_dia_db, consultas_por_especialidade_db, consultas_por_medico_db
+from fabricas import criar_medico, criar_paciente, nova_consulta
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_resumo_acompanha_consultas_criadas_alteradas_e_removidas(backend):
+    paciente = await criar_paciente()
+    maria, pedro = await criar_medico("Maria", "Cardiologia"), await criar_medico("Pedro", "Pediatria")
+    primeira = await adicionar_consulta_db(nova_consulta(paciente, maria, datetime(2024, 3, 1, 9)))
+    segunda = await adicionar_consulta_db(nova_consulta(paciente, maria, datetime(2024, 3, 1, 10)))
+    await adicionar_consulta_db(nova_consulta(paciente, pedro, datetime(2024, 3, 2, 9), "Concluída"))
+    await adicionar_consultas_em_lote_db([
+        {"paciente_id": paciente.id, "medico_id": pedro.id, "data_hora": "2024-03-02T10:00:00", "status": "Agendada"},
+    ])
+
+    # Mudar o status e o dia move a consulta entre as linhas do resumo; removida, ela some
+    await atualizar_consulta_db(segunda.id, nova_consulta(paciente, maria, datetime(2024, 3, 2, 11), "Concluída"))
+    await excluir_consulta_db(primeira.id)
+    await adicionar_consulta_db(nova_consulta(paciente, maria, datetime(2024, 4, 1, 9)))
+
+    por_dia = await consultas_por_dia_db(date(2024, 3, 1), date(2024, 3, 31))
+    assert por_dia == [{"dia": date(2024, 3, 2), "total": 3, "por_status": {"Agendada": 1, "Concluída": 2}}]
+
+    assert await consultas_por_medico_db(date(2024, 3, 1), date(2024, 3, 31)) == sorted([
+        {"medico_id": maria.id, "total": 1, "por_status": {"Concluída": 1}},
+        {"medico_id": pedro.id, "total": 2, "por_status": {"Agendada": 1, "Concluída": 1}},
+    ], key=lambda linha: linha["medico_id"])
+
+    assert await consultas_por_dia_db(date(2024, 3, 1), date(2024, 4, 1), maria.id) == [
+        {"dia": date(2024, 3, 2), "total": 1, "por_status": {"Concluída": 1}},
+        {"dia": date(2024, 4, 1), "total": 1, "por_status": {"Agendada": 1}},
+    ]
+
+
+async def test_reconstrucao_do_resumo_confere_com_o_incremental(backend):
+    paciente = await criar_paciente()
+    maria, pedro = await criar_medico("Maria", "Cardiologia"), await criar_medico("Pedro", "Pediatria")
+    for hora in (8, 9, 10):
+        await adicionar_consulta_db(nova_consulta(paciente, maria, datetime(2024, 5, 6, hora)))
+    cancelada = await adicionar_consulta_db(nova_consulta(paciente, pedro, datetime(2024, 5, 7, 8)))
+    await atualizar_consulta_db(cancelada.id, nova_consulta(paciente, pedro, datetime(2024, 5, 7, 8), "Cancelada"))
+
+    incremental = await consultas_por_especialidade_db(date(2024, 5, 1), date(2024, 5, 31))
+    assert incremental == [
+        {"especialidade": "Cardiologia", "total": 3, "por_status": {"Agendada": 3}},
+        {"especialidade": "Pediatria", "total": 1, "por_status": {"Cancelada": 1}},
+    ]
+    assert await backend.reconstruir_resumos() == 2
+    assert await consultas_por_especialidade_db(date(2024, 5, 1), date(2024, 5, 31)) == incremental
+
+    for inicio, fim in ((date(2024, 5, 2), date(2024, 5, 1)), (date(2024, 1, 1), date(2025, 1, 1))):
+        with pytest.raises(HTTPException) as erro:
+            await consultas_por_dia_db(inicio, fim)
+        assert erro.value.status_code == 400
+
+
+async def test_resumo_do_mongo_montado_na_inicializacao_e_na_importacao(banco, tmp_path):
+    paciente = await criar_paciente()
+    maria = await criar_medico("Maria", "Cardiologia")
+    consulta = await adicionar_consulta_db(nova_consulta(paciente, maria, datetime(2024, 8, 5, 8)))
+
+    # Base gravada antes do resumo: a coleção é montada antes de qualquer escrita
+    repositorio = RepositorioMongo()
+    await ResumoConsultas.get_motor_collection().delete_many({})
+    assert await repositorio.preencher_resumos()
+    assert not await repositorio.preencher_resumos()
+    await excluir_consulta_db(consulta.id)
+    assert await consultas_por_medico_db(date(2024, 8, 1), date(2024, 8, 31)) == []
+
+    # A importação entra no resumo e, com upsert, a versão substituída sai
+    arquivo = tmp_path / "consultas.ndjson"
+    registro = {"_id": "c1", "paciente_id": paciente.id, "medico_id": maria.id, "data_hora": "2024-08-06T08:00:00", "status": "Agendada", "observacoes": ""}
+    arquivo.write_text(json.dumps(registro) + "\n", encoding="utf-8")
+    await dados.importar("consultas", str(arquivo))
+    arquivo.write_text(json.dumps({**registro, "status": "Cancelada"}) + "\n", encoding="utf-8")
+    await dados.importar("consultas", str(arquivo), upsert=True)
+    assert await consultas_por_medico_db(date(2024, 8, 1), date(2024, 8, 31)) == [
+        {"medico_id": maria.id, "total": 1, "por_status": {"Cancelada": 1}},
+    ]
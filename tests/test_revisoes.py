@@ -0,0 +1,126 @@
+import sqlite3
+import httpx
+import pytest
+from main import app
+from services.repositorios.sqlite import ESQUEMA, RepositorioSQLite
+
+pytestmark = pytest.mark.anyio
+
+PACIENTE = {
+    "nome": "Ana", "telefone": "999999999", "email": "ana@email.com", "sexo": "F",
+    "peso": 60.0, "altura": 1.65, "problemas_de_saude": "", "data_criacao": "2024-01-01T08:00:00",
+}
+MEDICO = {"nome": "Maria", "especialidade": "Cardiologia", "crm": "12345-CE", "email": "maria@email.com", "telefone": "888888888"}
+
+
+def cliente() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://teste")
+
+
+async def test_get_condicional_responde_304_ate_a_atualizacao(backend):
+    async with cliente() as client:
+        paciente_id = (await client.post("/pacientes/", json=PACIENTE)).json()["id"]
+        url = f"/pacientes/{paciente_id}"
+
+        primeira = await client.get(url)
+        etag, ultima_alteracao = primeira.headers["ETag"], primeira.headers["Last-Modified"]
+        assert "revisao" not in primeira.json()
+
+        nao_modificada = await client.get(url, headers={"If-None-Match": etag})
+        assert (nao_modificada.status_code, nao_modificada.content) == (304, b"")
+        assert nao_modificada.headers["ETag"] == etag
+        assert (await client.get(url, headers={"If-None-Match": f'"outra", W/{etag}'})).status_code == 304
+        assert (await client.get(url, headers={"If-Modified-Since": ultima_alteracao})).status_code == 304
+        # Com ?fields= a resposta é outra representação, sem validadores
+        assert "ETag" not in (await client.get(url, params={"fields": "nome"}, headers={"If-None-Match": etag})).headers
+
+        await client.put(url, json={**PACIENTE, "telefone": "988887777"})
+        atualizada = await client.get(url, headers={"If-None-Match": etag})
+        assert atualizada.status_code == 200 and atualizada.json()["telefone"] == "988887777"
+        assert atualizada.headers["ETag"] != etag
+        assert (await client.get(url, headers={"If-None-Match": atualizada.headers["ETag"]})).status_code == 304
+        assert (await client.get("/pacientes/999999", headers={"If-None-Match": "*"})).status_code == 404
+
+
+async def test_304_de_medico_e_consulta_sem_ler_o_documento(backend, monkeypatch):
+    async with cliente() as client:
+        medico = (await client.post("/medicos/", json=MEDICO)).json()
+        paciente = (await client.post("/pacientes/", json=PACIENTE)).json()
+        consulta = (await client.post("/consultas/", json={
+            "paciente_id": paciente["id"], "medico_id": medico["id"], "data_hora": "2024-06-03T09:00:00", "status": "Agendada",
+        })).json()
+        urls = [f"/medicos/{medico['id']}", f"/consultas/{consulta['_id']}"]
+        etags = [(await client.get(url)).headers["ETag"] for url in urls]
+
+        async def sem_leitura(id):
+            raise AssertionError("o 304 não deveria ler o documento")
+        monkeypatch.setattr(backend.medicos, "obter", sem_leitura)
+        monkeypatch.setattr(backend.consultas, "obter", sem_leitura)
+        for url, etag in zip(urls, etags):
+            assert (await client.get(url, headers={"If-None-Match": etag})).status_code == 304
+
+
+async def test_sqlite_antigo_ganha_revisoes_na_inicializacao(anyio_backend, tmp_path):
+    caminho = str(tmp_path / "antigo.db")
+    with sqlite3.connect(caminho) as conexao:
+        conexao.executescript(ESQUEMA)
+        conexao.execute(
+            "INSERT INTO paciente (id, nome, telefone, data_criacao) VALUES (1, 'Ana', '999999999', '2024-01-01 08:00:00.000000')"
+        )
+    conexao.close()
+
+    repositorio = RepositorioSQLite(caminho)
+    await repositorio.iniciar()
+    try:
+        revisao, data_atualizacao = await repositorio.pacientes.revisao("1")
+        paciente = await repositorio.pacientes.obter("1")
+        assert (paciente.revisao, paciente.data_atualizacao) == (revisao, data_atualizacao)
+        assert revisao and await repositorio.pacientes.revisao("2") is None
+    finally:
+        await repositorio.fechar()
+
+
+async def test_put_com_if_match_recusa_revisao_antiga(backend):
+    async with cliente() as client:
+        paciente_id = (await client.post("/pacientes/", json=PACIENTE)).json()["id"]
+        url = f"/pacientes/{paciente_id}"
+        etag = (await client.get(url)).headers["ETag"]
+
+        # Dois clientes editam a partir da mesma versão: o segundo recebe 412 e não sobrescreve o primeiro
+        primeira = await client.put(url, json={**PACIENTE, "telefone": "911111111"}, headers={"If-Match": etag})
+        assert primeira.status_code == 200 and primeira.json()["telefone"] == "911111111"
+        assert primeira.headers["ETag"] not in (etag, None)
+        segunda = await client.put(url, json={**PACIENTE, "telefone": "922222222"}, headers={"If-Match": etag})
+        assert segunda.status_code == 412
+        assert (await client.get(url)).json()["telefone"] == "911111111"
+
+        atual = primeira.headers["ETag"]
+        assert (await client.put(url, json=PACIENTE, headers={"If-Match": f"W/{atual}"})).status_code == 412
+        assert (await client.put(url, json=PACIENTE, headers={"If-Match": f'{etag}, {atual}'})).status_code == 200
+        assert (await client.put(url, json=PACIENTE, headers={"If-Match": "*"})).status_code == 200
+        assert (await client.put("/pacientes/999999", json=PACIENTE, headers={"If-Match": atual})).status_code == 404
+
+
+async def test_put_devolve_o_documento_atualizado(backend):
+    async with cliente() as client:
+        maria = (await client.post("/medicos/", json=MEDICO)).json()
+        pedro = (await client.post("/medicos/", json={**MEDICO, "nome": "Pedro"})).json()
+        paciente = (await client.post("/pacientes/", json=PACIENTE)).json()
+        dados = {"paciente_id": paciente["id"], "medico_id": maria["id"], "data_hora": "2024-06-03T09:00:00", "status": "Agendada"}
+        consulta = (await client.post("/consultas/", json=dados)).json()
+        url = f"/consultas/{consulta['_id']}"
+
+        medico = await client.put(f"/medicos/{maria['id']}", json={**MEDICO, "especialidade": "Pediatria"})
+        assert medico.json()["especialidade"] == "Pediatria"
+        assert medico.headers["ETag"] == (await client.get(f"/medicos/{maria['id']}")).headers["ETag"]
+
+        etag = (await client.get(url)).headers["ETag"]
+        remarcada = await client.put(url, json={**dados, "medico_id": pedro["id"], "status": "Confirmada"}, headers={"If-Match": etag})
+        assert remarcada.status_code == 200
+        assert (remarcada.json()["medico_id"], remarcada.json()["status"]) == (pedro["id"], "Confirmada")
+        assert remarcada.headers["ETag"] == (await client.get(url)).headers["ETag"]
+        assert (await client.put(url, json=dados, headers={"If-Match": etag})).status_code == 412
+
+    # A consulta recusada não mexe nas referências: ela continua só com Pedro
+    assert (await backend.medicos.obter(maria["id"])).consultas == []
+    assert (await backend.medicos.obter(pedro["id"])).consultas == [consulta["_id"]]
@@ -0,0 +1,34 @@
+import asyncio
+from datetime import datetime
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from ferramentas.benchmark_serializacao import executar
+from models.medicos import MedicoResumo, MedicoRetorno
+from models.paciente import PacienteResumo, PacienteRetorno
+from services.serializacao import serializador_medico, serializador_paciente
+
+
+def json_fastapi(modelo, conteudo) -> bytes:
+    campo = create_model_field(name="Response", type_=modelo, mode="serialization")
+    return JSONResponse(asyncio.run(serialize_response(field=campo, response_content=conteudo, is_coroutine=True))).body
+
+
+def test_caminho_rapido_gera_o_mesmo_json_dos_documentos():
+    # executar() compara os bytes dos dois caminhos antes de medir
+    assert len(executar(itens=3, repeticoes=1)) == 3
+
+
+def test_caminho_rapido_gera_o_mesmo_json_das_projecoes_e_dicionarios():
+    medico = {"_id": "m1", "nome": "Dra. Ângela", "especialidade": "Pediatria", "crm": "1-CE",
+              "email": "angela@email.com", "telefone": "888"}
+    paciente = {"_id": "p1", "nome": "José", "telefone": "999", "email": None, "sexo": "M", "peso": 80.25,
+                "altura": 1.75, "problemas_de_saude": None, "data_criacao": datetime(2024, 5, 1, 8, 30, 0, 5)}
+
+    resumos = [MedicoResumo.model_validate(medico)]
+    assert serializador_medico.lista_json(resumos) == json_fastapi(list[MedicoRetorno], resumos)
+    resumo = PacienteResumo.model_validate(paciente)
+    assert serializador_paciente.para_json(resumo) == json_fastapi(PacienteRetorno, resumo)
+    # Objetos que não são modelos seguem o caminho de validação do FastAPI
+    dicionario = {**paciente, "id": "p1"}
+    assert serializador_paciente.para_json(dicionario) == json_fastapi(PacienteRetorno, dicionario)